@@ -1,40 +1,106 @@
 from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
 import os
 import sys
+import asyncio
+import hmac
+import json
+import time
+import uuid
+import threading
+from typing import List, Optional, Union
 from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv()
-import uvicorn
 
 # Add src to path
 src_path = Path(__file__).parent / "src"
 sys.path.insert(0, str(src_path))
 
-try:
-    from chatbot import SmartLibrarian
-except ImportError:
-    # Fallback import method
-    import sys
-    import importlib.util
+# Only lightweight modules are imported here; chatbot (OpenAI, ChromaDB, tiktoken) is
+# imported by the background warm-up so the server accepts connections immediately
+from catalog_snapshot import CatalogSnapshotCache, BOOK_FIELDS, dumps
+from instrumentation import (
+    REGISTRY, REQUESTS_IN_FLIGHT, REQUEST_LATENCY, register_librarian_metrics, server_timing
+)
+from startup import StartupTracker
+from shared_index import SnapshotFollower
+from reindex import Reindexer, ReindexInProgress
+from batch import BatchRunner, aparse_items, read_lines
+
+# Global librarian instances
+librarian = None
+async_librarian = None
+catalog_snapshots = CatalogSnapshotCache()
+startup = StartupTracker()
+snapshot_follower = None
+reindexer = None
+
+BOOKS_PAGE_SIZE = int(os.getenv("BOOKS_PAGE_SIZE", "100"))
+BOOKS_MAX_PAGE_SIZE = 1000
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "0") == "1"
+# Largest JSONL body accepted by /chat/batch, in queries
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "100000"))
+# Optional bearer token for /chat/batch; without it the endpoint is open like /chat
+BATCH_TOKEN = os.getenv("BATCH_TOKEN")
+# Bearer token for the /admin endpoints; they are disabled when it is not set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Endpoints tracked individually by the request metrics; everything else is reported as "other"
+TRACKED_ENDPOINTS = {"/chat", "/chat/stream", "/chat/batch", "/books", "/metrics"}
+
+
+def warm_up(openai_api_key: str, books_file: str):
+    """Load the index and catalog in the background, then publish the librarian"""
+    global librarian, async_librarian, reindexer
 
-    chatbot_path = src_path / "chatbot.py"
-    spec = importlib.util.spec_from_file_location("chatbot", chatbot_path)
-    chatbot_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(chatbot_module)
-    SmartLibrarian = chatbot_module.SmartLibrarian
+    try:
+        with startup.track("imports"):
+            from chatbot import SmartLibrarian, AsyncSmartLibrarian
+
+        ready_librarian = SmartLibrarian(openai_api_key, books_file, startup=startup,
+                                         snapshot_wake=snapshot_follower.wake_event if snapshot_follower else None)
+        if snapshot_follower:
+            # A version published while attaching is picked up once the follower runs
+            snapshot_follower.version = ready_librarian.snapshot_version
+        with startup.track("async_librarian"):
+            ready_async_librarian = AsyncSmartLibrarian(
+                ready_librarian, openai_api_key,
+                max_query_workers=int(os.getenv("CHROMA_QUERY_THREADS", "8"))
+            )
+            register_librarian_metrics(ready_librarian, ready_async_librarian)
+        with startup.track("warm_up"):
+            # First-request costs: the /books snapshot and the tokenizer used by the context builder
+            from tokens import get_encoder
+
+            catalog_snapshots.get(ready_librarian.vector_store)
+            get_encoder()
+
+        librarian, async_librarian = ready_librarian, ready_async_librarian
+        if snapshot_follower:
+            snapshot_follower.start()
+        else:
+            reindexer = Reindexer(ready_librarian, swap=ready_async_librarian.swap_vector_store,
+                                  prepare=catalog_snapshots.prime)
+        startup.ready()
+        print("Smart Librarian initialized successfully!")
+    except Exception as e:
+        startup.fail(e)
 
-# Global librarian instance
-librarian = None
+
+def swap_to_snapshot(snapshot_path: str):
+    """Called by the snapshot follower when the writer publishes a new version"""
+    async_librarian.reload_shared_index(snapshot_path)
+    catalog_snapshots.invalidate()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler"""
-    global librarian
-
     openai_api_key = os.getenv('OPENAI_API_KEY')
 
     if not openai_api_key:
@@ -44,16 +110,43 @@ async def lifespan(app: FastAPI):
     if not os.path.exists(books_file):
         raise RuntimeError(f"Books file not found: {books_file}")
 
-    try:
-        librarian = SmartLibrarian(openai_api_key, books_file)
-        print("Smart Librarian initialized successfully!")
-    except Exception as e:
-        raise RuntimeError(f"Failed to initialize Smart Librarian: {e}")
+    global snapshot_follower
+    shared_index_dir = os.getenv("SHARED_INDEX_DIR")
+    if shared_index_dir:
+        snapshot_follower = SnapshotFollower(shared_index_dir, swap_to_snapshot,
+                                             poll_seconds=float(os.getenv("SHARED_INDEX_POLL_SECONDS", "5")))
+        snapshot_follower.install_signal_handler(asyncio.get_running_loop())
+        # Registered up front so the writer's first publish wakes a warm-up still waiting for it
+        snapshot_follower.register()
+
+    # Serve /healthz and /readyz right away; everything else answers 503 until warm-up is done
+    threading.Thread(target=warm_up, args=(openai_api_key, books_file), name="librarian-warm-up",
+                     daemon=True).start()
+    print(f"Accepting connections {(time.perf_counter() - startup.started) * 1000:.0f} ms after import; "
+          f"loading the catalog in the background")
 
     yield
 
     # Cleanup (if needed)
     print("Shutting down Smart Librarian...")
+    if snapshot_follower:
+        snapshot_follower.stop()
+    if async_librarian:
+        async_librarian.close()
+
+
+def require_ready():
+    """Reject requests that need the librarian until the background warm-up has finished"""
+    if not startup.is_ready:
+        snapshot = startup.snapshot()
+        raise HTTPException(
+            status_code=503,
+            detail=f"Smart Librarian is {snapshot['status']}"
+                   + (f" ({snapshot['phase']})" if snapshot["phase"] else "")
+                   + (f": {snapshot['error']}" if snapshot["error"] else ""),
+            # Retrying does not help once warm-up has failed
+            headers=None if startup.has_failed else {"Retry-After": "1"}
+        )
 
 
 app = FastAPI(title="Smart Librarian API", version="1.0.0", lifespan=lifespan)
@@ -87,6 +180,36 @@ async def cors_handler(request: Request, call_next):
     return response
 
 
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    endpoint = request.url.path if request.url.path in TRACKED_ENDPOINTS else "other"
+    started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+
+    def finish(status: int):
+        REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+        REQUEST_LATENCY.observe((time.perf_counter() - started) * 1000, endpoint=endpoint, status=str(status))
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        finish(500)
+        raise
+
+    # Streamed responses stay in flight until their body has been sent
+    body_iterator = response.body_iterator
+
+    async def tracked_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            finish(response.status_code)
+
+    response.body_iterator = tracked_body()
+    return response
+
+
 # Handle preflight OPTIONS requests
 @app.options("/{path:path}")
 async def handle_options(request: Request, path: str):
@@ -107,14 +230,44 @@ async def handle_options(request: Request, path: str):
     )
 
 
+class BookFilters(BaseModel):
+    """Restrict retrieval to matching books; each text field takes one value or a list of values"""
+    model_config = {"extra": "forbid"}
+
+    author: Optional[Union[str, List[str]]] = None
+    genre: Optional[Union[str, List[str]]] = None
+    language: Optional[Union[str, List[str]]] = None
+    availability: Optional[Union[str, List[str]]] = None
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+
+
 class ChatMessage(BaseModel):
     message: str
+    session_id: Optional[str] = None
+    # Start a conversation: the reply carries a new session_id for follow-ups
+    new_session: bool = False
+    filters: Optional[BookFilters] = None
+
+    def search_filters(self) -> Optional[dict]:
+        return self.filters.model_dump(exclude_none=True) if self.filters else None
+
+    def conversation(self) -> Optional[str]:
+        """The session to continue or start; None answers statelessly"""
+        if self.session_id:
+            return self.session_id
+        return uuid.uuid4().hex if self.new_session else None
+
+
+class ReindexRequest(BaseModel):
+    catalog: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     response: str
     success: bool
     error: str = None
+    session_id: Optional[str] = None
 
 
 @app.get("/")
@@ -123,45 +276,277 @@ async def root():
     return {"message": "Smart Librarian API is running!", "status": "healthy"}
 
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: 200 while the process is starting or serving, 503 once warm-up has failed for good"""
+    if startup.has_failed:
+        return Response(content=dumps({"status": "failed", "error": startup.snapshot()["error"]}),
+                        media_type="application/json", status_code=503)
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the librarian can answer, 503 with loading progress before that"""
+    snapshot = startup.snapshot()
+    if snapshot_follower:
+        snapshot["shared_index"] = {"version": snapshot_follower.version, "swaps": snapshot_follower.swaps,
+                                    "pid": os.getpid()}
+    return Response(content=dumps(snapshot), media_type="application/json",
+                    status_code=200 if startup.is_ready else 503)
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(message: ChatMessage):
+async def chat(message: ChatMessage, http_response: Response):
     """Chat endpoint for book recommendations"""
-    if not librarian:
-        raise HTTPException(status_code=500, detail="Smart Librarian not initialized")
+    require_ready()
 
+    session_id = message.conversation()
+    timings = {}
     try:
-        response = librarian.process_user_input(message.message)
-        return ChatResponse(response=response, success=True)
+        response = await async_librarian.process_user_input(message.message, session_id=session_id,
+                                                            timings=timings, filters=message.search_filters())
+        if TIMING_HEADERS:
+            http_response.headers["Server-Timing"] = server_timing(timings)
+        return ChatResponse(response=response, success=True, session_id=session_id)
     except Exception as e:
         return ChatResponse(
             response="A apărut o eroare în procesarea cererii tale. Te rog să încerci din nou.",
             success=False,
-            error=str(e)
+            error=str(e),
+            session_id=session_id
         )
 
 
+@app.post("/chat/stream")
+async def chat_stream(message: ChatMessage):
+    """Stream the librarian's answer as server-sent events"""
+    require_ready()
+
+    session_id = message.conversation()
+
+    async def event_stream():
+        timings = {}
+        try:
+            async for token in async_librarian.stream_user_input(message.message, timings, session_id=session_id,
+                                                                 filters=message.search_filters()):
+                yield f"data: {json.dumps({'token': token}, ensure_ascii=False)}\n\n"
+            yield f"event: done\ndata: {json.dumps(dict(timings, session_id=session_id))}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """A StreamingResponse that leaves the receive channel to the endpoint.
+
+    StreamingResponse watches ``receive`` for the client disconnecting, which
+    would swallow the body chunks of a request still being read while the
+    response streams; the endpoint watches for the disconnect itself.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+def require_batch_token(request: Request):
+    """``/chat/batch`` is open like ``/chat`` unless ``BATCH_TOKEN`` is set"""
+    if BATCH_TOKEN and not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {BATCH_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid batch token")
+
+
+@app.post("/chat/batch")
+async def chat_batch(request: Request):
+    """Answer a JSONL body of queries (see src/batch.py); results stream back as JSONL as they finish.
+
+    The body is read line by line: chunks are answered while the rest of it
+    is still arriving, and reading stops after ``BATCH_MAX_QUERIES`` queries.
+    """
+    require_batch_token(request)
+    require_ready()
+
+    items = aparse_items(read_lines(request.stream()))
+    try:
+        first = await items.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=400, detail="Send one JSON object per line: {\"id\": ..., \"query\": ...}")
+
+    runner = BatchRunner(async_librarian)
+    # Bounded, so a slow reader holds back the completions instead of buffering results
+    results = asyncio.Queue(maxsize=runner.concurrency * 4)
+
+    watchers: List[asyncio.Task] = []
+
+    async def watch_disconnect(task: asyncio.Task):
+        # Once the body is read, the next message is the client going away
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        task.cancel()
+
+    async def limited():
+        # Iterated by the runner inside produce()
+        yield first
+        count = 1
+        async for item in items:
+            if count == BATCH_MAX_QUERIES:
+                await results.put({"error": f"At most {BATCH_MAX_QUERIES} queries per batch; "
+                                            f"the rest of the body was not read"})
+                break
+            count += 1
+            yield item
+        await items.aclose()
+        watchers.append(asyncio.create_task(watch_disconnect(asyncio.current_task())))
+
+    async def produce():
+        try:
+            await runner.run(limited(), results.put)
+        except (asyncio.CancelledError, ClientDisconnect):
+            pass  # The client went away
+        finally:
+            await results.put(None)
+
+    async def lines():
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                record = await results.get()
+                if record is None:
+                    break
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+            await task
+        finally:
+            # The client went away: stop answering
+            task.cancel()
+            for watcher in watchers:
+                watcher.cancel()
+
+    return RequestStreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/chat/stream/stats")
+async def chat_stream_stats():
+    """Time-to-first-token percentiles for recent streamed answers"""
+    require_ready()
+    return async_librarian.ttft_summary()
+
+
+@app.get("/router/stats")
+async def router_stats():
+    """How many queries took each intent route"""
+    require_ready()
+    return {"mode": librarian.router.mode, "routes": librarian.router.stats()}
+
+
+@app.get("/models/stats")
+async def model_stats():
+    """Chat model routing: current fallbacks, recent latency per role and model, decision counts"""
+    require_ready()
+    return librarian.model_router.stats()
+
+
+@app.get("/embeddings/stats")
+async def embedding_stats():
+    """Embedding cache counters and query micro-batching histograms"""
+    require_ready()
+    batcher = async_librarian.vector_store.batcher
+    return {
+        "cache": librarian.vector_store.embedding_cache.stats(),
+        "batching": batcher.stats() if batcher else None
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency, token usage, cache hit ratios, in-flight requests"""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.delete("/chat/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Forget a conversation"""
+    require_ready()
+    librarian.sessions.delete(session_id)
+    return {"deleted": session_id}
+
+
+def require_admin(request: Request):
+    """Admin endpoints need ``Authorization: Bearer $ADMIN_TOKEN``"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled; set ADMIN_TOKEN to enable it")
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {ADMIN_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.post("/admin/reindex", status_code=202)
+async def start_reindex(request: Request, body: Optional[ReindexRequest] = None):
+    """Rebuild the index from the catalog in the background and swap to it when done"""
+    require_admin(request)
+    require_ready()
+    if reindexer is None:
+        raise HTTPException(status_code=409, detail="Catalog updates are published by the shared index writer")
+    try:
+        job = reindexer.start(body.catalog if body else None)
+    except ReindexInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.snapshot()
+
+
+@app.get("/admin/reindex")
+async def reindex_status(request: Request):
+    """Progress of the running rebuild, or the outcome of the last one"""
+    require_admin(request)
+    require_ready()
+    if reindexer is None or reindexer.job is None:
+        return {"status": "idle"}
+    return reindexer.job.snapshot()
+
+
 @app.get("/books")
-async def get_books():
-    """Get list of available books"""
-    if not librarian:
-        raise HTTPException(status_code=500, detail="Smart Librarian not initialized")
+async def get_books(request: Request, cursor: Optional[str] = None, limit: int = BOOKS_PAGE_SIZE,
+                    fields: Optional[str] = None):
+    """Get a page of available books, sorted by title"""
+    require_ready()
+
+    limit = max(1, min(limit, BOOKS_MAX_PAGE_SIZE))
+    selected = [field.strip() for field in fields.split(",")] if fields else list(BOOK_FIELDS)
+    unknown = [field for field in selected if field not in BOOK_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
 
     try:
-        # Get all books from vector store
-        results = librarian.vector_store.collection.get()
-        books = []
-        for i, metadata in enumerate(results['metadatas']):
-            books.append({
-                "id": results['ids'][i],
-                "title": metadata['title'],
-                "summary": results['documents'][i][:200] + "..." if len(results['documents'][i]) > 200 else
-                results['documents'][i]
-            })
-
-        return {"books": books, "count": len(books)}
+        # Rebuilt off the event loop, and only after ingestion changed the catalog
+        snapshot = await run_in_threadpool(catalog_snapshots.get, librarian.vector_store)
+
+        etag = f'W/"{snapshot.etag}-{cursor or ""}-{limit}-{",".join(selected)}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        try:
+            page = snapshot.page(cursor, limit, selected)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        return Response(content=dumps(page), media_type="application/json",
+                        headers={"ETag": etag, "Cache-Control": "no-cache"})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get books: {str(e)}")
 
 
 if __name__ == "__main__":
-    uvicorn.run("backend:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    import uvicorn
+
+    if os.getenv("SHARED_INDEX_DIR"):
+        # Production multi-process mode: workers share the writer's memory-mapped snapshots
+        uvicorn.run("backend:app", host="0.0.0.0", port=8000,
+                    workers=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    else:
+        uvicorn.run("backend:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Content filter microbenchmark: compiled matcher vs. per-word substring scans.
+
+Builds a synthetic moderation list of realistic size on top of the shipped
+lists and measures messages/sec over typical chat queries:
+
+    python benchmarks/bench_content_filter.py --terms 5000 --messages 20000
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from content_filter import ContentFilter, load_terms, DEFAULT_FILTERS_DIR
+
+SAMPLE_MESSAGES = [
+    "Vreau o carte despre libertate și control social",
+    "Ce-mi recomanzi dacă iubesc poveștile fantastice?",
+    "Ce este 1984?",
+    "I'd love a classic novel about love, class and family expectations in England",
+    "Caut ceva asemănător cu Dune, dar mai scurt și cu mai multă politică",
+    "Recommend me a book about friendship and courage for my 12 year old",
+]
+
+
+def synthetic_terms(count: int, rng: random.Random):
+    terms = set()
+    while len(terms) < count:
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+        terms.add(word + "*" if rng.random() < 0.1 else word)
+    return list(terms)
+
+
+def naive_is_appropriate(text: str, words) -> bool:
+    text_lower = text.lower()
+    for word in words:
+        if word in text_lower:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terms", type=int, default=5000, help="synthetic terms added to the shipped lists")
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    terms = load_terms(DEFAULT_FILTERS_DIR) + synthetic_terms(args.terms, rng)
+    messages = [rng.choice(SAMPLE_MESSAGES) for _ in range(args.messages)]
+    total_bytes = sum(len(message.encode("utf-8")) for message in messages)
+
+    started = time.perf_counter()
+    content_filter = ContentFilter(terms)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    compiled_flags = [content_filter.is_appropriate(message) for message in messages]
+    compiled_s = time.perf_counter() - started
+
+    naive_words = [term.rstrip("*") for term in terms]
+    started = time.perf_counter()
+    naive_flags = [naive_is_appropriate(message, naive_words) for message in messages]
+    naive_s = time.perf_counter() - started
+
+    print(f"{len(terms)} terms, {args.messages} messages ({total_bytes / 1024:.0f} KiB)")
+    print(f"compiled build: {build_ms:.1f} ms")
+    print(f"compiled: {args.messages / compiled_s:>12,.0f} msg/s  {total_bytes / compiled_s / 1e6:8.2f} MB/s")
+    print(f"naive:    {args.messages / naive_s:>12,.0f} msg/s  {total_bytes / naive_s / 1e6:8.2f} MB/s")
+    print(f"speedup:  {naive_s / compiled_s:.1f}x")
+    disagreements = sum(1 for a, b in zip(compiled_flags, naive_flags) if a != b)
+    print(f"messages flagged differently (substring false positives): {disagreements}")
+
+
+if __name__ == "__main__":
+    main()
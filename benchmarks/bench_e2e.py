@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of catalog ingestion and the HTTP API, fully offline.
+
+Starts benchmarks/fake_openai.py as a local OpenAI stand-in, generates a
+synthetic catalog, then measures:
+
+  populate  populate_database() on a cold store, then an unchanged re-sync
+  chat      POST /chat at each concurrency level
+  stream    POST /chat/stream (time to first token and total) at each level
+  books     GET /books, following cursors, at each level
+
+plus backend time to liveness and readiness and resident memory. Results are printed and
+written as JSON; pass --compare to diff against an earlier run:
+
+    python benchmarks/bench_e2e.py --books 5000 --concurrency 1,8,32 --requests 200
+    python benchmarks/bench_e2e.py --compare benchmarks/results/e2e-20240101-120000.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+BENCH_DIR = Path(__file__).parent
+REPO_ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_openai import add_config_arguments, config_from_args, config_to_args
+from generate_catalog import THEMES, generate_catalog
+
+# Metrics where a higher value is better; every other compared metric is a latency or a size
+HIGHER_IS_BETTER = ("throughput_rps", "books_per_s")
+COMPARED_METRICS = ("throughput_rps", "books_per_s", "p50_ms", "p95_ms", "p99_ms", "ttft_p95_ms", "seconds",
+                    "live_seconds", "peak_rss_mb")
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def latency_summary(samples, prefix=""):
+    return {
+        f"{prefix}p50_ms": percentile(samples, 50),
+        f"{prefix}p95_ms": percentile(samples, 95),
+        f"{prefix}p99_ms": percentile(samples, 99),
+        f"{prefix}mean_ms": sum(samples) / len(samples) if samples else 0.0,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float) -> float:
+    """Poll ``url`` until it answers; returns the seconds waited"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode} before {url} was ready")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def rss_mb(pid: int):
+    """Resident set size of a process from /proc (Linux only; None elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+class MemorySampler:
+    """Tracks the peak RSS of a process in a background thread"""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            current = rss_mb(self.pid)
+            if current is not None:
+                self.peak_mb = max(self.peak_mb or 0.0, current)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def make_queries(titles, count: int, title_ratio: float, seed: int):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if titles and rng.random() < title_ratio:
+            queries.append(f"Ce este {rng.choice(titles)}?")
+        else:
+            first, second = rng.sample(THEMES, 2)
+            queries.append(f"Vreau o carte despre {first} și {second}")
+    return queries
+
+
+def catalog_titles(path: str):
+    prefix = "## Title: "
+    with open(path, encoding="utf-8") as file:
+        return [line[len(prefix):].strip() for line in file if line.startswith(prefix)]
+
+
+def run_populate(args, env, catalog: str, workdir: str) -> dict:
+    """Run the ingestion benchmark in a child process so its peak RSS is measured on its own"""
+    command = [sys.executable, str(Path(__file__).resolve()), "--populate-worker",
+               "--catalog", catalog, "--workdir", workdir, "--index-backend", args.index_backend]
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def populate_worker(args):
+    sys.path.insert(0, str(REPO_ROOT / "src"))
+    from embedding_cache import EmbeddingCache
+    from vector_store import BookVectorStore
+
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            store = BookVectorStore(
+                os.environ["OPENAI_API_KEY"],
+                persist_directory=os.path.join(args.workdir, "index"),
+                embedding_cache=EmbeddingCache(os.path.join(args.workdir, "embedding_cache.db")),
+                index_backend=args.index_backend,
+            )
+            store.create_collection()
+
+            started = time.perf_counter()
+            stats = store.populate_database(args.catalog, incremental=True)
+            seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            store.populate_database(args.catalog, incremental=True)
+            resync_seconds = time.perf_counter() - started
+        finally:
+            sys.stdout = stdout
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak_rss_mb = peak_rss / 1024 / 1024 if sys.platform == "darwin" else peak_rss / 1024
+    print(json.dumps({
+        "books": store.collection.count(),
+        "added": stats["added"],
+        "seconds": seconds,
+        "books_per_s": stats["added"] / seconds if seconds else 0.0,
+        "resync_seconds": resync_seconds,
+        "peak_rss_mb": peak_rss_mb,
+    }))
+
+
+async def drive(concurrency: int, total: int, request):
+    """Call ``request(i)`` ``total`` times with at most ``concurrency`` in flight"""
+    latencies, extra, errors = [], [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                result = await request(i)
+            except (httpx.HTTPError, ValueError):
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if result is not None:
+                extra.append(result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+    summary = {"requests": total, "errors": errors, "concurrency": concurrency, "seconds": seconds,
+               "throughput_rps": len(latencies) / seconds if seconds else 0.0}
+    summary.update(latency_summary(latencies))
+    return summary, extra
+
+
+async def bench_chat(client, queries, concurrency, total):
+    async def request(i):
+        response = await client.post("/chat", json={"message": queries[i % len(queries)]})
+        response.raise_for_status()
+        if not response.json()["success"]:
+            raise ValueError(response.json()["error"])
+
+    summary, _ = await drive(concurrency, total, request)
+    return summary
+
+
+async def bench_stream(client, queries, concurrency, total):
+    async def request(i):
+        started = time.perf_counter()
+        first_token = None
+        async with client.stream("POST", "/chat/stream", json={"message": queries[i % len(queries)]}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("event: error"):
+                    raise ValueError("stream error")
+                if first_token is None and line.startswith("data: ") and '"token"' in line:
+                    first_token = (time.perf_counter() - started) * 1000
+        return first_token
+
+    summary, ttfts = await drive(concurrency, total, request)
+    summary.update(latency_summary(ttfts, prefix="ttft_"))
+    return summary
+
+
+async def bench_books(client, concurrency, total, page_size):
+    cursors = [None]
+
+    async def request(i):
+        cursor = cursors[i % len(cursors)]
+        params = {"limit": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/books", params=params)
+        response.raise_for_status()
+        next_cursor = response.json()["next_cursor"]
+        if next_cursor and len(cursors) < 64:
+            cursors.append(next_cursor)
+
+    summary, _ = await drive(concurrency, total, request)
+    return summary
+
+
+async def bench_api(args, base_url, queries):
+    results = {}
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        for concurrency in args.concurrency:
+            if "chat" in args.scenarios:
+                results[f"chat@{concurrency}"] = await bench_chat(client, queries, concurrency, args.requests)
+            if "stream" in args.scenarios:
+                results[f"stream@{concurrency}"] = await bench_stream(client, queries, concurrency, args.requests)
+            if "books" in args.scenarios:
+                results[f"books@{concurrency}"] = await bench_books(client, concurrency, args.requests,
+                                                                    args.books_page_size)
+    return results
+
+
+def run_backend(args, env, catalog: str, workdir: str) -> dict:
+    """Start backend.py against the fake server and benchmark its HTTP endpoints"""
+    data_dir = Path(workdir) / "data"
+    data_dir.mkdir(parents=True)
+    shutil.copy(catalog, data_dir / "book_summaries.txt")
+
+    port = free_port()
+    env = dict(env, PYTHONPATH=os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")])))
+    log = open(Path(workdir) / "backend.log", "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    sampler = MemorySampler(process.pid).start()
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        live_seconds = wait_until_ready(base_url + "/healthz", process, args.startup_timeout)
+        ready_seconds = live_seconds + wait_until_ready(base_url + "/readyz", process, args.startup_timeout)
+        results = {"startup": {"live_seconds": live_seconds, "seconds": ready_seconds,
+                               "phases_ms": httpx.get(base_url + "/readyz").json()["phases_ms"],
+                               "rss_mb": rss_mb(process.pid)}}
+        queries = make_queries(catalog_titles(catalog), max(args.requests, 1), args.title_query_ratio, args.seed)
+        results.update(asyncio.run(bench_api(args, base_url, queries)))
+        results["backend_memory"] = {"peak_rss_mb": sampler.peak_mb, "final_rss_mb": rss_mb(process.pid)}
+        return results
+    finally:
+        sampler.stop()
+        stop(process)
+        log.close()
+
+
+def print_results(results: dict):
+    print(f"\n{'scenario':<14} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, result in results.items():
+        if "throughput_rps" in result:
+            print(f"{name:<14} {result['throughput_rps']:>9.1f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+                  f"{result['p99_ms']:>9.1f} {result['errors']:>7}")
+            if "ttft_p50_ms" in result:
+                print(f"{'  ttft':<14} {'':>9} {result['ttft_p50_ms']:>9.1f} {result['ttft_p95_ms']:>9.1f} "
+                      f"{result['ttft_p99_ms']:>9.1f}")
+    for name in ("populate", "startup", "backend_memory"):
+        if name in results:
+            details = ", ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                                for key, value in results[name].items())
+            print(f"{name}: {details}")
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> list:
+    """Print per-metric changes against a baseline run; returns the regressions beyond the threshold"""
+    regressions = []
+    print(f"\n{'metric':<32} {'baseline':>10} {'current':>10} {'change':>8}")
+    for scenario, result in current.items():
+        for metric in COMPARED_METRICS:
+            before = baseline.get(scenario, {}).get(metric)
+            after = result.get(metric)
+            if not isinstance(before, (int, float)) or not isinstance(after, (int, float)) or not before:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = "  REGRESSION" if worse > max_regression else ""
+            print(f"{scenario + '.' + metric:<32} {before:>10.2f} {after:>10.2f} {change:>+7.1f}%{flag}")
+            if flag:
+                regressions.append(f"{scenario}.{metric}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=2000, help="Synthetic catalog size")
+    parser.add_argument("--catalog", help="Use this catalog file instead of generating one")
+    parser.add_argument("--scenarios", default="populate,chat,stream,books")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario and concurrency level")
+    parser.add_argument("--title-query-ratio", type=float, default=0.3,
+                        help="Share of chat queries that ask about a catalog title directly")
+    parser.add_argument("--books-page-size", type=int, default=100)
+    parser.add_argument("--index-backend", default=os.getenv("VECTOR_INDEX_BACKEND", "chroma"))
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the backend and the ingestion run (repeatable)")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/e2e-<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=10.0,
+                        help="Percent change counted as a regression by --compare (exit code 1)")
+    parser.add_argument("--keep-workdir", action="store_true")
+    add_config_arguments(parser)
+    parser.add_argument("--populate-worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.populate_worker:
+        populate_worker(args)
+        return
+
+    args.scenarios = set(args.scenarios.split(","))
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+    fake_config = config_from_args(args)
+
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    fake_port = free_port()
+    fake = subprocess.Popen(
+        [sys.executable, str(BENCH_DIR / "fake_openai.py"), "--port", str(fake_port)] + config_to_args(fake_config)
+    )
+    try:
+        wait_until_ready(f"http://127.0.0.1:{fake_port}/health", fake, timeout=30)
+
+        catalog = args.catalog
+        if not catalog:
+            catalog = os.path.join(workdir, "book_summaries.txt")
+            generate_catalog(catalog, args.books, args.seed)
+
+        env = dict(os.environ, OPENAI_API_KEY="fake-key", OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1",
+                   VECTOR_INDEX_BACKEND=args.index_backend)
+        env.update(item.split("=", 1) for item in args.env)
+
+        results = {}
+        if "populate" in args.scenarios:
+            print("Benchmarking populate_database...")
+            results["populate"] = run_populate(args, env, catalog, os.path.join(workdir, "populate"))
+        if args.scenarios & {"chat", "stream", "books"}:
+            print("Starting backend and benchmarking the API...")
+            results.update(run_backend(args, env, catalog, os.path.join(workdir, "backend")))
+        fake_stats = httpx.get(f"http://127.0.0.1:{fake_port}/stats").json()
+    finally:
+        stop(fake)
+        if args.keep_workdir:
+            print(f"Work directory kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "catalog_books": len(catalog_titles(args.catalog)) if args.catalog else args.books,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "index_backend": args.index_backend,
+            "env": args.env,
+            "fake_openai": vars(fake_config),
+        },
+        "fake_openai_stats": fake_stats,
+        "results": results,
+    }
+    output = args.output or str(BENCH_DIR / "results" / f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.max_regression}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
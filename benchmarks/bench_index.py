@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Compare query latency of the Chroma and NumPy index backends.
+
+Uses synthetic random embeddings, so no OpenAI key is needed:
+
+    python benchmarks/bench_index.py --books 20000 --dim 1536 --queries 200
+
+``--filtered`` also times queries pre-filtered to 50%, 10% and 1% of the
+books through a metadata ``where`` clause.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from index_backends import open_index
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def bench_backend(backend: str, vectors: np.ndarray, queries: np.ndarray, n_results: int, batch_size: int,
+                  selectivities=()):
+    workdir = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    try:
+        index = open_index(backend, workdir, "bench")
+
+        started = time.perf_counter()
+        for start in range(0, len(vectors), 1000):
+            chunk = vectors[start:start + 1000]
+            ids = [f"book_{i}" for i in range(start, start + len(chunk))]
+            index.upsert(
+                ids=ids,
+                embeddings=chunk.tolist(),
+                documents=[f"Summary {i}" for i in range(start, start + len(chunk))],
+                metadatas=[{"title": f"Book {i}", "bucket": i % 100} for i in range(start, start + len(chunk))]
+            )
+        index.flush()
+        load_seconds = time.perf_counter() - started
+
+        single = []
+        for query in queries:
+            started = time.perf_counter()
+            index.query(query_embeddings=[query.tolist()], n_results=n_results)
+            single.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        for start in range(0, len(queries), batch_size):
+            index.query(query_embeddings=queries[start:start + batch_size].tolist(), n_results=n_results)
+        batched_per_query = (time.perf_counter() - started) * 1000 / len(queries)
+
+        # Buckets are spread evenly, so "bucket < pct" keeps pct% of the books
+        filtered = {}
+        for pct in selectivities:
+            where = {"bucket": {"$lt": pct}}
+            samples = []
+            for query in queries:
+                started = time.perf_counter()
+                index.query(query_embeddings=[query.tolist()], n_results=n_results, where=where)
+                samples.append((time.perf_counter() - started) * 1000)
+            filtered[pct] = percentile(samples, 50)
+
+        return {
+            "load_s": load_seconds,
+            "p50_ms": percentile(single, 50),
+            "p95_ms": percentile(single, 95),
+            "batched_ms_per_query": batched_per_query,
+            "disk_mb": directory_size(workdir) / 1024 / 1024,
+            "filtered_p50_ms": filtered,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--backends", default="chroma,numpy")
+    parser.add_argument("--filtered", action="store_true", help="Also time metadata-filtered queries")
+    args = parser.parse_args()
+    selectivities = (50, 10, 1) if args.filtered else ()
+
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((args.books, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    print(f"{args.books} books, dim {args.dim}, {args.queries} queries, top-{args.n_results}\n")
+    print(f"{'backend':<8} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'batch ms/q':>11} {'disk MB':>8}")
+    results = {}
+    for backend in args.backends.split(","):
+        result = results[backend] = bench_backend(backend, vectors, queries, args.n_results, args.batch_size,
+                                                  selectivities)
+        print(f"{backend:<8} {result['load_s']:>8.2f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['batched_ms_per_query']:>11.3f} {result['disk_mb']:>8.1f}")
+
+    if selectivities:
+        print(f"\n{'backend':<8} " + " ".join(f"{f'p50 ms @{pct}%':>12}" for pct in (100,) + selectivities))
+        for backend, result in results.items():
+            row = [result['p50_ms']] + [result['filtered_p50_ms'][pct] for pct in selectivities]
+            print(f"{backend:<8} " + " ".join(f"{value:>12.2f}" for value in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Recall and latency of reduced-dimension and quantized retrieval in the NumPy index.
+
+For each embedding size and first-pass quantization (none, int8, binary) the
+catalog vectors are truncated to that size, renormalized and served from a
+memory-mapped file, as with EMBEDDING_DIMENSIONS and VECTOR_QUANTIZATION.
+Recall@k is measured against exact search over the full-size vectors, so it
+includes the loss from both truncation and quantization.
+
+    python benchmarks/bench_quantization.py --books 20000 --dims 1536,512,256
+    python benchmarks/bench_quantization.py --snapshot books.snap --rescore-factors 5,10,20
+
+Without --snapshot the vectors are synthetic: clustered, with variance decaying
+over the dimensions as in Matryoshka-trained models. Real embeddings from a
+snapshot give representative recall; queries are noisy copies of catalog vectors.
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from index_backends import NumpyIndex, QUANTIZATION_MODES
+from index_snapshot import IndexSnapshot
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def synthetic_vectors(books: int, dim: int, clusters: int, spread: float, rng) -> np.ndarray:
+    decay = (1.0 + np.arange(dim, dtype=np.float32) / 256) ** -0.5
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32) * decay
+    members = centers[rng.integers(clusters, size=books)]
+    return normalize(members + spread * rng.standard_normal((books, dim), dtype=np.float32) * decay)
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, rng) -> np.ndarray:
+    picks = vectors[rng.integers(vectors.shape[0], size=count)]
+    scale = np.abs(vectors).mean(axis=0)
+    return normalize(picks + noise * rng.standard_normal(picks.shape, dtype=np.float32) * scale)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top
+
+
+def bench_config(vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, dim: int, mode: str,
+                 rescore_factor: int, k: int, workdir: str) -> dict:
+    # Serve the truncated vectors from a memory map, as a flushed index or snapshot would
+    path = Path(workdir) / f"vectors-{dim}.npy"
+    if not path.exists():
+        np.save(path, normalize(vectors[:, :dim]))
+    mapped = np.load(path, mmap_mode="r")
+
+    index = NumpyIndex(str(Path(workdir) / "index"), quantization=mode, rescore_factor=rescore_factor)
+    ids = [str(row) for row in range(mapped.shape[0])]
+    index.replace_all(ids, ids, [{}] * len(ids), mapped)
+
+    started = time.perf_counter()
+    quantized = index.quantized()
+    build_ms = (time.perf_counter() - started) * 1000
+
+    truncated_queries = normalize(queries[:, :dim])
+    index.query(truncated_queries[:1], k)
+    latencies, recalls = [], []
+    for query, expected in zip(truncated_queries, truth):
+        started = time.perf_counter()
+        result = index.query(query[None, :], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found = {int(doc_id) for doc_id in result["ids"][0]}
+        recalls.append(len(found & set(expected.tolist())) / k)
+
+    return {
+        "dim": dim,
+        "quantization": mode,
+        "rescore_factor": rescore_factor if mode != "none" else None,
+        "recall": float(np.mean(recalls)),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "build_ms": build_ms if quantized is not None else 0.0,
+        # Private per-worker memory: the quantized codes, or the whole matrix when it is scanned
+        "scan_mb": (quantized.nbytes if quantized is not None else mapped.nbytes) / 1024 / 1024,
+        "vectors_mb": mapped.nbytes / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshot", help="Use the vectors of an index snapshot instead of synthetic ones")
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536, help="Full size of synthetic vectors")
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=0.5, help="Within-cluster spread of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-noise", type=float, default=0.5)
+    parser.add_argument("--k", type=int, default=10, help="Results per query (the hybrid search depth is 10)")
+    parser.add_argument("--dims", default="1536,1024,512,256")
+    parser.add_argument("--modes", default=",".join(QUANTIZATION_MODES))
+    parser.add_argument("--rescore-factors", default="10")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.snapshot:
+        snapshot = IndexSnapshot(args.snapshot, verify=False)
+        vectors = np.asarray(snapshot.vectors(), dtype=np.float32)
+        source = f"{args.snapshot} ({snapshot.embedding_model})"
+    else:
+        vectors = synthetic_vectors(args.books, args.dim, args.clusters, args.spread, rng)
+        source = "synthetic"
+    queries = make_queries(vectors, args.queries, args.query_noise, rng)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    dims = [dim for dim in map(int, args.dims.split(",")) if dim <= vectors.shape[1]]
+    factors = [int(factor) for factor in args.rescore_factors.split(",")]
+    print(f"{vectors.shape[0]} vectors of dim {vectors.shape[1]} from {source}, "
+          f"{args.queries} queries, recall@{args.k} vs exact full-size search\n")
+    print(f"{'dim':>5} {'quant':<7} {'rescore':>7} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'scan MB':>8} {'vectors MB':>11}")
+
+    workdir = tempfile.mkdtemp(prefix="bench_quant_")
+    results = []
+    try:
+        for dim in dims:
+            for mode in args.modes.split(","):
+                for factor in (factors if mode != "none" else factors[:1]):
+                    result = bench_config(vectors, queries, truth, dim, mode, factor, args.k, workdir)
+                    results.append(result)
+                    print(f"{dim:>5} {mode:<7} {str(result['rescore_factor'] or '-'):>7} {result['recall']:>7.3f} "
+                          f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['scan_mb']:>8.1f} "
+                          f"{result['vectors_mb']:>11.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"source": source, "books": int(vectors.shape[0]), "k": args.k, "results": results},
+                      file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory when several workers attach to one shared index snapshot.
+
+Writes a snapshot of a synthetic catalog (random vectors, no OpenAI calls),
+then starts --workers processes that each attach to it the way a
+SHARED_INDEX_DIR worker does (NumPy backend; vectors, catalog and BM25,
+title and metadata indexes memory-mapped from the snapshot) and run a few
+vector, filtered, BM25 and title queries and build the GET /books listing. With all of them attached, each
+worker's memory is read from /proc/<pid>/smaps_rollup:
+
+  rss       resident set, counting the shared snapshot pages in full
+  pss       proportional set: shared pages divided among the processes mapping them
+  private   pages only this worker holds (with a single worker, the snapshot too)
+  shared    pages also mapped by other workers (the snapshot)
+  anon      anonymous memory: heap and other pages no file backs, whatever the worker count
+
+    python benchmarks/bench_shared_index.py --books 20000 --workers 4
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+
+def memory_mb(pid: int) -> dict:
+    """rss/pss/private/shared/anon of a process in MB (Linux only)"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": round(values.get("Rss", 0), 1),
+        "pss": round(values.get("Pss", 0), 1),
+        "private": round(values.get("Private_Clean", 0) + values.get("Private_Dirty", 0), 1),
+        "shared": round(values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0), 1),
+        "anon": round(values.get("Anonymous", 0), 1),
+    }
+
+
+def build_snapshot(path: str, workdir: str, books: int, dim: int):
+    from embedding_cache import EmbeddingCache
+    from generate_catalog import generate_catalog
+    from index_snapshot import write_snapshot
+    from vector_store import BookVectorStore
+
+    catalog = os.path.join(workdir, "catalog.txt")
+    generate_catalog(catalog, books, fields=True)
+    store = BookVectorStore("bench-key", index_backend="numpy",
+                            embedding_cache=EmbeddingCache(db_path=os.path.join(workdir, "cache.db")))
+    parsed = list(store.iter_books(catalog))
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((len(parsed), dim), dtype=np.float32)
+    write_snapshot(path, [([book["id"] for book in parsed], vectors, [book["summary"] for book in parsed],
+                           [book["metadata"] for book in parsed])], "text-embedding-3-small")
+
+
+def attach(snapshot: str, workdir: str, dim: int):
+    """Worker process: attach, touch the vectors, report, then wait for the parent to finish measuring"""
+    from catalog_snapshot import CatalogSnapshotCache
+    from embedding_cache import EmbeddingCache
+    from vector_store import BookVectorStore
+
+    before = memory_mb(os.getpid())
+    started = time.perf_counter()
+    # stdout carries the report to the parent
+    with contextlib.redirect_stdout(sys.stderr):
+        cache = EmbeddingCache(db_path=os.path.join(workdir, f"cache-{os.getpid()}.db"))
+        store = BookVectorStore("bench-key", persist_directory=os.path.dirname(snapshot),
+                                embedding_cache=cache, index_backend="numpy")
+        store.create_collection()
+        store.import_snapshot(snapshot, verify=False, persist=False)
+        # Built during a backend worker's warm-up
+        CatalogSnapshotCache().get(store).page(None, 100, ["id", "title", "summary"])
+    attach_ms = (time.perf_counter() - started) * 1000
+
+    rng = np.random.default_rng(os.getpid())
+    titles = store.collection.get(include=["metadatas"], limit=5)["metadatas"]
+    for metadata in titles:
+        query = rng.standard_normal(dim, dtype=np.float32).tolist()
+        store.query_collection(query, n_results=3)
+        store.query_collection(query, n_results=3, filters={"year_min": 1950})
+        store.hybrid_query("a story about freedom and the sea", query, n_results=3)
+        store.lexical_match(metadata["title"])
+        store.title_index.resolve(metadata["title"].lower())
+    print(json.dumps({"pid": os.getpid(), "attach_ms": round(attach_ms, 1), "before": before}), flush=True)
+    sys.stdin.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--attach", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.attach:
+        attach(args.attach, args.workdir, args.dim)
+        return
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("This benchmark reads /proc/<pid>/smaps_rollup (Linux only)")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        snapshot = os.path.join(workdir, "shared", "books-000001.snap")
+        os.makedirs(os.path.dirname(snapshot))
+        build_snapshot(snapshot, workdir, args.books, args.dim)
+        snapshot_mb = os.path.getsize(snapshot) / 1024 / 1024
+        print(f"Snapshot: {args.books} books, dim {args.dim}, {snapshot_mb:.1f} MB")
+
+        env = dict(os.environ, HYBRID_SEARCH="1")
+        workers = [subprocess.Popen([sys.executable, __file__, "--attach", snapshot, "--workdir", workdir,
+                                     "--dim", str(args.dim)],
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                    env=env)
+                   for _ in range(args.workers)]
+        reports = [json.loads(worker.stdout.readline()) for worker in workers]
+        for report in reports:
+            report["after"] = memory_mb(report["pid"])
+        for worker in workers:
+            worker.stdin.close()
+            worker.wait()
+
+    print(f"{'worker':>8} {'attach ms':>10} {'rss':>8} {'pss':>8} {'private':>8} {'shared':>8} {'anon':>8}"
+          f"  (MB, after attach)")
+    for i, report in enumerate(reports):
+        after = report["after"]
+        print(f"{i:>8} {report['attach_ms']:>10.0f} {after['rss']:>8.1f} {after['pss']:>8.1f} "
+              f"{after['private']:>8.1f} {after['shared']:>8.1f} {after['anon']:>8.1f}")
+    anon = [report["after"]["anon"] - report["before"]["anon"] for report in reports]
+    print(f"Anonymous memory added by attaching: {min(anon):.1f}-{max(anon):.1f} MB per worker; "
+          f"total PSS {sum(report['after']['pss'] for report in reports):.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
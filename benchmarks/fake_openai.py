@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI embeddings and chat-completions endpoints.
+
+Vectors are derived from a hash of the input text, so the same text always
+gets the same embedding. Latency, tool-call behaviour, a requests-per-minute
+quota (answered with 429 + Retry-After) and a 5xx error rate are configurable:
+
+    python benchmarks/fake_openai.py --port 8765 --chat-latency-ms 400 --tool-call-rate 0.3
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1 (any API key works).
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+QUOTA_WINDOW_SECONDS = 60.0
+
+CONTEXT_TITLE_PATTERN = re.compile(r"^\d+\. (.+?): ", re.MULTILINE)
+FILLER_WORDS = ("Îți", "recomand", "această", "carte", "pentru", "temele", "și", "personajele", "ei", "memorabile")
+
+
+@dataclass
+class FakeConfig:
+    dim: int = 1536
+    embedding_latency_ms: float = 20.0
+    embedding_per_input_ms: float = 0.05
+    chat_latency_ms: float = 300.0
+    # Per-model chat latency overriding chat_latency_ms, e.g. "gpt-4o=900,gpt-4o-mini=250"
+    model_latency_ms: str = ""
+    token_interval_ms: float = 5.0
+    completion_tokens: int = 60
+    tool_call_rate: float = 0.3
+    jitter: float = 0.1
+    # Requests per minute per endpoint before answering 429 (0 = unlimited)
+    quota_rpm: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+def fake_embedding(text: str, dim: int, seed: int = 0) -> np.ndarray:
+    """Unit-length vector seeded by the text, identical across runs and processes"""
+    digest = hashlib.sha1(f"{seed}:{text}".encode("utf-8")).digest()
+    vector = np.random.default_rng(int.from_bytes(digest[:8], "little")).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    counters = Counter()
+    lock = threading.Lock()
+
+    def count(**deltas):
+        with lock:
+            counters.update(deltas)
+
+    windows = {"embeddings": deque(), "chat": deque()}
+    model_latency = {model.strip(): float(ms) for model, ms in
+                     (pair.split("=") for pair in config.model_latency_ms.split(",") if pair.strip())}
+
+    async def reject(endpoint: str, latency_ms: float):
+        """A 429 once the endpoint's quota for the last minute is used up, a random 500, or None"""
+        if config.error_rate and random.random() < config.error_rate:
+            # Server errors take about as long as a normal response
+            await asyncio.sleep(delay(latency_ms))
+            count(server_errors=1)
+            return JSONResponse({"error": {"message": "Injected server error", "type": "server_error"}},
+                                status_code=500)
+        if not config.quota_rpm:
+            return None
+        now = time.monotonic()
+        with lock:
+            window = windows[endpoint]
+            while window and window[0] <= now - QUOTA_WINDOW_SECONDS:
+                window.popleft()
+            if len(window) >= config.quota_rpm:
+                retry_after = window[0] + QUOTA_WINDOW_SECONDS - now
+                counters.update(rate_limited=1)
+                return JSONResponse(
+                    {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                    status_code=429, headers={"retry-after": f"{retry_after:.3f}"}
+                )
+            window.append(now)
+        return None
+
+    def delay(base_ms: float) -> float:
+        jitter = random.uniform(-config.jitter, config.jitter) if config.jitter else 0.0
+        return max(base_ms * (1 + jitter), 0.0) / 1000
+
+    def wants_tool_call(body: dict) -> bool:
+        """Deterministic per conversation: the same messages always make the same choice"""
+        if not body.get("tools") or any(message.get("role") == "tool" for message in body["messages"]):
+            return False
+        digest = hashlib.sha1(json.dumps(body["messages"], sort_keys=True).encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "little") / 2 ** 32 < config.tool_call_rate
+
+    def tool_call(body: dict) -> dict:
+        context = " ".join(m.get("content") or "" for m in body["messages"] if m.get("role") == "system")
+        titles = CONTEXT_TITLE_PATTERN.findall(context)
+        return {
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {
+                "name": body["tools"][0]["function"]["name"],
+                "arguments": json.dumps({"title": titles[0] if titles else "1984"}, ensure_ascii=False),
+            },
+        }
+
+    def completion_words() -> list:
+        return [FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(config.completion_tokens)]
+
+    def usage(body: dict, completion_tokens: int) -> dict:
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in body["messages"])
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/stats")
+    async def stats():
+        with lock:
+            return dict(counters)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        rejection = await reject("embeddings", config.embedding_latency_ms)
+        if rejection is not None:
+            return rejection
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        count(embedding_requests=1, embedding_inputs=len(inputs))
+        await asyncio.sleep(delay(config.embedding_latency_ms + config.embedding_per_input_ms * len(inputs)))
+
+        data = []
+        dimensions = body.get("dimensions")
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(text, config.dim, config.seed)
+            if dimensions and dimensions < config.dim:
+                # Shortened like text-embedding-3: truncate, then renormalize
+                vector = vector[:dimensions] / np.linalg.norm(vector[:dimensions])
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        tokens = sum(estimate_tokens(text) for text in inputs)
+        return JSONResponse({"object": "list", "data": data, "model": body.get("model"),
+                             "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        rejection = await reject("chat", config.chat_latency_ms)
+        if rejection is not None:
+            return rejection
+        body = await request.json()
+        call = tool_call(body) if wants_tool_call(body) else None
+        count(chat_requests=1, tool_calls=1 if call else 0, streamed=1 if body.get("stream") else 0,
+              **{f"model:{body.get('model')}": 1})
+        latency_ms = model_latency.get(body.get("model"), config.chat_latency_ms)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        words = [] if call else completion_words()
+        # One word per token, cut at max_tokens like a real completion
+        truncated = bool(body.get("max_tokens")) and len(words) > body["max_tokens"]
+        words = words[:body["max_tokens"]] if truncated else words
+        finish_reason = "tool_calls" if call else "length" if truncated else "stop"
+
+        if body.get("stream"):
+            async def stream():
+                await asyncio.sleep(delay(latency_ms))
+
+                def chunk(delta, finish_reason=None):
+                    payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                               "model": body.get("model"),
+                               "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+                if call:
+                    yield chunk({"role": "assistant", "tool_calls": [dict(call, index=0)]})
+                    yield chunk({}, "tool_calls")
+                else:
+                    yield chunk({"role": "assistant", "content": ""})
+                    for i, word in enumerate(words):
+                        if config.token_interval_ms:
+                            await asyncio.sleep(delay(config.token_interval_ms))
+                        yield chunk({"content": word if i == 0 else f" {word}"})
+                    yield chunk({}, finish_reason)
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(stream(), media_type="text/event-stream")
+
+        await asyncio.sleep(delay(latency_ms + config.token_interval_ms * len(words)))
+        message = {"role": "assistant", "content": None if call else " ".join(words)}
+        if call:
+            message["tool_calls"] = [call]
+        return JSONResponse({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": body.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage(body, len(words)),
+        })
+
+    return app
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    defaults = FakeConfig()
+    parser.add_argument("--dim", type=int, default=defaults.dim)
+    parser.add_argument("--embedding-latency-ms", type=float, default=defaults.embedding_latency_ms)
+    parser.add_argument("--embedding-per-input-ms", type=float, default=defaults.embedding_per_input_ms)
+    parser.add_argument("--chat-latency-ms", type=float, default=defaults.chat_latency_ms)
+    parser.add_argument("--model-latency-ms", default=defaults.model_latency_ms,
+                        help="Per-model chat latency, e.g. gpt-4o=900,gpt-4o-mini=250")
+    parser.add_argument("--token-interval-ms", type=float, default=defaults.token_interval_ms)
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens)
+    parser.add_argument("--tool-call-rate", type=float, default=defaults.tool_call_rate)
+    parser.add_argument("--jitter", type=float, default=defaults.jitter)
+    parser.add_argument("--quota-rpm", type=float, default=defaults.quota_rpm,
+                        help="Requests per minute per endpoint before answering 429 (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate,
+                        help="Fraction of requests answered with a 500")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args) -> FakeConfig:
+    return FakeConfig(
+        dim=args.dim,
+        embedding_latency_ms=args.embedding_latency_ms,
+        embedding_per_input_ms=args.embedding_per_input_ms,
+        chat_latency_ms=args.chat_latency_ms,
+        model_latency_ms=args.model_latency_ms,
+        token_interval_ms=args.token_interval_ms,
+        completion_tokens=args.completion_tokens,
+        tool_call_rate=args.tool_call_rate,
+        jitter=args.jitter,
+        quota_rpm=args.quota_rpm,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+def config_to_args(config: FakeConfig) -> list:
+    return [f"--{name.replace('_', '-')}={value}" for name, value in vars(config).items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Write a synthetic catalog in the book_summaries.txt format.
+
+    python benchmarks/generate_catalog.py --books 10000 --output /tmp/book_summaries.txt
+    python benchmarks/generate_catalog.py --books 10000 --fields --output /tmp/book_summaries.txt
+
+With ``--fields`` every entry also gets Author, Genre, Language, Year and
+Availability lines; titles and summaries are the same as without it.
+"""
+
+import argparse
+import random
+
+ADJECTIVES = ("Silent", "Crimson", "Forgotten", "Hidden", "Last", "Broken", "Golden", "Distant", "Endless",
+              "Burning", "Frozen", "Secret", "Wandering", "Lost", "Northern", "Invisible")
+NOUNS = ("River", "Kingdom", "Garden", "Empire", "Letter", "Voyage", "Mirror", "Harbor", "Orchard", "Archive",
+         "Lighthouse", "Labyrinth", "Comet", "Winter", "Citadel", "Promise")
+PROTAGONISTS = ("a young cartographer", "an exiled princess", "a retired detective", "two estranged sisters",
+                "a village teacher", "a starship engineer", "an orphaned thief", "a grieving composer")
+CONFLICTS = ("uncovers a conspiracy that reaches the highest circles of power",
+             "must cross a hostile continent to keep an old promise",
+             "discovers a family secret buried for three generations",
+             "is drawn into a war between rival guilds",
+             "searches for a missing friend in a city that never sleeps",
+             "tries to survive a long winter after the collapse of society")
+THEMES = ("friendship", "freedom", "war", "love", "identity", "courage", "power", "memory", "justice",
+          "magic", "loss", "redemption", "technology", "nature", "family", "betrayal")
+FIRST_NAMES = ("Ana", "Mihai", "Elena", "Jonas", "Clara", "Tomas", "Irina", "Paul", "Sofia", "Radu")
+LAST_NAMES = ("Ionescu", "Weber", "Marin", "Dumont", "Popa", "Keller", "Stan", "Moreau", "Lungu", "Brandt")
+GENRES = ("Fantasy", "Science Fiction", "Mystery", "Romance", "Historical Fiction", "Thriller",
+          "Literary Fiction", "Adventure")
+# Skewed like a real collection: most books in a few languages
+LANGUAGES = (("ro", 45), ("en", 30), ("fr", 10), ("de", 10), ("es", 5))
+AVAILABILITY = (("available", 70), ("on loan", 25), ("reserved", 5))
+
+
+def make_book(i: int, rng: random.Random) -> str:
+    title = f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}"
+    themes = ", ".join(rng.sample(THEMES, 4))
+    summary = (f"{rng.choice(PROTAGONISTS).capitalize()} {rng.choice(CONFLICTS)}. "
+               f"Along the way, old loyalties are tested and new ones are forged. "
+               f"Themes include {themes}.")
+    return f"## Title: {title}\n{summary}\n"
+
+
+def make_fields(rng: random.Random) -> str:
+    def weighted(choices):
+        return rng.choices([value for value, _ in choices], weights=[weight for _, weight in choices])[0]
+
+    return (f"Author: {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}\n"
+            f"Genre: {rng.choice(GENRES)}\n"
+            f"Language: {weighted(LANGUAGES)}\n"
+            f"Year: {rng.randint(1900, 2024)}\n"
+            f"Availability: {weighted(AVAILABILITY)}\n")
+
+
+def generate_catalog(path: str, books: int, seed: int = 42, fields: bool = False) -> int:
+    """Write ``books`` synthetic entries to ``path`` and return the number written"""
+    rng = random.Random(seed)
+    # Fields come from their own generator, so adding them leaves the rest of the catalog unchanged
+    field_rng = random.Random(seed + 1)
+    with open(path, "w", encoding="utf-8") as file:
+        for i in range(books):
+            entry = make_book(i, rng)
+            if fields:
+                title, _, summary = entry.partition("\n")
+                entry = f"{title}\n{make_fields(field_rng)}{summary}"
+            file.write(entry)
+            file.write("\n")
+    return books
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--output", default="book_summaries.txt")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fields", action="store_true", help="Add author, genre, language, year and availability")
+    args = parser.parse_args()
+
+    generate_catalog(args.output, args.books, args.seed, args.fields)
+    print(f"Wrote {args.books} books to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
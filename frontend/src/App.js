@@ -10,6 +10,8 @@ function App() {
   const [isLoading, setIsLoading] = useState(false);
   const [books, setBooks] = useState([]);
   const [showBooks, setShowBooks] = useState(false);
+  // Conversation on the server; created with the first message, sent with follow-ups
+  const [sessionId, setSessionId] = useState(null);
   const messagesEndRef = useRef(null);
 
   useEffect(() => {
@@ -45,6 +47,11 @@ function App() {
       const response = await axios.get(`${API_BASE_URL}/books`);
       setBooks(response.data.books);
     } catch (error) {
+      // 503 while the backend is still loading the catalog: try again shortly
+      if (error.response?.status === 503) {
+        setTimeout(fetchBooks, 1000);
+        return;
+      }
       console.error('Failed to fetch books:', error);
     }
   };
@@ -65,9 +72,12 @@ function App() {
     setIsLoading(true);
 
     try {
-      const response = await axios.post(`${API_BASE_URL}/chat`, {
-        message: inputMessage
-      });
+      const response = await axios.post(`${API_BASE_URL}/chat`, sessionId
+        ? { message: inputMessage, session_id: sessionId }
+        : { message: inputMessage, new_session: true });
+      if (response.data.session_id) {
+        setSessionId(response.data.session_id);
+      }
 
       const assistantMessage = {
         id: Date.now() + 1,
@@ -92,6 +102,12 @@ function App() {
   };
 
   const clearChat = () => {
+    if (sessionId) {
+      axios.delete(`${API_BASE_URL}/chat/sessions/${sessionId}`).catch((error) => {
+        console.error('Failed to delete session:', error);
+      });
+      setSessionId(null);
+    }
     setMessages([
       {
         id: 1,
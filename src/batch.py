@@ -0,0 +1,370 @@
+"""
+Batch recommendations for large lists of independent queries.
+
+Input is JSON lines, one query per line: ``{"id": "u42", "query": "...",
+"filters": {...}}`` (``id`` defaults to the line number, ``message`` is
+accepted for ``query``, ``filters`` is optional). Queries are processed in
+chunks: the content filter and intent router run locally, title lookups are
+answered from BM25, the rest are embedded in one request per chunk and
+searched with one multi-query index call per distinct filter. Completions
+then run with bounded concurrency, and each result is written as a JSON line
+as soon as it is ready, so output order differs from input order.
+
+The output doubles as the checkpoint: a rerun with the same output file
+skips the ids it already answered, so an interrupted run resumes where it
+stopped. Failed queries are written with an ``error`` and retried on the
+next run; the last line for an id wins.
+
+    python src/batch.py queries.jsonl results.jsonl --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import (AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set,
+                    Union)
+
+
+def _parse_line(number: int, line: str) -> Optional[Dict]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"id": str(number), "query": None, "filters": None, "error": f"Invalid JSON on line {number}: {e.msg}"}
+    if not isinstance(record, dict):
+        return {"id": str(number), "query": None, "filters": None, "error": f"Line {number} is not a JSON object"}
+
+    query = record.get("query", record.get("message"))
+    item = {"id": str(record.get("id", number)), "query": query, "filters": record.get("filters")}
+    if not isinstance(query, str) or not query.strip():
+        item["error"] = "Missing 'query'"
+    elif item["filters"] is not None and not isinstance(item["filters"], dict):
+        item["error"] = "'filters' must be an object"
+    return item
+
+
+def parse_items(lines: Iterable[str]) -> Iterator[Dict]:
+    """Batch items from JSON lines; malformed lines become items carrying an ``error``"""
+    for number, line in enumerate(lines, 1):
+        item = _parse_line(number, line)
+        if item is not None:
+            yield item
+
+
+async def aparse_items(lines: AsyncIterable[str]) -> AsyncIterator[Dict]:
+    """``parse_items`` for lines that arrive asynchronously, e.g. a streamed request body"""
+    number = 0
+    async for line in lines:
+        number += 1
+        item = _parse_line(number, line)
+        if item is not None:
+            yield item
+
+
+async def read_lines(pieces: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Decoded lines of a byte stream, each yielded as soon as its newline arrives"""
+    buffer = b""
+    async for piece in pieces:
+        lines = (buffer + piece).split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8", errors="replace")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace")
+
+
+def read_checkpoint(path: str) -> Set[str]:
+    """Ids answered in an earlier run's output; a torn last line is cut off so appended lines stay valid"""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as file:
+        valid_bytes = 0
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            valid_bytes += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("answer") is not None and "error" not in record:
+                done.add(str(record["id"]))
+        file.truncate(valid_bytes)
+    return done
+
+
+async def _chunks(items: Union[Iterable[Dict], AsyncIterable[Dict]], size: int) -> AsyncIterator[List[Dict]]:
+    """Lists of up to ``size`` items, each yielded as soon as it is full"""
+    chunk = []
+    async for item in _aiter(items):
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _aiter(items: Union[Iterable[Dict], AsyncIterable[Dict]]) -> AsyncIterator[Dict]:
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def _filters_key(filters: Optional[Dict]) -> str:
+    return json.dumps(filters, sort_keys=True)
+
+
+def _failed(error: Exception) -> Dict:
+    return {"error": f"Retrieval failed: {type(error).__name__}: {error}"}
+
+
+class BatchRunner:
+    """Answers independent, stateless queries for an AsyncSmartLibrarian.
+
+    Items are taken ``chunk_size`` at a time (at most 2048, the embeddings
+    API's input limit) and retrieved together; completions run with at most
+    ``concurrency`` in flight, and the next chunk is retrieved while the last
+    completions of the previous one finish. All OpenAI calls still go
+    through the shared gateway's limits.
+    """
+
+    def __init__(self, async_librarian, concurrency: Optional[int] = None, chunk_size: Optional[int] = None,
+                 n_results: int = 3):
+        self.async_librarian = async_librarian
+        self.concurrency = concurrency or int(os.getenv("BATCH_CONCURRENCY", "32"))
+        self.chunk_size = min(chunk_size or int(os.getenv("BATCH_CHUNK_SIZE", "1000")), 2048)
+        self.n_results = n_results
+
+    async def run(self, items: Union[Iterable[Dict], AsyncIterable[Dict]],
+                  emit: Callable[[Dict], Awaitable]) -> Dict[str, int]:
+        """Answer every item, passing each result record to ``emit``; returns answered/failed counts.
+
+        ``items`` may be an async iterable: each chunk is retrieved as soon as
+        it has been read, while the rest of the input is still arriving.
+        """
+        from model_router import BATCH_CALLS
+
+        # Inherited by the tasks below; the current task's context is restored on return
+        batch_calls = BATCH_CALLS.set(True)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending: Set[asyncio.Task] = set()
+        counts = Counter()
+
+        async def answer(item: Dict, plan: Dict):
+            try:
+                record = await self._answer(item, plan)
+            finally:
+                semaphore.release()
+            counts["failed" if "error" in record else "answered"] += 1
+            await emit(record)
+
+        try:
+            async for chunk in _chunks(items, self.chunk_size):
+                plans = await self._retrieve(chunk)
+                for item, plan in zip(chunk, plans):
+                    await semaphore.acquire()
+                    task = asyncio.create_task(answer(item, plan))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            for task in pending:
+                task.cancel()
+            BATCH_CALLS.reset(batch_calls)
+        return dict(counts)
+
+    async def _retrieve(self, chunk: List[Dict]) -> List[Dict]:
+        """Plan each item of a chunk: a ready answer, a direct title route, retrieved books or an error.
+
+        A failing lookup, embedding or search call fails only the items still
+        waiting on it; plans already settled are kept.
+        """
+        from instrumentation import ANSWERS
+        from intent_router import ROUTE_DIRECT_TITLE
+        from tools import filter_inappropriate_language
+        from vector_store import build_where
+
+        librarian = self.async_librarian.librarian
+        store = self.async_librarian.vector_store
+        plans: List[Optional[Dict]] = [None] * len(chunk)
+        groups: Dict[str, List[int]] = {}
+        for i, item in enumerate(chunk):
+            if "error" in item:
+                plans[i] = {"error": item["error"]}
+                continue
+            try:
+                is_appropriate, filtered_message = filter_inappropriate_language(item["query"])
+                route = librarian.router.route(item["query"], filters=item["filters"]) if is_appropriate else None
+            except Exception as e:
+                plans[i] = _failed(e)
+                continue
+            if not is_appropriate:
+                ANSWERS.inc(source="filtered")
+                plans[i] = {"answer": filtered_message, "source": "filtered"}
+                continue
+            if route.name == ROUTE_DIRECT_TITLE:
+                plans[i] = {"route": route}
+                continue
+            try:
+                build_where(item["filters"])
+            except (ValueError, TypeError) as e:
+                plans[i] = {"error": str(e)}
+                continue
+            groups.setdefault(_filters_key(item["filters"]), []).append(i)
+
+        # Title lookups need no embedding; one executor hop per filter
+        searching = []
+        for indexes in groups.values():
+            try:
+                matches = await store.lexical_match_batch([chunk[i]["query"] for i in indexes], self.n_results,
+                                                          chunk[indexes[0]]["filters"])
+            except Exception as e:
+                for i in indexes:
+                    plans[i] = _failed(e)
+                continue
+            for i, books in zip(indexes, matches):
+                if books is None:
+                    searching.append(i)
+                else:
+                    plans[i] = {"books": books}
+        if not searching:
+            return plans
+
+        try:
+            embeddings = await store.get_embeddings([chunk[i]["query"] for i in searching])
+        except Exception as e:
+            for i in searching:
+                plans[i] = _failed(e)
+            return plans
+        to_search: Dict[str, List[int]] = {}
+        for i, embedding in zip(searching, embeddings):
+            cached_answer = librarian.cached_answer(embedding, [], chunk[i]["filters"])
+            if cached_answer is not None:
+                ANSWERS.inc(source="response_cache")
+                plans[i] = {"answer": cached_answer, "source": "response_cache"}
+            else:
+                plans[i] = {"embedding": embedding}
+                to_search.setdefault(_filters_key(chunk[i]["filters"]), []).append(i)
+
+        for indexes in to_search.values():
+            try:
+                results = await store.hybrid_query_batch([chunk[i]["query"] for i in indexes],
+                                                         [plans[i]["embedding"] for i in indexes], self.n_results,
+                                                         chunk[indexes[0]]["filters"])
+            except Exception as e:
+                for i in indexes:
+                    plans[i] = _failed(e)
+                continue
+            for i, books in zip(indexes, results):
+                plans[i]["books"] = books
+        return plans
+
+    async def _answer(self, item: Dict, plan: Dict) -> Dict:
+        record = {"id": item["id"], "query": item["query"]}
+        if "error" in plan:
+            record["error"] = plan["error"]
+            return record
+
+        started = time.perf_counter()
+        librarian = self.async_librarian
+        try:
+            if "answer" in plan:
+                answer, source, books = plan["answer"], plan["source"], []
+            elif "route" in plan:
+                route = plan["route"]
+                answer = await librarian.direct_answer(item["query"], route, [])
+                source = "template" if librarian.librarian.router.mode == "template" else "direct_completion"
+                books = [route.title]
+            else:
+                answer = await librarian.recommend(item["query"], plan["books"], [],
+                                                   query_embedding=plan.get("embedding"), filters=item["filters"])
+                source, books = "completion", [book["title"] for book in plan["books"]]
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            return record
+
+        if not answer:
+            record["error"] = "Empty answer"
+            return record
+        record.update(answer=answer, books=books, source=source,
+                      elapsed_ms=round((time.perf_counter() - started) * 1000, 1))
+        return record
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSON lines with one query per line")
+    parser.add_argument("output", help="JSON lines results, appended to when resuming")
+    parser.add_argument("--catalog", default="data/book_summaries.txt")
+    parser.add_argument("--concurrency", type=int, help="Completions in flight (default BATCH_CONCURRENCY or 32)")
+    parser.add_argument("--chunk-size", type=int, help="Queries retrieved together (default BATCH_CHUNK_SIZE or 1000)")
+    parser.add_argument("--restart", action="store_true", help="Ignore earlier results in the output file")
+    args = parser.parse_args()
+
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        sys.exit("OPENAI_API_KEY not found in environment variables!")
+    if not os.path.isfile(args.input):
+        sys.exit(f"Input file not found: {args.input}")
+
+    done = set() if args.restart else read_checkpoint(args.output)
+    with open(args.input, "r", encoding="utf-8") as file:
+        total = sum(1 for line in file if line.strip())
+    if done:
+        print(f"Resuming: {len(done)} of {total} queries already answered in {args.output}")
+
+    from chatbot import SmartLibrarian, AsyncSmartLibrarian
+
+    librarian = SmartLibrarian(openai_api_key, args.catalog)
+    async_librarian = AsyncSmartLibrarian(librarian, openai_api_key)
+    runner = BatchRunner(async_librarian, args.concurrency, args.chunk_size)
+
+    started = time.perf_counter()
+    progress = Counter()
+    last_report = [started]
+
+    with open(args.input, "r", encoding="utf-8") as source, \
+            open(args.output, "w" if args.restart else "a", encoding="utf-8") as output:
+        async def emit(record: Dict):
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            progress["failed" if "error" in record else "answered"] += 1
+            now = time.perf_counter()
+            if now - last_report[0] >= 5:
+                last_report[0] = now
+                finished = sum(progress.values())
+                print(f"{len(done) + finished}/{total} queries ({finished / (now - started):.1f}/s, "
+                      f"{progress['failed']} failed)")
+
+        items = (item for item in parse_items(source) if item["id"] not in done)
+        try:
+            counts = asyncio.run(runner.run(items, emit))
+        finally:
+            os.fsync(output.fileno())
+            async_librarian.close()
+
+    elapsed = time.perf_counter() - started
+    finished = sum(counts.values())
+    print(f"Answered {counts.get('answered', 0)} queries ({counts.get('failed', 0)} failed) in {elapsed:.1f}s "
+          f"({finished / elapsed if elapsed > 0 else 0:.1f}/s); results in {args.output}")
+    if counts.get("failed"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import base64
+import bisect
+import hashlib
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+
+    def dumps(value) -> bytes:
+        return orjson.dumps(value)
+except ImportError:
+    import json
+
+    def dumps(value) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+BOOK_FIELDS = ("id", "title", "summary")
+SUMMARY_PREVIEW_CHARS = 200
+
+
+def preview(summary: str) -> str:
+    return summary[:SUMMARY_PREVIEW_CHARS] + "..." if len(summary) > SUMMARY_PREVIEW_CHARS else summary
+
+
+class MappedListing(Sequence):
+    """Books of a snapshot's memory-mapped catalog in listing order, each built when accessed"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.order = catalog.tables["titles.order"]
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        row = int(self.order[index])
+        catalog = self.catalog
+        return {"id": catalog.ids[row], "title": catalog.titles[row], "summary": preview(catalog.documents[row])}
+
+    def keys(self) -> Sequence[Tuple[str, str]]:
+        return _ListingKeys(self)
+
+
+class _ListingKeys(Sequence):
+    def __init__(self, listing: MappedListing):
+        self.listing = listing
+
+    def __len__(self) -> int:
+        return len(self.listing)
+
+    def __getitem__(self, index) -> Tuple[str, str]:
+        row = int(self.listing.order[index])
+        return self.listing.catalog.titles[row].lower(), self.listing.catalog.ids[row]
+
+
+class CatalogSnapshot:
+    """Immutable, title-sorted listing of the catalog used to serve GET /books"""
+
+    def __init__(self, version, books: Sequence[Dict]):
+        self.version = version
+        if isinstance(books, MappedListing):
+            # Already in listing order; books are read from the memory map page by page
+            self.books, self.keys = books, books.keys()
+        else:
+            self.books = sorted(books, key=lambda book: (book["title"].lower(), book["id"]))
+            self.keys = [(book["title"].lower(), book["id"]) for book in self.books]
+
+        digest = hashlib.sha1(str(version).encode("utf-8"))
+        if isinstance(books, MappedListing):
+            # The snapshot already records a digest of its catalog
+            digest.update(books.catalog.digest.encode("utf-8"))
+        else:
+            for book in self.books:
+                digest.update(book["id"].encode("utf-8"))
+                digest.update(book["summary"].encode("utf-8"))
+        self.etag = digest.hexdigest()[:20]
+
+    @staticmethod
+    def encode_cursor(key: Tuple[str, str]) -> str:
+        raw = f"{key[0]}\x00{key[1]}".encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, str]:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        title, doc_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("\x00", 1)
+        return title, doc_id
+
+    def page(self, cursor: Optional[str], limit: int, fields: List[str]) -> Dict:
+        """Books after ``cursor`` (exclusive), projected onto ``fields``"""
+        start = bisect.bisect_right(self.keys, self.decode_cursor(cursor)) if cursor else 0
+        books = self.books[start:start + limit]
+        end = start + len(books)
+        next_cursor = self.encode_cursor(self.keys[end - 1]) if books and end < len(self.books) else None
+
+        if len(fields) == len(BOOK_FIELDS):
+            projected = books
+        else:
+            projected = [{field: book[field] for field in fields} for book in books]
+        return {"books": projected, "count": len(projected), "total": len(self.books), "next_cursor": next_cursor}
+
+
+class CatalogSnapshotCache:
+    """Holds the current snapshot and rebuilds it only when the catalog version changes"""
+
+    def __init__(self, page_size: int = 1000):
+        self.page_size = page_size
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._primed: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+
+    def get(self, vector_store) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == vector_store.catalog_version:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != vector_store.catalog_version:
+                primed = self._primed
+                if primed is not None and primed.version == vector_store.catalog_version:
+                    self._snapshot = primed
+                else:
+                    self._snapshot = self._build(vector_store)
+                self._primed = None
+            return self._snapshot
+
+    def prime(self, vector_store):
+        """Build the snapshot of a store that is about to be swapped in, without blocking readers of the current one"""
+        self._primed = self._build(vector_store)
+
+    def _build(self, vector_store) -> CatalogSnapshot:
+        version = vector_store.catalog_version
+        if vector_store.mapped_catalog is not None:
+            return CatalogSnapshot(version, MappedListing(vector_store.mapped_catalog))
+        collection = vector_store.collection
+        books = []
+        total = collection.count()
+        for offset in range(0, total, self.page_size):
+            page = collection.get(include=["metadatas", "documents"], limit=self.page_size, offset=offset)
+            for doc_id, metadata, document in zip(page["ids"], page["metadatas"], page["documents"]):
+                books.append({"id": doc_id, "title": metadata["title"], "summary": preview(document)})
+        return CatalogSnapshot(version, books)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._primed = None
@@ -1,19 +1,84 @@
-import openai
 import json
+import os
+import threading
+import time
+from collections import deque
 from typing import List, Dict, Optional
-from vector_store import BookVectorStore
-from tools import get_summary_by_title, get_summary_tool_definition, filter_inappropriate_language
+from vector_store import BookVectorStore, AsyncBookVectorStore, TITLE_MARKER
+from response_cache import SemanticResponseCache
+from tools import get_summary_by_title, get_summary_tool_definition, filter_inappropriate_language, register_catalog
+from content_filter import get_content_filter
+from intent_router import IntentRouter, ROUTE_DIRECT_TITLE
+from sessions import create_session_store
+from context_builder import ContextBuilder
+from startup import StartupTracker
+from embedding_cache import EmbeddingCache
+from shared_index import read_current, wait_for_snapshot
+from openai_gateway import get_gateway
+from model_router import (
+    ModelRouter, ModelChoice, ROLE_TOOL_SELECTION, ROLE_FINAL_ANSWER, ROLE_DIRECT_ANSWER, COMPLEXITY_SIMPLE
+)
+from instrumentation import (
+    span, ANSWERS, STAGE_FILTER, STAGE_EMBEDDING, STAGE_INDEX_QUERY, STAGE_FIRST_COMPLETION,
+    STAGE_TOOLS, STAGE_SECOND_COMPLETION, STAGE_DIRECT_COMPLETION
+)
 
 
 class SmartLibrarian:
-    def __init__(self, openai_api_key: str, books_file_path: str):
-        self.openai_client = openai.Client(api_key=openai_api_key)
-        self.vector_store = BookVectorStore(openai_api_key)
+    def __init__(self, openai_api_key: str, books_file_path: str,
+                 response_cache: Optional[SemanticResponseCache] = None,
+                 startup: Optional[StartupTracker] = None, snapshot_wake: Optional[threading.Event] = None):
+        self.startup = startup or StartupTracker()
+        self.gateway = get_gateway(openai_api_key)
+        self.openai_api_key = openai_api_key
         self.books_file_path = books_file_path
+        # Workers in multi-process mode attach read-only to snapshots published by a single writer
+        self.shared_index_dir = os.getenv("SHARED_INDEX_DIR")
+        self.snapshot_version = None
+        if self.shared_index_dir:
+            current = read_current(self.shared_index_dir)
+            if current is None:
+                # Started before the writer's first publish; ``snapshot_wake`` is set by its signal
+                with self.startup.track("waiting_for_snapshot"):
+                    current = wait_for_snapshot(self.shared_index_dir,
+                                                float(os.getenv("SHARED_INDEX_POLL_SECONDS", "5")), snapshot_wake)
+            self.snapshot_version = current["version"]
+            self.vector_store = self.open_shared_store(os.path.join(self.shared_index_dir, current["snapshot"]))
+        else:
+            self.vector_store = BookVectorStore(openai_api_key)
+
+        if response_cache is None:
+            ttl = os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")
+            response_cache = SemanticResponseCache(
+                threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95")),
+                max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000")),
+                max_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024),
+                ttl_seconds=float(ttl) if ttl else None
+            )
+        self.response_cache = response_cache
+        self.sessions = create_session_store()
+        self.context_builder = ContextBuilder(max_prompt_tokens=int(os.getenv("PROMPT_TOKEN_BUDGET", "3000")))
+        self.model_router = ModelRouter.from_env()
 
         # Initialize vector store
-        self.vector_store.create_collection()
-        self.vector_store.populate_database(books_file_path)
+        if not self.shared_index_dir:
+            with self.startup.track("open_index"):
+                self.vector_store.create_collection()
+            snapshot_path = os.getenv("INDEX_SNAPSHOT")
+            if snapshot_path:
+                # A prebuilt snapshot leaves the sync below with nothing to embed
+                with self.startup.track("snapshot_import"):
+                    self.vector_store.import_snapshot(snapshot_path,
+                                                      verify=os.getenv("INDEX_SNAPSHOT_VERIFY", "1") != "0",
+                                                      persist=False)
+            with self.startup.track("catalog_sync"):
+                self.startup.update(catalog_books=self.count_catalog_books(books_file_path), processed=0)
+                self.vector_store.populate_database(books_file_path, incremental=True,
+                                                    progress=lambda counters: self.startup.update(**counters))
+        with self.startup.track("catalog_tools"):
+            register_catalog(self.vector_store.title_index)
+            get_content_filter()
+            self.router = IntentRouter(self.vector_store.title_index, mode=os.getenv("ROUTER_MODE", "completion"))
 
         # System prompt
         self.system_prompt = """
@@ -31,24 +96,62 @@ class SmartLibrarian:
 
         self.tools = [get_summary_tool_definition]
 
-    def search_and_recommend(self, user_query: str) -> List[Dict]:
+    def open_shared_store(self, snapshot_path: str,
+                          embedding_cache: Optional[EmbeddingCache] = None) -> BookVectorStore:
+        """Read-only store serving a published snapshot from its memory map"""
+        with self.startup.track("attach_shared_index"):
+            store = BookVectorStore(self.openai_api_key, persist_directory=os.path.dirname(snapshot_path),
+                                    embedding_cache=embedding_cache, index_backend="numpy")
+            store.create_collection()
+            # The writer verified the checksums before publishing
+            store.import_snapshot(snapshot_path, verify=False, persist=False)
+        return store
+
+    def swap_vector_store(self, vector_store: BookVectorStore):
+        """Serve from another, fully loaded store; requests already running finish on the old one"""
+        # Keep the version increasing so version-keyed caches (answers, /books) rebuild
+        vector_store.catalog_version = max(vector_store.catalog_version, self.vector_store.catalog_version + 1)
+        router = IntentRouter(vector_store.title_index, mode=self.router.mode)
+        self.vector_store, self.router = vector_store, router
+        register_catalog(vector_store.title_index)
+        self.response_cache.invalidate()
+
+    def reload_shared_index(self, snapshot_path: str):
+        """Attach to a newly published snapshot and swap to it"""
+        self.swap_vector_store(self.open_shared_store(snapshot_path, self.vector_store.embedding_cache))
+        print(f"Swapped to snapshot {snapshot_path} ({self.vector_store.collection.count()} books)")
+
+    @staticmethod
+    def count_catalog_books(books_file_path: str) -> int:
+        """Number of entries in the catalog file, for startup progress"""
+        with open(books_file_path, 'r', encoding='utf-8') as file:
+            return sum(1 for line in file if line.startswith(TITLE_MARKER))
+
+    def search_and_recommend(self, user_query: str, filters: Optional[Dict] = None) -> List[Dict]:
         """Search for relevant books based on user query"""
-        return self.vector_store.search_books(user_query, n_results=3)
+        return self.vector_store.search_books(user_query, n_results=3, filters=filters)
 
-    def chat_completion(self, messages: List[Dict], use_tools: bool = True):
-        """Get chat completion from OpenAI with optional tool calling"""
+    def completion_params(self, choice: ModelChoice, messages: List[Dict], use_tools: bool) -> Dict:
+        """Request parameters for a completion on the routed model"""
         params = {
-            "model": "gpt-4",
+            "model": choice.model,
             "messages": messages,
             "temperature": 0.7,
-            "max_tokens": 1500
+            "max_tokens": choice.max_tokens
         }
 
         if use_tools:
             params["tools"] = self.tools
             params["tool_choice"] = "auto"
+        return params
 
-        return self.openai_client.chat.completions.create(**params)
+    def chat_completion(self, messages: List[Dict], use_tools: bool = True, role: str = ROLE_TOOL_SELECTION,
+                        complexity: str = COMPLEXITY_SIMPLE):
+        """Get chat completion from OpenAI with optional tool calling, on the model routed for ``role``"""
+        return self.model_router.complete(
+            role, complexity,
+            lambda choice: self.gateway.chat_completion(**self.completion_params(choice, messages, use_tools))
+        )
 
     def handle_tool_calls(self, tool_calls):
         """Handle function calls from the assistant"""
@@ -69,58 +172,129 @@ class SmartLibrarian:
 
         return tool_results
 
-    def process_user_input(self, user_input: str) -> str:
-        """Process user input and return response"""
+    def build_messages(self, user_input: str, relevant_books: List[Dict],
+                       history: Optional[List[Dict]] = None) -> List[Dict]:
+        """Build the chat messages for a query, its retrieved books and the session history"""
+        return self.context_builder.build(self.system_prompt, user_input, relevant_books, history or [])
+
+    def get_history(self, session_id: Optional[str]) -> List[Dict]:
+        """Previous turns of a session (empty for stateless requests)"""
+        return self.sessions.get(session_id) if session_id else []
+
+    def remember(self, session_id: Optional[str], user_input: str, answer: Optional[str]):
+        """Record a completed turn in the session history"""
+        if session_id and answer:
+            self.sessions.append(session_id, [
+                {"role": "user", "content": user_input},
+                {"role": "assistant", "content": answer}
+            ])
+
+    @staticmethod
+    def assistant_tool_message(assistant_message) -> Dict:
+        """Convert an assistant message with tool calls back into a request message"""
+        return {
+            "role": "assistant",
+            "content": assistant_message.content,
+            "tool_calls": [
+                {
+                    "id": tc.id,
+                    "type": tc.type,
+                    "function": {
+                        "name": tc.function.name,
+                        "arguments": tc.function.arguments
+                    }
+                } for tc in assistant_message.tool_calls
+            ]
+        }
+
+    def process_user_input(self, user_input: str, session_id: Optional[str] = None,
+                           timings: Optional[Dict] = None, filters: Optional[Dict] = None) -> str:
+        """Process user input and return response.
+
+        ``timings`` is filled with the milliseconds spent in each stage when provided;
+        ``filters`` restrict retrieval to matching books (see ``build_where``).
+        """
         # Filter inappropriate language
-        is_appropriate, filtered_message = filter_inappropriate_language(user_input)
+        with span(STAGE_FILTER, timings):
+            is_appropriate, filtered_message = filter_inappropriate_language(user_input)
         if not is_appropriate:
+            ANSWERS.inc(source="filtered")
             return filtered_message
 
-        # Search for relevant books
-        relevant_books = self.search_and_recommend(user_input)
-
-        # Prepare context with found books
-        books_context = "Cărți relevante găsite:\n"
-        for i, book in enumerate(relevant_books, 1):
-            books_context += f"{i}. {book['title']}: {book['summary']}\n"
+        answer = self._answer(user_input, self.get_history(session_id), timings, filters)
+        self.remember(session_id, user_input, answer)
+        return answer
+
+    def _answer(self, user_input: str, history: List[Dict], timings: Optional[Dict] = None,
+                filters: Optional[Dict] = None) -> str:
+        # Direct title questions skip retrieval and the tool round
+        route = self.router.route(user_input, history, filters)
+        if route.name == ROUTE_DIRECT_TITLE:
+            if self.router.mode == "template":
+                ANSWERS.inc(source="template")
+                return self.router.template_answer(route)
+            messages = self.router.completion_messages(self.system_prompt, user_input, route)
+            with span(STAGE_DIRECT_COMPLETION, timings):
+                response = self.chat_completion(messages, use_tools=False, role=ROLE_DIRECT_ANSWER,
+                                                complexity=self.model_router.complexity(user_input, history))
+            ANSWERS.inc(source="direct_completion")
+            return response.choices[0].message.content
+
+        # Exact title lookups are answered from the lexical index without an embedding call
+        query_embedding = None
+        with span(STAGE_INDEX_QUERY, timings):
+            relevant_books = self.vector_store.lexical_match(user_input, n_results=3, filters=filters)
+        if relevant_books is None:
+            # Embed the query once; the answer cache and the search share it
+            with span(STAGE_EMBEDDING, timings):
+                query_embedding = self.vector_store.get_embeddings([user_input])[0]
+            cached_answer = self.cached_answer(query_embedding, history, filters)
+            if cached_answer is not None:
+                ANSWERS.inc(source="response_cache")
+                return cached_answer
+
+            # Search for relevant books
+            with span(STAGE_INDEX_QUERY, timings):
+                relevant_books = self.vector_store.hybrid_query(user_input, query_embedding, n_results=3,
+                                                                filters=filters)
 
         # Prepare messages for chat completion
-        messages = [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "system", "content": f"Context: {books_context}"},
-            {"role": "user", "content": user_input}
-        ]
+        messages = self.build_messages(user_input, relevant_books, history)
+        complexity = self.model_router.complexity(user_input, history)
 
         # Get initial response
-        response = self.chat_completion(messages)
+        with span(STAGE_FIRST_COMPLETION, timings):
+            response = self.chat_completion(messages, role=ROLE_TOOL_SELECTION, complexity=complexity)
         assistant_message = response.choices[0].message
 
         # Handle tool calls if any
         if assistant_message.tool_calls:
-            messages.append({
-                "role": "assistant",
-                "content": assistant_message.content,
-                "tool_calls": [
-                    {
-                        "id": tc.id,
-                        "type": tc.type,
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments
-                        }
-                    } for tc in assistant_message.tool_calls
-                ]
-            })
+            messages.append(self.assistant_tool_message(assistant_message))
 
             # Get tool results
-            tool_results = self.handle_tool_calls(assistant_message.tool_calls)
+            with span(STAGE_TOOLS, timings):
+                tool_results = self.handle_tool_calls(assistant_message.tool_calls)
             messages.extend(tool_results)
 
             # Get final response with tool results
-            final_response = self.chat_completion(messages)
-            return final_response.choices[0].message.content
-
-        return assistant_message.content
+            with span(STAGE_SECOND_COMPLETION, timings):
+                final_response = self.chat_completion(messages, role=ROLE_FINAL_ANSWER, complexity=complexity)
+            answer = final_response.choices[0].message.content
+        else:
+            answer = assistant_message.content
+        ANSWERS.inc(source="completion")
+
+        if answer and query_embedding is not None and not history and not filters:
+            self.response_cache.put(query_embedding, user_input, answer)
+        return answer
+
+    def cached_answer(self, query_embedding: List[float], history: List[Dict],
+                      filters: Optional[Dict] = None) -> Optional[str]:
+        """Cached answer for a similar query; follow-ups and filtered searches are never served from cache"""
+        if history or filters:
+            return None
+        self.response_cache.sync_catalog_version(self.vector_store.catalog_version)
+        return self.response_cache.lookup(query_embedding)
 
     def start_chat(self):
         """Start the CLI chat interface"""
@@ -143,7 +317,7 @@ class SmartLibrarian:
                     continue
 
                 print("🤔 Caut cele mai potrivite cărți pentru tine...")
-                response = self.process_user_input(user_input)
+                response = self.process_user_input(user_input, session_id="cli")
                 print(f"\n📖 Bibliotecarul AI: {response}\n")
                 print("-" * 80)
 
@@ -155,6 +329,252 @@ class SmartLibrarian:
                 print("Te rog să încerci din nou.")
 
 
+class AsyncSmartLibrarian:
+    """Non-blocking request path on top of an initialized SmartLibrarian.
+
+    Shares the prompt, tools and vector store of the wrapped librarian, but all
+    OpenAI calls go through AsyncOpenAI and Chroma queries run off the event loop.
+    """
+
+    def __init__(self, librarian: SmartLibrarian, openai_api_key: str, max_query_workers: int = 8):
+        self.librarian = librarian
+        self.gateway = get_gateway(openai_api_key)
+        self.vector_store = AsyncBookVectorStore(librarian.vector_store, openai_api_key,
+                                                 max_workers=max_query_workers)
+        self.ttft_samples = deque(maxlen=1000)
+
+    async def search_and_recommend(self, user_query: str, filters: Optional[Dict] = None) -> List[Dict]:
+        """Search for relevant books based on user query"""
+        return await self.vector_store.search_books(user_query, n_results=3, filters=filters)
+
+    async def chat_completion(self, messages: List[Dict], use_tools: bool = True,
+                              role: str = ROLE_TOOL_SELECTION, complexity: str = COMPLEXITY_SIMPLE):
+        """Get chat completion from OpenAI with optional tool calling, on the model routed for ``role``"""
+        return await self.librarian.model_router.acomplete(
+            role, complexity,
+            lambda choice: self.gateway.achat_completion(
+                **self.librarian.completion_params(choice, messages, use_tools))
+        )
+
+    async def process_user_input(self, user_input: str, session_id: Optional[str] = None,
+                                 timings: Optional[Dict] = None, filters: Optional[Dict] = None) -> str:
+        """Process user input and return response; per-stage milliseconds go to ``timings``"""
+        with span(STAGE_FILTER, timings):
+            is_appropriate, filtered_message = filter_inappropriate_language(user_input)
+        if not is_appropriate:
+            ANSWERS.inc(source="filtered")
+            return filtered_message
+
+        answer = await self._answer(user_input, self.librarian.get_history(session_id), timings, filters)
+        self.librarian.remember(session_id, user_input, answer)
+        return answer
+
+    async def _answer(self, user_input: str, history: List[Dict], timings: Optional[Dict] = None,
+                      filters: Optional[Dict] = None) -> str:
+        route = self.librarian.router.route(user_input, history, filters)
+        if route.name == ROUTE_DIRECT_TITLE:
+            return await self.direct_answer(user_input, route, history, timings)
+
+        query_embedding = None
+        with span(STAGE_INDEX_QUERY, timings):
+            relevant_books = await self.vector_store.lexical_match(user_input, n_results=3, filters=filters)
+        if relevant_books is None:
+            with span(STAGE_EMBEDDING, timings):
+                query_embedding = (await self.vector_store.get_embeddings([user_input]))[0]
+            cached_answer = self.librarian.cached_answer(query_embedding, history, filters)
+            if cached_answer is not None:
+                ANSWERS.inc(source="response_cache")
+                return cached_answer
+            with span(STAGE_INDEX_QUERY, timings):
+                relevant_books = await self.vector_store.hybrid_query(user_input, query_embedding, n_results=3,
+                                                                      filters=filters)
+
+        return await self.recommend(user_input, relevant_books, history, timings, query_embedding, filters)
+
+    async def direct_answer(self, user_input: str, route, history: List[Dict],
+                            timings: Optional[Dict] = None) -> str:
+        """Answer a direct title question with the template or one tool-free completion"""
+        router = self.librarian.router
+        if router.mode == "template":
+            ANSWERS.inc(source="template")
+            return router.template_answer(route)
+        messages = router.completion_messages(self.librarian.system_prompt, user_input, route)
+        with span(STAGE_DIRECT_COMPLETION, timings):
+            response = await self.chat_completion(
+                messages, use_tools=False, role=ROLE_DIRECT_ANSWER,
+                complexity=self.librarian.model_router.complexity(user_input, history))
+        ANSWERS.inc(source="direct_completion")
+        return response.choices[0].message.content
+
+    async def recommend(self, user_input: str, relevant_books: List[Dict], history: List[Dict],
+                        timings: Optional[Dict] = None, query_embedding: Optional[List[float]] = None,
+                        filters: Optional[Dict] = None) -> str:
+        """Answer from already retrieved books: tool-selection completion, tool calls, final completion.
+
+        With ``query_embedding`` the answer to a stateless, unfiltered query is added to the answer cache.
+        """
+        messages = self.librarian.build_messages(user_input, relevant_books, history)
+        complexity = self.librarian.model_router.complexity(user_input, history)
+
+        with span(STAGE_FIRST_COMPLETION, timings):
+            response = await self.chat_completion(messages, role=ROLE_TOOL_SELECTION, complexity=complexity)
+        assistant_message = response.choices[0].message
+
+        if assistant_message.tool_calls:
+            messages.append(self.librarian.assistant_tool_message(assistant_message))
+            with span(STAGE_TOOLS, timings):
+                messages.extend(self.librarian.handle_tool_calls(assistant_message.tool_calls))
+
+            with span(STAGE_SECOND_COMPLETION, timings):
+                final_response = await self.chat_completion(messages, role=ROLE_FINAL_ANSWER,
+                                                             complexity=complexity)
+            answer = final_response.choices[0].message.content
+        else:
+            answer = assistant_message.content
+        ANSWERS.inc(source="completion")
+
+        if answer and query_embedding is not None and not history and not filters:
+            self.librarian.response_cache.put(query_embedding, user_input, answer)
+        return answer
+
+    async def _stream_completion(self, messages: List[Dict], role: str = ROLE_FINAL_ANSWER,
+                                 complexity: str = COMPLEXITY_SIMPLE):
+        """Yield the content tokens of a streamed, tool-free completion on the model routed for ``role``"""
+        def open_stream(choice: ModelChoice):
+            params = self.librarian.completion_params(choice, messages, use_tools=False)
+            # The router counts the usage carried by the last chunk
+            params["stream_options"] = {"include_usage": True}
+            return self.gateway.astream_chat_completion(**params)
+
+        async for chunk in self.librarian.model_router.astream(role, complexity, open_stream):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def stream_user_input(self, user_input: str, timings: Optional[Dict] = None,
+                                session_id: Optional[str] = None, filters: Optional[Dict] = None):
+        """Process user input and yield the answer token by token.
+
+        The tool-selection round runs as a plain completion; only the final
+        answer is streamed (or the first round's content when it calls no tool). ``timings`` is
+        filled with ``ttft_ms``, ``total_ms`` and per-stage milliseconds when provided.
+        """
+        started = time.perf_counter()
+        timings = timings if timings is not None else {}
+
+        with span(STAGE_FILTER, timings):
+            is_appropriate, filtered_message = filter_inappropriate_language(user_input)
+        if not is_appropriate:
+            ANSWERS.inc(source="filtered")
+            tokens = self._single(filtered_message)
+            session_id = None
+        else:
+            tokens = self._stream_answer(user_input, self.librarian.get_history(session_id), timings, filters)
+
+        answer_parts = []
+        async for token in tokens:
+            if "ttft_ms" not in timings:
+                timings["ttft_ms"] = (time.perf_counter() - started) * 1000
+                self.ttft_samples.append(timings["ttft_ms"])
+            answer_parts.append(token)
+            yield token
+
+        self.librarian.remember(session_id, user_input, "".join(answer_parts))
+        timings["total_ms"] = (time.perf_counter() - started) * 1000
+
+    @staticmethod
+    async def _single(text: str):
+        yield text
+
+    async def _stream_answer(self, user_input: str, history: List[Dict], timings: Optional[Dict] = None,
+                             filters: Optional[Dict] = None):
+        # Streamed completion stages include the time the client takes to consume the tokens
+        router = self.librarian.router
+        route = router.route(user_input, history, filters)
+        if route.name == ROUTE_DIRECT_TITLE:
+            if router.mode == "template":
+                ANSWERS.inc(source="template")
+                yield router.template_answer(route)
+                return
+            messages = router.completion_messages(self.librarian.system_prompt, user_input, route)
+            with span(STAGE_DIRECT_COMPLETION, timings):
+                async for content in self._stream_completion(
+                        messages, role=ROLE_DIRECT_ANSWER,
+                        complexity=self.librarian.model_router.complexity(user_input, history)):
+                    yield content
+            ANSWERS.inc(source="direct_completion")
+            return
+
+        query_embedding = None
+        with span(STAGE_INDEX_QUERY, timings):
+            relevant_books = await self.vector_store.lexical_match(user_input, n_results=3, filters=filters)
+        if relevant_books is None:
+            with span(STAGE_EMBEDDING, timings):
+                query_embedding = (await self.vector_store.get_embeddings([user_input]))[0]
+            cached_answer = self.librarian.cached_answer(query_embedding, history, filters)
+            if cached_answer is not None:
+                ANSWERS.inc(source="response_cache")
+                yield cached_answer
+                return
+            with span(STAGE_INDEX_QUERY, timings):
+                relevant_books = await self.vector_store.hybrid_query(user_input, query_embedding, n_results=3,
+                                                                      filters=filters)
+
+        messages = self.librarian.build_messages(user_input, relevant_books, history)
+        complexity = self.librarian.model_router.complexity(user_input, history)
+
+        # Tool selection is resolved before anything reaches the client; only the final answer is streamed
+        with span(STAGE_FIRST_COMPLETION, timings):
+            response = await self.chat_completion(messages, role=ROLE_TOOL_SELECTION, complexity=complexity)
+        assistant_message = response.choices[0].message
+
+        answer_parts = []
+        if assistant_message.tool_calls:
+            messages.append(self.librarian.assistant_tool_message(assistant_message))
+            with span(STAGE_TOOLS, timings):
+                messages.extend(self.librarian.handle_tool_calls(assistant_message.tool_calls))
+
+            with span(STAGE_SECOND_COMPLETION, timings):
+                async for content in self._stream_completion(messages, role=ROLE_FINAL_ANSWER,
+                                                             complexity=complexity):
+                    answer_parts.append(content)
+                    yield content
+        elif assistant_message.content:
+            answer_parts.append(assistant_message.content)
+            yield assistant_message.content
+        ANSWERS.inc(source="completion")
+
+        if answer_parts and query_embedding is not None and not history and not filters:
+            self.librarian.response_cache.put(query_embedding, user_input, "".join(answer_parts))
+
+    def ttft_summary(self) -> Dict:
+        """Percentiles of recent time-to-first-token samples, in milliseconds"""
+        samples = sorted(self.ttft_samples)
+        if not samples:
+            return {"count": 0}
+        return {
+            "count": len(samples),
+            "p50_ms": samples[len(samples) // 2],
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "max_ms": samples[-1]
+        }
+
+    def swap_vector_store(self, vector_store: BookVectorStore):
+        """Swap the store under both the sync and the async request paths"""
+        self.librarian.swap_vector_store(vector_store)
+        self.vector_store.vector_store = vector_store
+
+    def reload_shared_index(self, snapshot_path: str):
+        """Attach to a newly published snapshot and swap to it"""
+        librarian = self.librarian
+        self.swap_vector_store(librarian.open_shared_store(snapshot_path, librarian.vector_store.embedding_cache))
+        print(f"Swapped to snapshot {snapshot_path} ({librarian.vector_store.collection.count()} books)")
+
+    def close(self):
+        self.vector_store.close()
+        self.librarian.vector_store.embedding_cache.flush()
+        self.librarian.model_router.close()
+
+
 def main():
     import os
     from dotenv import load_dotenv
@@ -0,0 +1,105 @@
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from lexical_index import normalize_text
+
+DEFAULT_FILTERS_DIR = Path(__file__).parent.parent / "data" / "filters"
+
+
+def _trie_pattern(node: Dict) -> str:
+    """Render a character trie as a regex with shared prefixes factored out"""
+    end = node.get("", False)
+    branches = []
+    for char in sorted(key for key in node if key):
+        branches.append(re.escape(char) + _trie_pattern(node[char]))
+
+    if not branches:
+        return r"\w*" if end == "prefix" else ""
+    if end == "prefix":
+        # The term itself already matches anything longer
+        return r"\w*"
+
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if end:
+        return "(?:" + body + ")?"
+    return body
+
+
+def compile_terms(terms: Iterable[str]) -> Optional[re.Pattern]:
+    """Compile terms into one word-bounded alternation, or None for an empty list.
+
+    Terms ending in ``*`` match any word that starts with them.
+    """
+    trie: Dict = {}
+    for raw in terms:
+        prefix = raw.endswith("*")
+        term = normalize_text(raw.rstrip("*")).strip()
+        if not term:
+            continue
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        if prefix or node.get("") != "prefix":
+            node[""] = "prefix" if prefix else True
+
+    if not trie:
+        return None
+    return re.compile(r"\b" + _trie_pattern(trie) + r"\b")
+
+
+def load_terms(filters_dir: Path, languages: Optional[List[str]] = None) -> List[str]:
+    """Read moderation terms from ``<language>.txt`` files, skipping comments"""
+    terms = []
+    for path in sorted(Path(filters_dir).glob("*.txt")):
+        if languages and path.stem not in languages:
+            continue
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    terms.append(line)
+    return terms
+
+
+class ContentFilter:
+    """Matches moderation terms in one pass over the diacritic-normalized text.
+
+    All terms are compiled into a single trie-shaped regular expression with
+    word boundaries, so "prost" matches "Prost!" and "proșt" but not "prostata".
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = list(terms)
+        self.pattern = compile_terms(self.terms)
+
+    @classmethod
+    def from_directory(cls, filters_dir: Path = DEFAULT_FILTERS_DIR,
+                       languages: Optional[List[str]] = None) -> "ContentFilter":
+        return cls(load_terms(filters_dir, languages))
+
+    def find(self, text: str) -> Optional[str]:
+        """Return the first matched term in text, or None"""
+        if self.pattern is None:
+            return None
+        match = self.pattern.search(normalize_text(text))
+        return match.group(0) if match else None
+
+    def is_appropriate(self, text: str) -> bool:
+        return self.find(text) is None
+
+
+_default_filter: Optional[ContentFilter] = None
+
+
+def get_content_filter() -> ContentFilter:
+    """Return the process-wide filter, built from CONTENT_FILTER_DIR on first use"""
+    global _default_filter
+    if _default_filter is None:
+        languages = os.getenv("CONTENT_FILTER_LANGUAGES")
+        _default_filter = ContentFilter.from_directory(
+            Path(os.getenv("CONTENT_FILTER_DIR", str(DEFAULT_FILTERS_DIR))),
+            languages.split(",") if languages else None
+        )
+    return _default_filter
@@ -0,0 +1,79 @@
+from typing import Dict, List
+
+from tokens import count_tokens, truncate_to_tokens
+
+# Per-message overhead of the chat format (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class ContextBuilder:
+    """Fits system prompt, retrieved books, conversation history and the user message into a token budget.
+
+    The system prompt and the user message are always kept. Book summaries are
+    capped individually and dropped from the lowest ranked when the budget is
+    tight. History is filled newest-first; turns that no longer fit are
+    condensed into a one-line recap of the earlier questions, or dropped.
+    """
+
+    def __init__(self, max_prompt_tokens: int = 3000, max_book_tokens: int = 250,
+                 max_books_share: float = 0.5, recap_tokens: int = 120, min_book_tokens: int = 30):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_book_tokens = max_book_tokens
+        self.min_book_tokens = min_book_tokens
+        self.max_books_share = max_books_share
+        self.recap_tokens = recap_tokens
+
+    @staticmethod
+    def _message_tokens(message: Dict) -> int:
+        return count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+    def books_context(self, relevant_books: List[Dict], budget: int) -> str:
+        """Numbered list of books with truncated summaries, within budget tokens"""
+        header = "Cărți relevante găsite:\n"
+        context = header
+        used = count_tokens(header)
+        for i, book in enumerate(relevant_books, 1):
+            prefix = f"{i}. {book['title']}: "
+            available = min(self.max_book_tokens, budget - used - count_tokens(prefix) - 1)
+            if available < self.min_book_tokens:
+                break
+            line = f"{prefix}{truncate_to_tokens(book['summary'], available)}\n"
+            context += line
+            used += count_tokens(line)
+        return context
+
+    def build(self, system_prompt: str, user_input: str, relevant_books: List[Dict],
+              history: List[Dict]) -> List[Dict]:
+        system = {"role": "system", "content": system_prompt}
+        user = {"role": "user", "content": user_input}
+        remaining = self.max_prompt_tokens - self._message_tokens(system) - self._message_tokens(user)
+
+        books_budget = int(max(remaining, 0) * self.max_books_share) if history else max(remaining, 0)
+        books_budget -= MESSAGE_OVERHEAD_TOKENS + count_tokens("Context: ")
+        context = {"role": "system", "content": f"Context: {self.books_context(relevant_books, books_budget)}"}
+        remaining -= self._message_tokens(context)
+
+        kept: List[Dict] = []
+        dropped: List[Dict] = []
+        for message in reversed(history):
+            tokens = self._message_tokens(message)
+            if not dropped and tokens <= remaining - self.recap_tokens:
+                kept.append(message)
+                remaining -= tokens
+            else:
+                dropped.append(message)
+        kept.reverse()
+        dropped.reverse()
+
+        messages = [system, context]
+        if dropped:
+            earlier_questions = [message["content"] for message in dropped if message["role"] == "user"]
+            if earlier_questions:
+                label = "Întrebări anterioare ale utilizatorului (rezumat): "
+                recap_budget = min(self.recap_tokens, remaining) - MESSAGE_OVERHEAD_TOKENS - count_tokens(label) - 1
+                if recap_budget > 0:
+                    recap = truncate_to_tokens("; ".join(earlier_questions), recap_budget)
+                    messages.append({"role": "system", "content": label + recap})
+        messages.extend(kept)
+        messages.append(user)
+        return messages
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import Histogram, SIZE_BUCKETS
+
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 3, 5, 7.5, 10, 15, 25, 50, 100)
+
+
+class EmbeddingBatcher:
+    """Coalesces single-text embedding requests from concurrent callers.
+
+    Texts submitted within ``max_wait_ms`` of the first pending one (or until
+    ``max_batch_size`` texts are waiting) are sent as one embeddings request,
+    and each caller receives its own vector. Must be used from a single event loop.
+    """
+
+    def __init__(self, fetch: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 max_wait_ms: float = 5.0, max_batch_size: int = 64):
+        self.fetch = fetch
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        self.batch_sizes = Histogram(SIZE_BUCKETS)
+        self.wait_times_ms = Histogram(LATENCY_BUCKETS_MS)
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed one text as part of the next batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._dispatch)
+
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            # Keep a reference so the task is not garbage collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        dispatched = time.perf_counter()
+        for _, _, enqueued in batch:
+            self.wait_times_ms.observe((dispatched - enqueued) * 1000)
+
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        self.batch_sizes.observe(len(texts))
+        try:
+            embeddings = dict(zip(texts, await self.fetch(texts)))
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(embeddings[text])
+
+    def stats(self) -> Dict:
+        """Batch-size and queue-wait distributions"""
+        return {
+            "max_wait_ms": self.max_wait_ms,
+            "max_batch_size": self.max_batch_size,
+            "batch_size": self.batch_sizes.summary(),
+            "wait_ms": self.wait_times_ms.summary(),
+        }
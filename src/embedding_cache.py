@@ -0,0 +1,210 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Two-level embedding cache: in-memory LRU in front of a SQLite file.
+
+    Entries are keyed by the embedding model name plus a SHA-256 hash of the
+    input text, so the same text embedded with a different model never collides.
+    Vectors are held in memory as float32 arrays. Access times are buffered and
+    written with the next insert; the file is trimmed to ``evict_to`` of
+    ``max_disk_items`` whenever an estimate of its row count passes the limit.
+    """
+
+    def __init__(self, db_path: str = "./embedding_cache.db", memory_items: int = 2048,
+                 max_disk_items: int = 200000, ttl_seconds: Optional[float] = None, evict_to: float = 0.9):
+        self.db_path = db_path
+        self.memory_items = memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl_seconds = ttl_seconds
+        self.evict_to = evict_to
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        # Access times not yet written to SQLite, by key
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # Serializes use of the connection; memory hits never wait for it
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_accessed ON embeddings(accessed_at)")
+        self._conn.commit()
+        # Upper bound on the row count (replaced rows are counted as new), corrected by each eviction sweep
+        self._disk_estimate = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Build the content-addressed cache key for a model/text pair"""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    @staticmethod
+    def _pack(vector) -> bytes:
+        return np.asarray(vector, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def _unpack(blob: bytes) -> np.ndarray:
+        return np.frombuffer(blob, dtype=np.float32)
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, vector: np.ndarray, created_at: float):
+        self._memory[key] = (vector, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return cached embeddings in input order, None for every miss"""
+        now = time.time()
+        keys = [self.make_key(model, text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        disk_lookup: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._memory.get(key)
+                if entry is not None and not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self._touched[key] = now
+                    vectors[i] = entry[0]
+                else:
+                    if entry is not None:
+                        del self._memory[key]
+                    disk_lookup.setdefault(key, []).append(i)
+
+        if disk_lookup:
+            with self._db_lock:
+                found = self._read_disk(list(disk_lookup.keys()), now)
+            with self._lock:
+                for key, (vector, created_at) in found.items():
+                    self._remember(key, vector, created_at)
+                    self._touched[key] = now
+                    for i in disk_lookup[key]:
+                        vectors[i] = vector
+                self.disk_hits += sum(len(disk_lookup[key]) for key in found)
+
+        results = [vector.tolist() if vector is not None else None for vector in vectors]
+        misses = results.count(None)
+        with self._lock:
+            self.misses += misses
+            self.hits += len(texts) - misses
+        return results
+
+    def _read_disk(self, keys: List[str], now: float) -> Dict[str, tuple]:
+        """Read-only lookup; expired rows are skipped here and deleted by the next eviction sweep"""
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, vector, created_at FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, blob, created_at in rows:
+                if not self._expired(created_at, now):
+                    found[key] = (self._unpack(blob), created_at)
+        return found
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Store freshly computed embeddings in both cache levels"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, embeddings):
+                key = self.make_key(model, text)
+                packed = self._pack(vector)
+                self._remember(key, self._unpack(packed), now)
+                self._touched.pop(key, None)
+                rows.append((key, model, packed, now, now))
+            touched, self._touched = self._touched, {}
+
+        with self._db_lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._write_access_times(touched)
+            self._disk_estimate += len(rows)
+            if self._disk_estimate > self.max_disk_items:
+                self._evict()
+            self._conn.commit()
+
+    def _write_access_times(self, touched: Dict[str, float]):
+        if touched:
+            self._conn.executemany("UPDATE embeddings SET accessed_at = ? WHERE key = ?",
+                                   [(accessed_at, key) for key, accessed_at in touched.items()])
+
+    def _evict(self):
+        """Drop expired rows, then least recently used rows down to ``evict_to`` of the size limit"""
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self.max_disk_items:
+            overflow = count - int(self.max_disk_items * self.evict_to)
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY accessed_at ASC LIMIT ?)", (overflow,)
+            )
+            count -= overflow
+        self._disk_estimate = count
+
+    def flush(self):
+        """Write buffered access times, so the next process evicts in the same order"""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        with self._db_lock:
+            self._write_access_times(touched)
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every cached embedding"""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+        with self._db_lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._disk_estimate = 0
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current sizes"""
+        with self._db_lock:
+            disk_items = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "memory_items": len(self._memory),
+                "disk_items": disk_items,
+            }
+
+    def close(self):
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
@@ -0,0 +1,641 @@
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mapped_tables import HashLookup, StringTable, pack_lookup, pack_postings, pack_strings, postings_slice
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+# Fewest candidates a quantized first pass hands to the full-precision rescore
+MIN_RESCORE_CANDIDATES = 100
+_SCAN_ROWS = 2048
+# Filters keeping more than 1/_GATHER_RATIO of the rows score the whole matrix instead of copying rows out
+_GATHER_RATIO = 4
+# Metadata that is unique per book and never filtered on, left out of packed postings
+UNFILTERED_FIELDS = ("title", "content_hash")
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Set bits per row of a uint8 matrix"""
+    if hasattr(np, "bitwise_count"):
+        # numpy >= 2.0 counts whole 64-bit words at once
+        return np.bitwise_count(words.view(np.uint64)).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[words].sum(axis=1, dtype=np.int32)
+
+
+class QuantizedVectors:
+    """Compact copy of a normalized vector matrix for a fast approximate first pass.
+
+    ``binary`` keeps one sign bit per dimension and ranks by Hamming distance;
+    ``int8`` keeps each dimension scaled to [-127, 127] by its largest magnitude
+    and ranks by the dot product with the query. Either way the result is only a
+    candidate list; exact scores come from the full-precision rows.
+    """
+
+    def __init__(self, vectors: np.ndarray, mode: str):
+        self.mode = mode
+        self.scales: Optional[np.ndarray] = None
+        chunks = [np.asarray(vectors[start:start + _SCAN_ROWS], dtype=np.float32)
+                  for start in range(0, vectors.shape[0], _SCAN_ROWS)] or [np.zeros((0, vectors.shape[1]), np.float32)]
+        if mode == "int8":
+            peak = np.max([np.abs(chunk).max(axis=0, initial=0.0) for chunk in chunks], axis=0)
+            self.scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        self.codes = np.concatenate([self._encode(chunk) for chunk in chunks])
+
+    def _encode(self, matrix: np.ndarray) -> np.ndarray:
+        if self.mode == "binary":
+            bits = np.packbits(matrix > 0, axis=1)
+            # Pad rows to whole 64-bit words for bitwise_count
+            return np.pad(bits, ((0, 0), (0, -bits.shape[1] % 8)))
+        return np.clip(np.rint(matrix / self.scales), -127, 127).astype(np.int8)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate similarity of one normalized query to every row (or only ``rows``); higher is closer"""
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.mode == "binary":
+            bits = self._encode(query[None, :])
+            out = np.empty(codes.shape[0], dtype=np.int32)
+            for start in range(0, codes.shape[0], _SCAN_ROWS):
+                out[start:start + _SCAN_ROWS] = -_popcount(codes[start:start + _SCAN_ROWS] ^ bits)
+            return out
+        weights = query * self.scales
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], _SCAN_ROWS):
+            out[start:start + _SCAN_ROWS] = codes[start:start + _SCAN_ROWS].astype(np.float32) @ weights
+        return out
+
+
+class MetadataPostings:
+    """Inverted index from metadata values to sorted row numbers, for evaluating ``where`` filters.
+
+    Supports the Chroma filter operators the store uses: a bare value or
+    ``$eq``, ``$ne``, ``$in``, ``$nin``, ``$gt``, ``$gte``, ``$lt``, ``$lte``
+    per field, combined with ``$and`` / ``$or``. A field's postings are built
+    on first use, so only filtered fields cost memory.
+    """
+
+    _COMPARISONS = {
+        "$gt": lambda value, operand: value > operand,
+        "$gte": lambda value, operand: value >= operand,
+        "$lt": lambda value, operand: value < operand,
+        "$lte": lambda value, operand: value <= operand,
+    }
+
+    def __init__(self, metadatas: List[Dict]):
+        self._metadatas = metadatas
+        self._fields: Dict[str, Dict] = {}
+
+    def _postings(self, field: str) -> Dict:
+        postings = self._fields.get(field)
+        if postings is None:
+            rows: Dict = {}
+            for row, metadata in enumerate(self._metadatas):
+                value = (metadata or {}).get(field)
+                if value is not None:
+                    rows.setdefault(value, []).append(row)
+            postings = {value: np.asarray(found, dtype=np.int64) for value, found in rows.items()}
+            self._fields[field] = postings
+        return postings
+
+    @staticmethod
+    def _union(arrays: List[np.ndarray]) -> np.ndarray:
+        if not arrays:
+            return np.zeros(0, dtype=np.int64)
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.unique(np.concatenate(arrays))
+
+    def rows(self, where: Dict) -> np.ndarray:
+        """Sorted rows whose metadata matches ``where``"""
+        if len(where) > 1:
+            return self.rows({"$and": [{key: value} for key, value in where.items()]})
+        (key, condition), = where.items()
+        if key == "$and":
+            matched = None
+            for clause in condition:
+                rows = self.rows(clause)
+                matched = rows if matched is None else np.intersect1d(matched, rows, assume_unique=True)
+            return matched if matched is not None else np.zeros(0, dtype=np.int64)
+        if key == "$or":
+            return self._union([self.rows(clause) for clause in condition])
+
+        postings = self._postings(key)
+        (operator, operand), = condition.items() if isinstance(condition, dict) else [("$eq", condition)]
+        if operator == "$eq":
+            return postings.get(operand, np.zeros(0, dtype=np.int64))
+        if operator == "$in":
+            return self._union([postings[value] for value in operand if value in postings])
+        if operator == "$ne":
+            return self._union([rows for value, rows in postings.items() if value != operand])
+        if operator == "$nin":
+            return self._union([rows for value, rows in postings.items() if value not in operand])
+        if operator in self._COMPARISONS:
+            compare = self._COMPARISONS[operator]
+            return self._union([rows for value, rows in postings.items()
+                                if isinstance(value, (int, float)) and compare(value, operand)])
+        raise ValueError(f"Unsupported filter operator '{operator}'")
+
+
+def _value_key(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def pack_metadata_postings(metadatas: Sequence[Dict]) -> Dict[str, np.ndarray]:
+    """Arrays of the postings of every filterable metadata field, served by ``MappedMetadataPostings``"""
+    fields: Dict[str, Dict[str, List[int]]] = {}
+    for row, metadata in enumerate(metadatas):
+        for field, value in (metadata or {}).items():
+            if field not in UNFILTERED_FIELDS and isinstance(value, (str, int, float, bool)):
+                fields.setdefault(field, {}).setdefault(_value_key(value), []).append(row)
+
+    tables = {}
+    for field, postings in fields.items():
+        values = list(postings)
+        prefix = f"postings.{field}"
+        tables[f"{prefix}.values.offsets"], tables[f"{prefix}.values.data"] = pack_strings(values)
+        tables[f"{prefix}.values.hashes"], tables[f"{prefix}.values.rows"] = pack_lookup(values)
+        tables[f"{prefix}.offsets"], tables[f"{prefix}.rows"] = pack_postings([postings[value] for value in values])
+    return tables
+
+
+class PackedFieldPostings:
+    """Value -> sorted rows of one metadata field, read from packed arrays (the dict ``MetadataPostings`` uses)"""
+
+    def __init__(self, tables: Dict[str, np.ndarray], prefix: str):
+        self._values = StringTable(tables[f"{prefix}.values.offsets"], tables[f"{prefix}.values.data"])
+        self._lookup = HashLookup(tables[f"{prefix}.values.hashes"], tables[f"{prefix}.values.rows"],
+                                  self._values.__getitem__)
+        self._offsets = tables[f"{prefix}.offsets"]
+        self._rows = tables[f"{prefix}.rows"]
+
+    def get(self, value, default=None) -> Optional[np.ndarray]:
+        index = self._lookup.get(_value_key(value))
+        return default if index is None else postings_slice(self._offsets, self._rows, index)
+
+    def __contains__(self, value) -> bool:
+        return self._lookup.get(_value_key(value)) is not None
+
+    def __getitem__(self, value) -> np.ndarray:
+        rows = self.get(value)
+        if rows is None:
+            raise KeyError(value)
+        return rows
+
+    def items(self) -> Iterator[Tuple[object, np.ndarray]]:
+        for index, value in enumerate(self._values):
+            yield json.loads(value), postings_slice(self._offsets, self._rows, index)
+
+
+class MappedMetadataPostings(MetadataPostings):
+    """``MetadataPostings`` over arrays written by ``pack_metadata_postings``, typically memory-mapped.
+
+    Fields listed in ``UNFILTERED_FIELDS`` are not packed and match nothing.
+    """
+
+    def __init__(self, tables: Dict[str, np.ndarray]):
+        super().__init__([])
+        for name in tables:
+            if name.startswith("postings.") and name.endswith(".values.offsets"):
+                prefix = name[:-len(".values.offsets")]
+                self._fields[prefix[len("postings."):]] = PackedFieldPostings(tables, prefix)
+
+    def _postings(self, field: str):
+        return self._fields.get(field, {})
+
+
+class VectorIndex(ABC):
+    """Interface of the vector index behind BookVectorStore.
+
+    It mirrors the subset of the Chroma collection API the store relies on, so
+    the Chroma collection can be used through a thin adapter and other backends
+    only need to implement these methods.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of entries"""
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None, where: Optional[Dict] = None) -> Dict:
+        """Entries by id, or a page of those matching ``where``, in Chroma's result format"""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+               metadatas: List[Dict]):
+        """Insert entries, replacing those whose id already exists"""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Remove entries; unknown ids are ignored"""
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int = 3,
+              where: Optional[Dict] = None) -> Dict:
+        """Nearest neighbours among the entries whose metadata matches ``where`` (a Chroma filter)"""
+
+    def flush(self):
+        """Persist pending writes; a no-op for backends that write through"""
+
+
+class ChromaIndex(VectorIndex):
+    """Adapter over a Chroma collection"""
+
+    name = "chroma"
+    DELETE_BATCH_SIZE = 5000
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get(self, ids=None, include=None, limit=None, offset=None, where=None) -> Dict:
+        kwargs = {"ids": ids, "limit": limit, "offset": offset, "where": where}
+        if include is not None:
+            kwargs["include"] = include
+        return self.collection.get(**kwargs)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids):
+        # Chroma caps the ids per call (a few thousand with its SQLite store)
+        for start in range(0, len(ids), self.DELETE_BATCH_SIZE):
+            self.collection.delete(ids=ids[start:start + self.DELETE_BATCH_SIZE])
+
+    def query(self, query_embeddings, n_results=3, where=None) -> Dict:
+        # Chroma applies the filter before the nearest-neighbour search
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where)
+
+
+def open_chroma_index(persist_directory: str, collection_name: str) -> ChromaIndex:
+    """Create or open a Chroma collection and wrap it"""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=persist_directory)
+    try:
+        collection = client.get_collection(collection_name)
+        print(f"Collection '{collection_name}' already exists with {collection.count()} documents")
+    except Exception:
+        collection = client.create_collection(collection_name)
+        print(f"Created new collection '{collection_name}'")
+    return ChromaIndex(collection)
+
+
+class NumpyIndex(VectorIndex):
+    """Flat in-process index: exact cosine search over a contiguous float32 matrix.
+
+    Vectors are L2-normalized on write, so a query is one matrix product plus
+    ``argpartition`` for the top-k. On disk the index is ``vectors.npy``, opened
+    with a memory map, and ``catalog.jsonl`` holding ids, documents and metadata.
+    Writes go to an in-memory buffer until ``flush``.
+
+    With ``quantization`` set to ``int8`` or ``binary`` a query first scans a
+    compact in-memory copy of the vectors, then rescores the best
+    ``rescore_factor * n_results`` candidates (at least ``MIN_RESCORE_CANDIDATES``)
+    against the full-precision rows, which can stay memory-mapped on disk.
+
+    A ``where`` filter is resolved to rows through ``MetadataPostings`` first,
+    and only those rows are scanned and scored.
+    """
+
+    name = "numpy"
+    VECTORS_FILE = "vectors.npy"
+    CATALOG_FILE = "catalog.jsonl"
+
+    def __init__(self, directory: str, quantization: str = "none", rescore_factor: int = 10):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization '{quantization}'. Available: {', '.join(QUANTIZATION_MODES)}")
+        self.directory = directory
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        # Built lazily from the vectors on the first query after a change
+        self._quantized: Optional[QuantizedVectors] = None
+        self._postings: Optional[MetadataPostings] = None
+        self._lock = threading.RLock()
+        self._buffer: Optional[np.ndarray] = None
+        self._size = 0
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._dirty = False
+        self._load()
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._buffer is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._buffer[:self._size]
+
+    def _load(self):
+        vectors_path = os.path.join(self.directory, self.VECTORS_FILE)
+        catalog_path = os.path.join(self.directory, self.CATALOG_FILE)
+        if not (os.path.exists(vectors_path) and os.path.exists(catalog_path)):
+            return
+
+        vectors = np.load(vectors_path, mmap_mode="r")
+        ids, documents, metadatas = [], [], []
+        with open(catalog_path, "r", encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                ids.append(record["id"])
+                documents.append(record["document"])
+                metadatas.append(record["metadata"])
+
+        if len(ids) != vectors.shape[0]:
+            raise ValueError(f"Index in {self.directory} is inconsistent: "
+                             f"{vectors.shape[0]} vectors for {len(ids)} catalog entries")
+
+        self._buffer = vectors
+        self._size = vectors.shape[0]
+        self._ids, self._documents, self._metadatas = ids, documents, metadatas
+        self._rows = {doc_id: row for row, doc_id in enumerate(ids)}
+
+    @staticmethod
+    def _normalize(embeddings) -> np.ndarray:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _reserve(self, rows: int, dim: int):
+        """Make room for ``rows`` more vectors, doubling capacity as needed"""
+        if self._buffer is None:
+            self._buffer = np.zeros((max(rows, 1024), dim), dtype=np.float32)
+            return
+        if self._buffer.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match index dimension {self._buffer.shape[1]}")
+
+        needed = self._size + rows
+        # A memory-mapped buffer is read-only, so the first write copies it into RAM
+        if needed > self._buffer.shape[0] or not self._buffer.flags.writeable:
+            capacity = max(needed, self._buffer.shape[0] * 2 if needed > self._buffer.shape[0] else self._buffer.shape[0])
+            buffer = np.zeros((capacity, dim), dtype=np.float32)
+            buffer[:self._size] = self._buffer[:self._size]
+            self._buffer = buffer
+
+    def replace_all(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict],
+                    vectors: np.ndarray, persist: bool = False, rows: Optional[Mapping[str, int]] = None,
+                    postings: Optional[MetadataPostings] = None):
+        """Serve exactly these entries. ``vectors`` must be L2-normalized; a float32 memory map is used
+        in place (it is only copied into RAM on the next write), other dtypes are widened once.
+        With ``persist`` the entries are also written to this index's directory on the next flush.
+
+        Given ``rows`` (id -> row) the catalog sequences are served as they are, e.g. memory-mapped
+        snapshot tables, together with ``postings`` if given; they too are copied on the next write.
+        """
+        if len(ids) != vectors.shape[0]:
+            raise ValueError(f"{vectors.shape[0]} vectors for {len(ids)} entries")
+        if vectors.dtype != np.float32:
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._buffer = vectors
+            self._size = len(ids)
+            if rows is None:
+                self._ids, self._documents, self._metadatas = list(ids), list(documents), list(metadatas)
+                self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            else:
+                self._ids, self._documents, self._metadatas, self._rows = ids, documents, metadatas, rows
+            self._quantized = None
+            self._postings = postings
+            self._dirty = persist
+
+    def _own_catalog(self):
+        """Copy a catalog served from snapshot tables into lists before changing it"""
+        if not isinstance(self._ids, list):
+            self._ids, self._documents, self._metadatas = list(self._ids), list(self._documents), list(self._metadatas)
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+    def count(self) -> int:
+        return self._size
+
+    def get(self, ids=None, include=None, limit=None, offset=None, where=None) -> Dict:
+        include = ["metadatas", "documents"] if include is None else include
+        with self._lock:
+            if ids is None:
+                rows = self.postings().rows(where).tolist() if where else range(self._size)
+                start = offset or 0
+                rows = list(rows[start:] if limit is None else rows[start:start + limit])
+            else:
+                rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+                if where:
+                    allowed = set(self.postings().rows(where).tolist())
+                    rows = [row for row in rows if row in allowed]
+
+            result = {"ids": [self._ids[row] for row in rows]}
+            result["metadatas"] = [self._metadatas[row] for row in rows] if "metadatas" in include else None
+            result["documents"] = [self._documents[row] for row in rows] if "documents" in include else None
+            result["embeddings"] = self.vectors[rows] if "embeddings" in include else None
+            return result
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        matrix = self._normalize(embeddings)
+        with self._lock:
+            self._own_catalog()
+            new_rows = [i for i, doc_id in enumerate(ids) if doc_id not in self._rows]
+            self._reserve(len(new_rows), matrix.shape[1])
+
+            for i, doc_id in enumerate(ids):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[doc_id] = row
+                    self._ids.append(doc_id)
+                    self._documents.append(documents[i])
+                    self._metadatas.append(metadatas[i])
+                else:
+                    self._documents[row] = documents[i]
+                    self._metadatas[row] = metadatas[i]
+                self._buffer[row] = matrix[i]
+            self._quantized = None
+            self._postings = None
+            self._dirty = True
+
+    def delete(self, ids):
+        """Remove entries; the matrix is copied once per call, so pass every id at once"""
+        with self._lock:
+            doomed = {self._rows[doc_id] for doc_id in ids if doc_id in self._rows}
+            if not doomed:
+                return
+            self._own_catalog()
+            keep = [row for row in range(self._size) if row not in doomed]
+            self._buffer = np.ascontiguousarray(self.vectors[keep])
+            self._size = len(keep)
+            self._ids = [self._ids[row] for row in keep]
+            self._documents = [self._documents[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._quantized = None
+            self._postings = None
+            self._dirty = True
+
+    def quantized(self) -> Optional[QuantizedVectors]:
+        """The compact first-pass copy of the current vectors, or None without quantization"""
+        if self.quantization == "none":
+            return None
+        with self._lock:
+            if self._quantized is None:
+                self._quantized = QuantizedVectors(self.vectors, self.quantization)
+            return self._quantized
+
+    def postings(self) -> MetadataPostings:
+        """Metadata filter index over the current entries"""
+        with self._lock:
+            if self._postings is None:
+                self._postings = MetadataPostings(self._metadatas)
+            return self._postings
+
+    def _top_rows(self, query: np.ndarray, vectors: np.ndarray, quantized: QuantizedVectors, k: int,
+                  subset: Optional[np.ndarray] = None) -> tuple:
+        """Quantized first pass, then exact rescoring: the k best rows (of ``subset`` if given),
+        best first, and their cosine similarities"""
+        size = vectors.shape[0] if subset is None else len(subset)
+        candidates = max(k * self.rescore_factor, MIN_RESCORE_CANDIDATES)
+        if candidates < size:
+            rows = np.argpartition(-quantized.scores(query, subset), candidates - 1)[:candidates]
+            if subset is not None:
+                rows = subset[rows]
+            rows.sort()
+        else:
+            rows = np.arange(size) if subset is None else subset
+        # Only the candidate rows of a memory-mapped matrix are read from disk
+        scores = np.asarray(vectors[rows], dtype=np.float32) @ query
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def query(self, query_embeddings, n_results=3, where=None) -> Dict:
+        queries = self._normalize(query_embeddings)
+        with self._lock:
+            quantized = self.quantized()
+            vectors = self.vectors
+            ids, documents, metadatas = self._ids, self._documents, self._metadatas
+            subset = self.postings().rows(where) if where else None
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        k = min(n_results, vectors.shape[0] if subset is None else len(subset))
+        if k == 0:
+            for key in result:
+                result[key] = [[] for _ in range(queries.shape[0])]
+            return result
+
+        if quantized is None:
+            if subset is None:
+                scores = queries @ vectors.T
+            elif len(subset) * _GATHER_RATIO < vectors.shape[0]:
+                # A selective filter only reads and scores the matching rows
+                scores = queries @ vectors[subset].T
+            else:
+                # Gathering most of the rows costs more than one pass over all of them
+                scores = (queries @ vectors.T)[:, subset]
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            ranked = []
+            for q in range(queries.shape[0]):
+                order = top[q][np.argsort(-scores[q, top[q]])]
+                ranked.append((order if subset is None else subset[order], scores[q, order]))
+        else:
+            ranked = [self._top_rows(query, vectors, quantized, k, subset) for query in queries]
+
+        for order, similarities in ranked:
+            result["ids"].append([ids[row] for row in order])
+            result["documents"].append([documents[row] for row in order])
+            result["metadatas"].append([metadatas[row] for row in order])
+            # Cosine distance, matching Chroma's "cosine" space
+            result["distances"].append([float(1.0 - similarity) for similarity in similarities])
+        return result
+
+    def flush(self):
+        """Atomically write vectors and sidecar, then reopen the vectors memory-mapped"""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            vectors_path = os.path.join(self.directory, self.VECTORS_FILE)
+            catalog_path = os.path.join(self.directory, self.CATALOG_FILE)
+
+            with open(vectors_path + ".tmp", "wb") as file:
+                np.save(file, np.ascontiguousarray(self.vectors))
+            with open(catalog_path + ".tmp", "w", encoding="utf-8") as file:
+                for doc_id, document, metadata in zip(self._ids, self._documents, self._metadatas):
+                    file.write(json.dumps({"id": doc_id, "document": document, "metadata": metadata},
+                                          ensure_ascii=False) + "\n")
+            os.replace(vectors_path + ".tmp", vectors_path)
+            os.replace(catalog_path + ".tmp", catalog_path)
+
+            self._buffer = np.load(vectors_path, mmap_mode="r")
+            self._dirty = False
+
+
+def drop_chroma_index(persist_directory: str, collection_name: str):
+    import chromadb
+
+    chromadb.PersistentClient(path=persist_directory).delete_collection(collection_name)
+
+
+def open_numpy_index(persist_directory: str, collection_name: str, quantization: str = "none",
+                     rescore_factor: int = 10) -> NumpyIndex:
+    """Open (or start) a NumPy index stored under persist_directory/collection_name"""
+    index = NumpyIndex(os.path.join(persist_directory, collection_name), quantization, rescore_factor)
+    if index.count():
+        print(f"Index '{collection_name}' loaded with {index.count()} documents"
+              + (f" ({quantization} first pass)" if quantization != "none" else ""))
+    else:
+        print(f"Created new index '{collection_name}'")
+    return index
+
+
+def drop_numpy_index(persist_directory: str, collection_name: str):
+    # Readers still holding the memory map keep a valid view of the unlinked files
+    shutil.rmtree(os.path.join(persist_directory, collection_name))
+
+
+INDEX_BACKENDS = {
+    "chroma": open_chroma_index,
+    "numpy": open_numpy_index,
+}
+
+DROP_INDEX = {
+    "chroma": drop_chroma_index,
+    "numpy": drop_numpy_index,
+}
+
+DEFAULT_PERSIST_DIRECTORIES = {
+    "chroma": "./chroma_db",
+    "numpy": "./numpy_index",
+}
+
+
+def open_index(backend: str, persist_directory: str, collection_name: str, quantization: str = "none",
+               rescore_factor: int = 10) -> VectorIndex:
+    """Open the index for the named backend; quantized search is only available with numpy"""
+    try:
+        factory = INDEX_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown index backend '{backend}'. Available: {', '.join(INDEX_BACKENDS)}")
+    if backend == "numpy":
+        return factory(persist_directory, collection_name, quantization, rescore_factor)
+    if quantization != "none":
+        print(f"Vector quantization '{quantization}' is not supported by the {backend} backend, ignoring it")
+    return factory(persist_directory, collection_name)
+
+
+def drop_index(backend: str, persist_directory: str, collection_name: str):
+    """Delete a collection and its stored data"""
+    DROP_INDEX[backend](persist_directory, collection_name)
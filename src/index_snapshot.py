@@ -0,0 +1,375 @@
+"""
+Portable, versioned snapshot files of the book index.
+
+Layout (little-endian)::
+
+    magic "LIBSNAP\\0" | u64 header offset | u64 header length | padding
+    vectors   count x dim, float32 or float16, 64-byte aligned, L2-normalized
+    catalog   JSON lines: {"id", "title", "summary", "content_hash", "metadata"}
+    tables    64-byte aligned arrays: the catalog as columns (ids, summaries,
+              metadata, titles) and its BM25, title and metadata indexes
+    header    JSON: format version, embedding model, dtype, dim, count,
+              region offsets, sizes and SHA-256 digests, table layout
+
+The vectors and tables regions are opened with ``np.memmap``, so a float32
+snapshot can back the NumPy index and its text indexes without being read
+into memory: processes serving the same file share its pages. Snapshots
+written before the tables region existed are still read; their catalog is
+then loaded from the JSON lines.
+
+    python src/index_snapshot.py build data/book_summaries.txt books.snap --dtype float16
+    python src/index_snapshot.py info books.snap
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from index_backends import MappedMetadataPostings, pack_metadata_postings
+from lexical_index import MappedBM25Index, pack_bm25
+from mapped_tables import HashLookup, JsonTable, StringTable, pack_lookup, pack_strings
+from title_index import MappedTitleIndex, pack_title_index
+
+SNAPSHOT_MAGIC = b"LIBSNAP\x00"
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_DTYPES = ("float32", "float16")
+# Metadata keys stored as top-level record fields rather than under "metadata"
+RECORD_FIELDS = ("title", "content_hash")
+
+_PREAMBLE = struct.Struct("<8sQQ")
+_ALIGNMENT = 64
+_CHUNK_BYTES = 1 << 20
+
+
+class SnapshotError(ValueError):
+    """The file is not a readable snapshot, or does not match the store it is loaded into"""
+
+
+def _pad(file, alignment: int = _ALIGNMENT, digest=None):
+    padding = b"\x00" * (-file.tell() % alignment)
+    file.write(padding)
+    if digest is not None:
+        digest.update(padding)
+
+
+def pack_catalog(ids: List[str], documents: List[str], metadatas: List[Dict],
+                 title_weight: int = 3) -> Dict[str, np.ndarray]:
+    """Catalog columns plus the packed BM25, title and metadata indexes over them, in vector order"""
+    titles = [(metadata or {}).get("title") or "" for metadata in metadatas]
+    tables = {}
+    tables["ids.offsets"], tables["ids.data"] = pack_strings(ids)
+    tables["ids.hashes"], tables["ids.rows"] = pack_lookup(ids)
+    tables["documents.offsets"], tables["documents.data"] = pack_strings(documents)
+    tables["metadatas.offsets"], tables["metadatas.data"] = pack_strings(
+        json.dumps(metadata or {}, ensure_ascii=False) for metadata in metadatas)
+    tables["titles.offsets"], tables["titles.data"] = pack_strings(titles)
+    # Rows in the title order GET /books lists them in
+    tables["titles.order"] = np.array(sorted(range(len(ids)), key=lambda row: (titles[row].lower(), ids[row])),
+                                      dtype=np.uint32)
+    tables.update(pack_bm25(titles, documents, title_weight))
+    tables.update(pack_title_index(titles))
+    tables.update(pack_metadata_postings(metadatas))
+    return tables
+
+
+def write_snapshot(path: str, pages: Iterable[Tuple[List[str], np.ndarray, List[str], List[Dict]]],
+                   embedding_model: str, dtype: str = "float32", title_weight: int = 3) -> Dict:
+    """Write (ids, embeddings, documents, metadatas) pages to ``path`` atomically; returns the header.
+
+    ``title_weight`` is the BM25 title weight the packed text index is built with.
+    """
+    if dtype not in SNAPSHOT_DTYPES:
+        raise SnapshotError(f"Unsupported snapshot dtype '{dtype}'. Available: {', '.join(SNAPSHOT_DTYPES)}")
+
+    temp_path = path + ".tmp"
+    vectors_digest = hashlib.sha256()
+    catalog_digest = hashlib.sha256()
+    tables_digest = hashlib.sha256()
+    catalog_lines: List[bytes] = []
+    all_ids: List[str] = []
+    all_documents: List[str] = []
+    all_metadatas: List[Dict] = []
+    count = 0
+    dim = None
+
+    with open(temp_path, "wb") as file:
+        file.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, 0, 0))
+        _pad(file)
+        vectors_offset = file.tell()
+
+        for ids, embeddings, documents, metadatas in pages:
+            if not ids:
+                continue
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            if dim is None:
+                dim = matrix.shape[1]
+            elif matrix.shape[1] != dim:
+                raise SnapshotError(f"Mixed embedding dimensions in index: {dim} and {matrix.shape[1]}")
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            data = np.ascontiguousarray(matrix / norms, dtype=dtype).tobytes()
+            file.write(data)
+            vectors_digest.update(data)
+            count += len(ids)
+
+            # The catalog follows the vectors, so it is buffered until they are all written
+            all_ids.extend(ids)
+            all_documents.extend(documents)
+            all_metadatas.extend(metadatas)
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                metadata = dict(metadata or {})
+                record = {"id": doc_id, "title": metadata.pop("title", None), "summary": document,
+                          "content_hash": metadata.pop("content_hash", None), "metadata": metadata}
+                catalog_lines.append(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+        vectors_bytes = file.tell() - vectors_offset
+        catalog_offset = file.tell()
+        for line in catalog_lines:
+            file.write(line)
+            catalog_digest.update(line)
+        catalog_bytes = file.tell() - catalog_offset
+
+        _pad(file)
+        tables_offset = file.tell()
+        tables = {}
+        for name, array in pack_catalog(all_ids, all_documents, all_metadatas, title_weight).items():
+            _pad(file, digest=tables_digest)
+            array = np.ascontiguousarray(array)
+            tables[name] = {"offset": file.tell(), "dtype": array.dtype.str, "shape": list(array.shape)}
+            data = array.tobytes()
+            file.write(data)
+            tables_digest.update(data)
+        tables_bytes = file.tell() - tables_offset
+
+        header = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "embedding_model": embedding_model,
+            "dtype": dtype,
+            "dim": dim or 0,
+            "count": count,
+            "normalized": True,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "vectors_offset": vectors_offset,
+            "vectors_bytes": vectors_bytes,
+            "vectors_sha256": vectors_digest.hexdigest(),
+            "catalog_offset": catalog_offset,
+            "catalog_bytes": catalog_bytes,
+            "catalog_sha256": catalog_digest.hexdigest(),
+            "tables_offset": tables_offset,
+            "tables_bytes": tables_bytes,
+            "tables_sha256": tables_digest.hexdigest(),
+            "tables": tables,
+            "bm25_title_weight": title_weight,
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        header_offset = file.tell()
+        file.write(header_bytes)
+        file.seek(0)
+        file.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, header_offset, len(header_bytes)))
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp_path, path)
+    return header
+
+
+class IndexSnapshot:
+    """Read side of a snapshot file: header, memory-mapped vectors and catalog records"""
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        self.header = self._read_header()
+        if verify:
+            self.verify()
+
+    def _read_header(self) -> Dict:
+        with open(self.path, "rb") as file:
+            preamble = file.read(_PREAMBLE.size)
+            if len(preamble) < _PREAMBLE.size:
+                raise SnapshotError(f"{self.path} is not an index snapshot")
+            magic, header_offset, header_length = _PREAMBLE.unpack(preamble)
+            if magic != SNAPSHOT_MAGIC or not header_offset:
+                raise SnapshotError(f"{self.path} is not an index snapshot")
+            file.seek(header_offset)
+            header = json.loads(file.read(header_length).decode("utf-8"))
+
+        if header["format_version"] > SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(f"Snapshot format {header['format_version']} is newer than supported "
+                                f"({SNAPSHOT_FORMAT_VERSION})")
+        if header["dtype"] not in SNAPSHOT_DTYPES:
+            raise SnapshotError(f"Unsupported snapshot dtype '{header['dtype']}'")
+        return header
+
+    def _region_digest(self, offset: int, size: int) -> str:
+        digest = hashlib.sha256()
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            remaining = size
+            while remaining:
+                chunk = file.read(min(_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+        return digest.hexdigest()
+
+    def verify(self):
+        """Check every region against its recorded SHA-256 digest"""
+        header = self.header
+        for region in ("vectors", "catalog", "tables"):
+            if f"{region}_sha256" not in header:
+                continue
+            actual = self._region_digest(header[f"{region}_offset"], header[f"{region}_bytes"])
+            if actual != header[f"{region}_sha256"]:
+                raise SnapshotError(f"Snapshot {self.path} is corrupt: {region} checksum mismatch")
+
+    @property
+    def count(self) -> int:
+        return self.header["count"]
+
+    @property
+    def embedding_model(self) -> str:
+        return self.header["embedding_model"]
+
+    def vectors(self) -> np.ndarray:
+        """Read-only memory map of the (count, dim) vector matrix"""
+        header = self.header
+        if not header["count"]:
+            return np.zeros((0, header["dim"]), dtype=header["dtype"])
+        return np.memmap(self.path, dtype=header["dtype"], mode="r", offset=header["vectors_offset"],
+                         shape=(header["count"], header["dim"]))
+
+    def tables(self) -> Dict[str, np.ndarray]:
+        """Read-only views of the packed tables, all backed by one memory map of their region"""
+        header = self.header
+        if not header.get("tables"):
+            return {}
+        region = np.memmap(self.path, dtype=np.uint8, mode="r", offset=header["tables_offset"],
+                           shape=(header["tables_bytes"],))
+        tables = {}
+        for name, layout in header["tables"].items():
+            dtype = np.dtype(layout["dtype"])
+            start = layout["offset"] - header["tables_offset"]
+            size = int(np.prod(layout["shape"], dtype=np.int64)) * dtype.itemsize
+            tables[name] = region[start:start + size].view(dtype).reshape(layout["shape"])
+        return tables
+
+    def mapped_catalog(self) -> Optional["MappedCatalog"]:
+        """The catalog and text indexes served from the memory map, or None for a snapshot without tables"""
+        tables = self.tables()
+        if not tables:
+            return None
+        return MappedCatalog(tables, self.header["bm25_title_weight"], self.header["tables_sha256"])
+
+    def iter_records(self) -> Iterator[Dict]:
+        header = self.header
+        with open(self.path, "rb") as file:
+            file.seek(header["catalog_offset"])
+            remaining = header["catalog_bytes"]
+            while remaining > 0:
+                line = file.readline(remaining)
+                if not line:
+                    break
+                remaining -= len(line)
+                yield json.loads(line)
+
+    def catalog(self) -> Tuple[List[str], List[str], List[Dict]]:
+        """Ids, documents and index metadata, in vector order"""
+        ids, documents, metadatas = [], [], []
+        for record in self.iter_records():
+            ids.append(record["id"])
+            documents.append(record["summary"])
+            metadata = dict(record.get("metadata") or {})
+            metadata.update({field: record[field] for field in RECORD_FIELDS if record.get(field) is not None})
+            metadatas.append(metadata)
+        return ids, documents, metadatas
+
+
+class MappedCatalog:
+    """A snapshot's catalog columns and text indexes, read in place from its memory map.
+
+    Nothing is decoded up front: an id, summary or metadata record is decoded
+    when it is accessed, so processes serving one snapshot share these pages
+    the way they share its vectors.
+    """
+
+    def __init__(self, tables: Dict[str, np.ndarray], title_weight: int, digest: str = ""):
+        self.tables = tables
+        self.title_weight = title_weight
+        # SHA-256 of the tables region: identifies the catalog's contents
+        self.digest = digest
+        self.ids = StringTable(tables["ids.offsets"], tables["ids.data"])
+        self.documents = StringTable(tables["documents.offsets"], tables["documents.data"])
+        self.metadatas = JsonTable(tables["metadatas.offsets"], tables["metadatas.data"])
+        self.titles = StringTable(tables["titles.offsets"], tables["titles.data"])
+        self.rows = HashLookup(tables["ids.hashes"], tables["ids.rows"], self.ids.__getitem__)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def lexical_index(self, k1: float = 1.5, b: float = 0.75, min_title_coverage: float = 0.6) -> MappedBM25Index:
+        return MappedBM25Index(self.tables, self.ids, self.titles, k1=k1, b=b, title_weight=self.title_weight,
+                               min_title_coverage=min_title_coverage)
+
+    def title_index(self, fuzzy_threshold: float = 0.85) -> MappedTitleIndex:
+        return MappedTitleIndex(self.tables, self.titles, self.documents, fuzzy_threshold)
+
+    def postings(self) -> MappedMetadataPostings:
+        return MappedMetadataPostings(self.tables)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Sync a catalog file into the index, then export a snapshot")
+    build.add_argument("catalog")
+    build.add_argument("output")
+    build.add_argument("--dtype", choices=SNAPSHOT_DTYPES, default="float32")
+
+    export = commands.add_parser("export", help="Export the current index")
+    export.add_argument("output")
+    export.add_argument("--dtype", choices=SNAPSHOT_DTYPES, default="float32")
+
+    load = commands.add_parser("import", help="Replace the current index with a snapshot")
+    load.add_argument("snapshot")
+    load.add_argument("--no-verify", action="store_true")
+
+    info = commands.add_parser("info", help="Show a snapshot header")
+    info.add_argument("snapshot")
+    info.add_argument("--verify", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        print(json.dumps(IndexSnapshot(args.snapshot, verify=args.verify).header, indent=2))
+        return
+
+    from dotenv import load_dotenv
+    from vector_store import BookVectorStore
+
+    load_dotenv()
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        sys.exit("OPENAI_API_KEY not found in environment variables!")
+
+    store = BookVectorStore(openai_api_key)
+    store.create_collection()
+    if args.command == "build":
+        store.populate_database(args.catalog, incremental=True)
+    if args.command in ("build", "export"):
+        header = store.export_snapshot(args.output, dtype=args.dtype)
+        print(f"Wrote {header['count']} books ({header['dtype']}, dim {header['dim']}) to {args.output}")
+    else:
+        header = store.import_snapshot(args.snapshot, verify=not args.no_verify)
+        print(f"Imported {header['count']} books from {args.snapshot}")
+
+
+if __name__ == "__main__":
+    main()
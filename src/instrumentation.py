@@ -0,0 +1,118 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from metrics import MetricsRegistry
+
+# Stages of the request path, in order
+STAGE_FILTER = "filter"
+STAGE_EMBEDDING = "embedding"
+STAGE_INDEX_QUERY = "index_query"
+STAGE_FIRST_COMPLETION = "first_completion"
+STAGE_TOOLS = "tools"
+STAGE_SECOND_COMPLETION = "second_completion"
+STAGE_DIRECT_COMPLETION = "direct_completion"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "librarian_stage_latency_ms", "Time spent in each stage of answering a query, in milliseconds", ("stage",)
+)
+COMPLETION_TOKENS = REGISTRY.counter(
+    "librarian_completion_tokens_total", "Tokens reported in chat completion usage", ("model", "type")
+)
+ANSWERS = REGISTRY.counter(
+    "librarian_answers_total", "Answers by how they were produced", ("source",)
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "librarian_http_requests_in_flight", "HTTP requests currently being served", ("endpoint",)
+)
+REQUEST_LATENCY = REGISTRY.histogram(
+    "librarian_http_request_latency_ms", "HTTP request latency in milliseconds", ("endpoint", "status")
+)
+OPENAI_QUEUE_TIME = REGISTRY.histogram(
+    "librarian_openai_queue_ms", "Time OpenAI calls waited for a concurrency slot and rate limit, in milliseconds",
+    ("endpoint",)
+)
+OPENAI_IN_FLIGHT = REGISTRY.gauge(
+    "librarian_openai_requests_in_flight", "OpenAI calls currently holding a concurrency slot", ("endpoint",)
+)
+OPENAI_ATTEMPTS = REGISTRY.counter(
+    "librarian_openai_attempts_total", "OpenAI call attempts by outcome (ok, retry, error)", ("endpoint", "outcome")
+)
+MODEL_CALLS = REGISTRY.counter(
+    "librarian_model_calls_total", "Chat completions by role, routed model, routing reason and outcome",
+    ("role", "model", "reason", "outcome")
+)
+MODEL_LATENCY = REGISTRY.histogram(
+    "librarian_model_latency_ms", "Chat completion latency by role and routed model, in milliseconds",
+    ("role", "model")
+)
+
+
+@contextmanager
+def span(stage: str, timings: Optional[Dict] = None):
+    """Time a block as ``stage``; the duration is also added to ``timings`` (ms) when given"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        STAGE_LATENCY.observe(elapsed_ms, stage=stage)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed_ms
+
+
+def record_usage(usage, model: str):
+    """Count prompt and completion tokens from a completion's ``usage`` block"""
+    if usage is None:
+        return
+    COMPLETION_TOKENS.inc(usage.prompt_tokens or 0, model=model, type="prompt")
+    COMPLETION_TOKENS.inc(usage.completion_tokens or 0, model=model, type="completion")
+
+
+def server_timing(timings: Dict) -> str:
+    """Format stage timings as a Server-Timing header value"""
+    return ", ".join(f"{stage};dur={value:.1f}" for stage, value in timings.items()
+                     if isinstance(value, (int, float)))
+
+
+def register_librarian_metrics(librarian, async_librarian=None):
+    """Expose cache and routing counters of a librarian, read at scrape time"""
+    response_cache = librarian.response_cache
+    embedding_cache = librarian.vector_store.embedding_cache
+
+    def ratio(hits, misses):
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    REGISTRY.callback(
+        "librarian_cache_hits_total", "Cache hits", lambda: {
+            ("response",): response_cache.hits, ("embedding",): embedding_cache.hits
+        }, ("cache",), kind="counter"
+    )
+    REGISTRY.callback(
+        "librarian_cache_misses_total", "Cache misses", lambda: {
+            ("response",): response_cache.misses, ("embedding",): embedding_cache.misses
+        }, ("cache",), kind="counter"
+    )
+    REGISTRY.callback(
+        "librarian_cache_hit_ratio", "Cache hit ratio since startup", lambda: {
+            ("response",): ratio(response_cache.hits, response_cache.misses),
+            ("embedding",): ratio(embedding_cache.hits, embedding_cache.misses)
+        }, ("cache",)
+    )
+    REGISTRY.callback(
+        "librarian_router_routes_total", "Queries by intent route",
+        lambda: {(route,): count for route, count in librarian.router.stats().items()}, ("route",), kind="counter"
+    )
+    REGISTRY.callback(
+        "librarian_catalog_books", "Books in the serving index", lambda: {(): librarian.vector_store.collection.count()}
+    )
+
+    if async_librarian is not None:
+        batcher = async_librarian.vector_store.batcher
+        if batcher is not None:
+            REGISTRY.callback(
+                "librarian_embedding_batch_size_mean", "Mean number of texts per micro-batched embeddings request",
+                lambda: {(): batcher.batch_sizes.summary()["mean"]}
+            )
@@ -0,0 +1,93 @@
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from lexical_index import normalize_text
+from title_index import TitleIndex
+
+# Direct "what is <title>" questions, matched on lowercased, diacritic-free input
+DIRECT_TITLE_PATTERN = re.compile(
+    r"^\s*(?:"
+    r"ce (?:este|e|inseamna)"
+    r"|despre ce (?:este|e|vorbeste)"
+    r"|ce stii despre"
+    r"|(?:da-mi |vreau )?(?:un )?rezumat(?:ul)?(?: (?:pentru|la|despre|cartii|carte))?"
+    r"|what(?: is|'s)"
+    r"|what is the book"
+    r"|tell me about"
+    r"|(?:give me a )?summary of"
+    r"|summari[sz]e"
+    r")\s+(?P<quote>[\"'„“])?(?P<title>.+?)[\"'”]?\s*[?.!]*\s*$"
+)
+# Catalog titles this short ("It", "Us") collide with pronouns and are only routed when quoted
+MIN_UNQUOTED_TITLE_CHARS = 4
+
+ROUTE_DIRECT_TITLE = "direct_title"
+ROUTE_FULL = "full"
+
+
+@dataclass
+class Route:
+    name: str
+    title: Optional[str] = None
+    summary: Optional[str] = None
+
+
+class IntentRouter:
+    """Decides, before any LLM call, whether a query is a plain title lookup.
+
+    Direct questions about a catalog title ("Ce este 1984?") are resolved
+    locally. Depending on ``mode`` they are then answered with a template and
+    no LLM call ("template"), with one completion that already contains the
+    summary ("completion"), or the router is bypassed ("off"). Follow-ups and
+    filtered searches always take the full route, as they need the
+    conversation or the filters.
+    """
+
+    MODES = ("template", "completion", "off")
+
+    def __init__(self, title_index: TitleIndex, mode: str = "completion"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown router mode '{mode}'. Available: {', '.join(self.MODES)}")
+        self.title_index = title_index
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def route(self, user_input: str, history: Optional[List[Dict]] = None, filters: Optional[Dict] = None) -> Route:
+        """Classify a query and count the decision"""
+        route = Route(ROUTE_FULL)
+        if self.mode != "off" and not history and not filters:
+            match = DIRECT_TITLE_PATTERN.match(normalize_text(user_input))
+            if match:
+                resolved = self.title_index.resolve(match.group("title"))
+                if resolved is not None and (match.group("quote")
+                                             or _title_chars(resolved[0]) >= MIN_UNQUOTED_TITLE_CHARS):
+                    route = Route(ROUTE_DIRECT_TITLE, title=resolved[0], summary=resolved[1])
+
+        with self._lock:
+            self._counters[route.name] += 1
+        return route
+
+    def template_answer(self, route: Route) -> str:
+        """Answer a direct title question without calling the LLM"""
+        return f"📖 Iată despre ce este vorba în „{route.title}”:\n\n{route.summary}"
+
+    def completion_messages(self, system_prompt: str, user_input: str, route: Route) -> List[Dict]:
+        """Messages for a single tool-free completion that already contains the summary"""
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": f"Rezumat detaliat pentru '{route.title}': {route.summary}"},
+            {"role": "user", "content": user_input}
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        """Return how many queries took each route"""
+        with self._lock:
+            return dict(self._counters)
+
+
+def _title_chars(title: str) -> int:
+    return sum(ch.isalnum() for ch in normalize_text(title))
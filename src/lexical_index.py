@@ -0,0 +1,275 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mapped_tables import HashLookup, StringTable, pack_lookup, pack_postings, pack_strings, postings_slice
+
+STOPWORDS = {
+    # Romanian
+    "a", "al", "ale", "am", "ar", "au", "avea", "ce", "cu", "care", "cel", "cea", "cum", "carte", "cartea",
+    "carti", "da", "dar", "de", "despre", "din", "e", "este", "fi", "imi", "in", "la", "le", "lui", "mai",
+    "ma", "mi", "nu", "o", "pe", "pentru", "sa", "se", "si", "sunt", "un", "una", "unei", "unui", "vreau",
+    "recomanzi", "recomanda",
+    # English
+    "about", "an", "and", "are", "as", "book", "by", "for", "from", "i", "is", "it", "me", "of", "on",
+    "or", "that", "the", "this", "to", "want", "what", "with",
+}
+
+# Request wording around a title lookup ("tell me about 1984"); ignored only when
+# judging how much of a query a title covers, not when indexing
+LOOKUP_WORDS = {
+    "spune", "spuneti", "rezumat", "rezumatul", "recomandare", "roman", "romanul",
+    "tell", "give", "know", "summary", "summarize", "summarise", "novel", "please",
+}
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip diacritics (ș -> s, ă -> a, ...)"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    """Split normalized text into word tokens"""
+    return re.findall(r"\w+", normalize_text(text))
+
+
+def document_terms(title_tokens: List[str], summary: str, title_weight: int) -> Counter:
+    """Term frequencies of a book; title terms count ``title_weight`` times"""
+    terms = Counter(token for token in tokenize(summary) if token not in STOPWORDS)
+    for token in title_tokens:
+        if token not in STOPWORDS:
+            terms[token] += title_weight
+    return terms
+
+
+class BM25Index:
+    """In-memory inverted index over book titles and summaries, scored with BM25.
+
+    Title terms are counted ``title_weight`` times so a hit in the title outranks
+    the same word in a summary. Besides ranked search, ``title_match`` finds
+    catalog titles quoted verbatim inside a query with dictionary lookups over
+    the query's n-grams, when the title makes up at least ``min_title_coverage``
+    of the query's content words.
+    """
+
+    MAX_TITLE_TOKENS = 12
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, title_weight: int = 3, min_title_coverage: float = 0.6):
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+        self.min_title_coverage = min_title_coverage
+
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._total_len = 0
+        self._titles: Dict[str, str] = {}
+        self._title_lookup: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def add(self, doc_id: str, title: str, summary: str):
+        """Index a book, replacing any previous version with the same id"""
+        with self._lock:
+            self._remove(doc_id)
+
+            title_tokens = tokenize(title)
+            terms = document_terms(title_tokens, summary, self.title_weight)
+
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            self._doc_terms[doc_id] = terms
+            self._doc_len[doc_id] = sum(terms.values())
+            self._total_len += self._doc_len[doc_id]
+
+            normalized_title = " ".join(title_tokens)
+            self._titles[doc_id] = normalized_title
+            self._title_lookup[normalized_title] = doc_id
+
+    def remove(self, doc_ids: List[str]):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id)
+        title = self._titles.pop(doc_id)
+        if self._title_lookup.get(title) == doc_id:
+            del self._title_lookup[title]
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._titles.clear()
+            self._title_lookup.clear()
+            self._total_len = 0
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return up to k (doc_id, bm25_score) pairs, best first"""
+        terms = [token for token in tokenize(query) if token not in STOPWORDS]
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not terms or not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+
+            scores: Dict[str, float] = {}
+            for term in set(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def title_match(self, query: str) -> Optional[str]:
+        """Return the id of the longest catalog title the query is essentially made of, if any.
+
+        A title that is only part of a longer request ("a book about freedom and
+        social control", "published around 1984 about surveillance") does not
+        count: those queries need ranked search.
+        """
+        with self._lock:
+            return _title_match(query, self._title_lookup.get, self.MAX_TITLE_TOKENS, self.min_title_coverage)
+
+
+def _title_match(query: str, lookup, max_title_tokens: int, min_title_coverage: float):
+    """The longest query n-gram ``lookup`` resolves that covers enough of the query (see ``title_match``)"""
+    tokens = tokenize(query)
+    is_content = [token not in STOPWORDS and token not in LOOKUP_WORDS for token in tokens]
+    content_total = sum(is_content)
+    for size in range(min(len(tokens), max_title_tokens), 0, -1):
+        for start in range(len(tokens) - size + 1):
+            candidate = tokens[start:start + size]
+            # A lone stopword or very short word ("It", "Us") is not evidence of a title lookup
+            if size == 1 and (candidate[0] in STOPWORDS or (len(candidate[0]) < 3 and not candidate[0].isdigit())):
+                continue
+            found = lookup(" ".join(candidate))
+            if found is None:
+                continue
+            covered = sum(is_content[start:start + size])
+            if not content_total or covered >= min_title_coverage * content_total:
+                return found
+    return None
+
+
+def pack_bm25(titles: Sequence[str], summaries: Sequence[str], title_weight: int = 3) -> Dict[str, np.ndarray]:
+    """Arrays of a BM25 index over catalog rows, served read-only by ``MappedBM25Index``"""
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    doc_len = np.zeros(len(titles), dtype=np.uint32)
+    title_keys = []
+    for row, (title, summary) in enumerate(zip(titles, summaries)):
+        title_tokens = tokenize(title)
+        terms = document_terms(title_tokens, summary, title_weight)
+        for term, tf in terms.items():
+            postings.setdefault(term, []).append((row, tf))
+        doc_len[row] = sum(terms.values())
+        title_keys.append(" ".join(title_tokens))
+
+    vocabulary = list(postings)
+    tables = {"bm25.doc_len": doc_len}
+    tables["bm25.terms.offsets"], tables["bm25.terms.data"] = pack_strings(vocabulary)
+    tables["bm25.terms.hashes"], tables["bm25.terms.rows"] = pack_lookup(vocabulary)
+    tables["bm25.postings.offsets"], tables["bm25.postings.rows"] = pack_postings(
+        [[row for row, _ in postings[term]] for term in vocabulary])
+    tables["bm25.postings.tf"] = np.fromiter((tf for term in vocabulary for _, tf in postings[term]),
+                                             dtype=np.uint32, count=len(tables["bm25.postings.rows"]))
+    tables["bm25.titles.hashes"], tables["bm25.titles.rows"] = pack_lookup(title_keys)
+    return tables
+
+
+class MappedBM25Index:
+    """Read-only ``BM25Index`` over arrays written by ``pack_bm25``, typically memory-mapped from a snapshot.
+
+    Scores, and resolves titles, exactly like the index it was packed from;
+    ``ids`` and ``titles`` are the catalog columns the rows refer to.
+    """
+
+    MAX_TITLE_TOKENS = BM25Index.MAX_TITLE_TOKENS
+
+    def __init__(self, tables: Dict[str, np.ndarray], ids: Sequence[str], titles: Sequence[str],
+                 k1: float = 1.5, b: float = 0.75, title_weight: int = 3, min_title_coverage: float = 0.6):
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+        self.min_title_coverage = min_title_coverage
+        self.ids = ids
+        self._doc_len = tables["bm25.doc_len"]
+        self._total_len = int(self._doc_len.sum(dtype=np.uint64))
+        terms = StringTable(tables["bm25.terms.offsets"], tables["bm25.terms.data"])
+        self._terms = HashLookup(tables["bm25.terms.hashes"], tables["bm25.terms.rows"], terms.__getitem__)
+        self._offsets = tables["bm25.postings.offsets"]
+        self._rows = tables["bm25.postings.rows"]
+        self._tf = tables["bm25.postings.tf"]
+        self._titles = HashLookup(tables["bm25.titles.hashes"], tables["bm25.titles.rows"],
+                                  lambda row: " ".join(tokenize(titles[row])))
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return up to k (doc_id, bm25_score) pairs, best first"""
+        terms = [token for token in tokenize(query) if token not in STOPWORDS]
+        n_docs = len(self._doc_len)
+        if not terms or not n_docs:
+            return []
+        avg_len = self._total_len / n_docs
+
+        scores = None
+        for term in set(terms):
+            index = self._terms.get(term)
+            if index is None:
+                continue
+            rows = postings_slice(self._offsets, self._rows, index)
+            tf = postings_slice(self._offsets, self._tf, index).astype(np.float64)
+            idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._doc_len[rows] / avg_len)
+            if scores is None:
+                scores = np.zeros(n_docs, dtype=np.float64)
+            # Rows are unique within one term's postings, so the fancy-indexed add is exact
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm)
+        if scores is None:
+            return []
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(self.ids[row], float(scores[row])) for row in hits]
+
+    def title_match(self, query: str) -> Optional[str]:
+        """See ``BM25Index.title_match``"""
+        row = _title_match(query, self._titles.get, self.MAX_TITLE_TOKENS, self.min_title_coverage)
+        return None if row is None else self.ids[row]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked id lists; each list contributes 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,126 @@
+"""
+Read-only tables over flat arrays, so they can be served from a memory map.
+
+A snapshot stores the catalog and its text indexes as plain integer and byte
+arrays (see index_snapshot.py). Every worker that maps the file shares the
+same pages; these classes only hold views of them, and decode a string or a
+JSON record when it is accessed.
+"""
+
+import hashlib
+import json
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def key_hash(key: str) -> int:
+    """Stable 64-bit hash of a string (Python's ``hash`` differs between processes)"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def pack_strings(values: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(offsets, data) arrays holding the UTF-8 encoded strings back to back"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def pack_lookup(keys: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(hashes, rows) arrays for a ``HashLookup``; a repeated key resolves to its last row, as in a dict"""
+    last = {key: row for row, key in enumerate(keys)}
+    hashes = np.fromiter((key_hash(key) for key in last), dtype=np.uint64, count=len(last))
+    rows = np.fromiter(last.values(), dtype=np.uint32, count=len(last))
+    order = np.argsort(hashes, kind="stable")
+    return hashes[order], rows[order]
+
+
+def pack_postings(lists: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """(offsets, rows) arrays for a list of row lists, as read by ``postings_slice``"""
+    offsets = np.zeros(len(lists) + 1, dtype=np.uint64)
+    np.cumsum([len(rows) for rows in lists], out=offsets[1:])
+    rows = np.fromiter((row for found in lists for row in found), dtype=np.uint32, count=int(offsets[-1]))
+    return offsets, rows
+
+
+def postings_slice(offsets: np.ndarray, rows: np.ndarray, index: int) -> np.ndarray:
+    """Rows of entry ``index`` in a packed postings list (a view, nothing is copied)"""
+    return rows[int(offsets[index]):int(offsets[index + 1])]
+
+
+class StringTable(Sequence):
+    """Sequence of strings stored as (offsets, UTF-8 data) arrays"""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def raw(self, index: int) -> bytes:
+        return self.data[int(self.offsets[index]):int(self.offsets[index + 1])].tobytes()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.raw(index).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self.raw(index).decode("utf-8")
+
+
+class JsonTable(StringTable):
+    """Sequence of JSON values stored like a ``StringTable``; each access decodes a fresh copy"""
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return json.loads(super().__getitem__(index))
+
+    def __iter__(self) -> Iterator:
+        for index in range(len(self)):
+            yield json.loads(self.raw(index))
+
+
+class HashLookup:
+    """String key -> row through sorted 64-bit key hashes.
+
+    ``key_of(row)`` returns the key stored for a row and settles hash collisions,
+    so a lookup is one binary search plus one comparison.
+    """
+
+    def __init__(self, hashes: np.ndarray, rows: np.ndarray, key_of: Callable[[int], str]):
+        self.hashes = hashes
+        self.rows = rows
+        self.key_of = key_of
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, key: str, default: Optional[int] = None) -> Optional[int]:
+        if not len(self.hashes):
+            return default
+        hashed = np.uint64(key_hash(key))
+        start = int(np.searchsorted(self.hashes, hashed, side="left"))
+        while start < len(self.hashes) and self.hashes[start] == hashed:
+            row = int(self.rows[start])
+            if self.key_of(row) == key:
+                return row
+            start += 1
+        return default
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self, key: str) -> int:
+        row = self.get(key)
+        if row is None:
+            raise KeyError(key)
+        return row
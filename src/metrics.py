@@ -0,0 +1,237 @@
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Sequence
+
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with Prometheus semantics (``le`` upper bounds)"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts: List[int] = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def percentile(self, pct: float) -> float:
+        """Estimate a percentile as the upper bound of the bucket containing it"""
+        with self._lock:
+            if not self._count:
+                return 0.0
+            target = self._count * pct / 100
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+                running += count
+                if running >= target:
+                    return bound if bound != float("inf") else self.buckets[-1]
+            return self.buckets[-1]
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bound, count in zip(self.buckets, self._counts):
+                running += count
+                cumulative.append((bound, running))
+            return {"buckets": cumulative, "count": self._count, "sum": self._sum}
+
+    def summary(self) -> Dict:
+        snapshot = self.snapshot()
+        return {
+            "count": snapshot["count"],
+            "mean": snapshot["sum"] / snapshot["count"] if snapshot["count"] else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Family(ABC):
+    """A named metric with one child per combination of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _child(self, labels: Dict[str, str], factory):
+        key = self._key(labels)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, factory())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return [(dict(zip(self.labels, key)), child) for key, child in self._children.items()]
+
+    @abstractmethod
+    def samples(self) -> List[tuple]:
+        """(name, labels, value) for each exposed series"""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}"
+                     for name, labels, value in self.samples())
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, amount: float):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(_Family):
+    """Monotonic counter, optionally labelled"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        self._child(labels, _Value).add(amount)
+
+    def value(self, **labels) -> float:
+        child = self._children.get(self._key(labels))
+        return child.value if child else 0.0
+
+    def samples(self) -> List[tuple]:
+        return [(self.name, labels, child.value) for labels, child in self._items()]
+
+
+class Gauge(_Family):
+    """Value that can go up and down, optionally labelled"""
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        self._child(labels, _Value).add(amount)
+
+    def dec(self, amount: float = 1, **labels):
+        self._child(labels, _Value).add(-amount)
+
+    def set(self, value: float, **labels):
+        child = self._child(labels, _Value)
+        with child.lock:
+            child.value = value
+
+    def samples(self) -> List[tuple]:
+        return [(self.name, labels, child.value) for labels, child in self._items()]
+
+
+class HistogramFamily(_Family):
+    """Labelled set of :class:`Histogram` sharing the same buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        self.histogram(**labels).observe(value)
+
+    def histogram(self, **labels) -> Histogram:
+        return self._child(labels, lambda: Histogram(self.buckets))
+
+    def samples(self) -> List[tuple]:
+        samples = []
+        for labels, histogram in self._items():
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot["buckets"]:
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(float(bound))), count))
+            samples.append((f"{self.name}_bucket", dict(labels, le="+Inf"), snapshot["count"]))
+            samples.append((f"{self.name}_sum", labels, snapshot["sum"]))
+            samples.append((f"{self.name}_count", labels, snapshot["count"]))
+        return samples
+
+
+class CallbackMetric(_Family):
+    """Metric whose samples are read at scrape time from ``collect() -> {label values tuple: value}``"""
+
+    def __init__(self, name: str, help_text: str, collect: Callable[[], Dict[tuple, float]],
+                 labels: Sequence[str] = (), kind: str = "gauge"):
+        super().__init__(name, help_text, labels)
+        self.collect = collect
+        self.kind = kind
+
+    def samples(self) -> List[tuple]:
+        try:
+            values = self.collect()
+        except Exception:
+            return []
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in values.items()]
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Family] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Family) -> _Family:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS_MS) -> HistogramFamily:
+        return self.register(HistogramFamily(name, help_text, labels, buckets))
+
+    def callback(self, name: str, help_text: str, collect: Callable[[], Dict[tuple, float]],
+                 labels: Sequence[str] = (), kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, help_text, collect, labels, kind))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,366 @@
+"""
+Per-call model and token-limit selection for chat completions.
+
+Every completion has a role: ``tool_selection`` (the first hop, which decides
+whether to fetch a summary and answers directly when it does not),
+``final_answer`` (the prose written from the tool results) and
+``direct_answer`` (title questions answered in one call). The role and the
+query's complexity pick a model tier and ``max_tokens``: the small model
+selects tools and answers simple title questions, the large one writes the
+recommendations and handles complex requests.
+
+Each (role, model) keeps a window of recent latencies. When its p95 exceeds
+the role's budget, the role falls back to the other tier for a cooldown and
+then tries its preferred model again with a fresh window. A call that fails
+on its model (unavailable, rate limited, server errors after the gateway's
+retries) is repeated once on the fallback. Decisions and outcomes are
+counted in /metrics, summarized by ``GET /models/stats`` and, with
+MODEL_ROUTING_LOG, appended to a JSON-lines file for tuning.
+"""
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Optional, Tuple
+
+import openai
+
+from instrumentation import record_usage, MODEL_CALLS, MODEL_LATENCY
+from lexical_index import normalize_text
+
+ROLE_TOOL_SELECTION = "tool_selection"
+ROLE_FINAL_ANSWER = "final_answer"
+ROLE_DIRECT_ANSWER = "direct_answer"
+ROLES = (ROLE_TOOL_SELECTION, ROLE_FINAL_ANSWER, ROLE_DIRECT_ANSWER)
+
+COMPLEXITY_SIMPLE = "simple"
+COMPLEXITY_COMPLEX = "complex"
+
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+# (tier, max_tokens) per role and complexity. A simple request's first hop
+# only has to pick a title; a complex one may be answered without a tool
+# call, so it gets the large model and room for the full answer.
+ROLE_POLICIES: Dict[str, Dict[str, Tuple[str, int]]] = {
+    ROLE_TOOL_SELECTION: {COMPLEXITY_SIMPLE: (TIER_SMALL, 600), COMPLEXITY_COMPLEX: (TIER_LARGE, 1200)},
+    ROLE_FINAL_ANSWER: {COMPLEXITY_SIMPLE: (TIER_LARGE, 800), COMPLEXITY_COMPLEX: (TIER_LARGE, 1500)},
+    ROLE_DIRECT_ANSWER: {COMPLEXITY_SIMPLE: (TIER_SMALL, 500), COMPLEXITY_COMPLEX: (TIER_LARGE, 900)},
+}
+DEFAULT_LATENCY_BUDGETS_MS = {ROLE_TOOL_SELECTION: 2500.0, ROLE_FINAL_ANSWER: 8000.0, ROLE_DIRECT_ANSWER: 4000.0}
+# Without routing every call uses the original model and limit
+UNROUTED_MODEL = "gpt-4"
+UNROUTED_MAX_TOKENS = 1500
+
+# Clause separators and conjunctions (ro/en) on normalized text; each one adds a constraint
+CLAUSE_PATTERN = re.compile(r"[,;]|\b(?:si|dar|sau|iar|insa|fara|nici|and|but|or|without|nor)\b")
+
+# Errors after which the same request is worth one attempt on the other model
+FALLBACK_ERRORS = (openai.NotFoundError, openai.PermissionDeniedError, openai.RateLimitError,
+                   openai.InternalServerError, openai.APIConnectionError)
+
+# True while running batch work (see src/batch.py): its calls are counted and logged but kept out of
+# the latency windows, so a bulk run queueing behind its own concurrency cannot trip fallbacks
+BATCH_CALLS: ContextVar[bool] = ContextVar("model_router_batch_calls", default=False)
+
+
+@dataclass(frozen=True)
+class ModelChoice:
+    role: str
+    complexity: str
+    model: str
+    max_tokens: int
+    reason: str
+    fallback: Optional[str] = None
+
+
+class JsonLinesWriter:
+    """Appends JSON lines to one open file from a background thread, so callers never wait on the disk"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="model-routing-log", daemon=True)
+        self._thread.start()
+
+    def write(self, entry: Dict):
+        self._queue.put(entry)
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            self._file.write(json.dumps(entry) + "\n")
+            # Flush once the backlog is written rather than per line
+            if self._queue.empty():
+                self._file.flush()
+        self._file.close()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+class ModelRouter:
+    """Chooses the model and token limit of each chat completion and tracks how the choices perform.
+
+    ``models`` maps the tiers (small, large) to model names. With
+    ``enabled=False`` every call goes to ``unrouted_model`` (the original
+    gpt-4) with the original 1500-token limit and no fallback, which is
+    useful as a baseline.
+
+    Streamed calls are timed by how long the API kept the caller waiting:
+    time spent by the consumer between chunks is not counted.
+    """
+
+    def __init__(self, models: Dict[str, str], enabled: bool = True,
+                 latency_budgets_ms: Optional[Dict[str, float]] = None, complex_query_words: int = 25,
+                 window: int = 50, min_samples: int = 10, cooldown_seconds: float = 60.0,
+                 log_path: Optional[str] = None, unrouted_model: str = UNROUTED_MODEL):
+        self.models = models
+        self.enabled = enabled
+        self.unrouted_model = unrouted_model
+        self.latency_budgets_ms = dict(DEFAULT_LATENCY_BUDGETS_MS, **(latency_budgets_ms or {}))
+        self.complex_query_words = complex_query_words
+        self.window = window
+        self.min_samples = min_samples
+        self.cooldown_seconds = cooldown_seconds
+        self.log_path = log_path
+        self._log = JsonLinesWriter(log_path) if log_path else None
+        self._latencies: Dict[Tuple[str, str], deque] = {}
+        # (role, model) -> monotonic time until which the role uses its fallback
+        self._degraded: Dict[Tuple[str, str], float] = {}
+        self._decisions = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        return cls(
+            {TIER_SMALL: os.getenv("MODEL_SMALL", "gpt-4o-mini"), TIER_LARGE: os.getenv("MODEL_LARGE", "gpt-4o")},
+            enabled=os.getenv("MODEL_ROUTING", "1") != "0",
+            latency_budgets_ms={role: float(os.getenv(f"MODEL_BUDGET_{role.upper()}_MS",
+                                                      DEFAULT_LATENCY_BUDGETS_MS[role])) for role in ROLES},
+            complex_query_words=int(os.getenv("MODEL_COMPLEX_QUERY_WORDS", "25")),
+            window=int(os.getenv("MODEL_LATENCY_WINDOW", "50")),
+            cooldown_seconds=float(os.getenv("MODEL_FALLBACK_COOLDOWN_SECONDS", "60")),
+            log_path=os.getenv("MODEL_ROUTING_LOG") or None,
+            unrouted_model=os.getenv("MODEL_UNROUTED", UNROUTED_MODEL),
+        )
+
+    def complexity(self, user_input: str, history: Optional[list] = None) -> str:
+        """Follow-ups, long requests and requests with several constraints are complex"""
+        text = normalize_text(user_input)
+        if history or len(text.split()) > self.complex_query_words or len(CLAUSE_PATTERN.findall(text)) >= 2:
+            return COMPLEXITY_COMPLEX
+        return COMPLEXITY_SIMPLE
+
+    def choose(self, role: str, complexity: str = COMPLEXITY_SIMPLE) -> ModelChoice:
+        """Model and token limit for one call, falling back while the preferred model is over budget"""
+        if not self.enabled:
+            return ModelChoice(role, complexity, self.unrouted_model, UNROUTED_MAX_TOKENS, "unrouted")
+
+        tier, max_tokens = ROLE_POLICIES[role][complexity]
+        model = self.models[tier]
+        fallback = self.models[TIER_LARGE if tier == TIER_SMALL else TIER_SMALL]
+        fallback = fallback if fallback != model else None
+        with self._lock:
+            until = self._degraded.get((role, model))
+            if until is not None and time.monotonic() >= until:
+                # Cooldown over: try the preferred model again, judged on new samples only
+                del self._degraded[(role, model)]
+                self._latencies.pop((role, model), None)
+                until = None
+        if until is not None and fallback:
+            return ModelChoice(role, complexity, fallback, max_tokens, "latency_fallback")
+        return ModelChoice(role, complexity, model, max_tokens, "policy", fallback)
+
+    def _fallback_choice(self, choice: ModelChoice, error: Exception) -> ModelChoice:
+        return replace(choice, model=choice.fallback, reason=f"error_fallback:{type(error).__name__}",
+                       fallback=None)
+
+    def record(self, choice: ModelChoice, latency_ms: float, outcome: str, usage=None,
+               finish_reason: Optional[str] = None, ttft_ms: Optional[float] = None):
+        """Count one call, update its latency window and log it; ``ttft_ms`` is the first chunk's delay"""
+        MODEL_CALLS.inc(role=choice.role, model=choice.model, reason=choice.reason.split(":")[0], outcome=outcome)
+        record_usage(usage, choice.model)
+        if outcome in ("ok", "truncated"):
+            MODEL_LATENCY.observe(latency_ms, role=choice.role, model=choice.model)
+            if not BATCH_CALLS.get():
+                self._observe_latency(choice, latency_ms)
+        with self._lock:
+            self._decisions[(choice.role, choice.model, choice.reason, outcome)] += 1
+
+        if self._log is not None:
+            self._log.write({
+                "ts": round(time.time(), 3), "role": choice.role, "complexity": choice.complexity,
+                "model": choice.model, "max_tokens": choice.max_tokens, "reason": choice.reason,
+                "outcome": outcome, "finish_reason": finish_reason, "latency_ms": round(latency_ms, 1),
+                "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                "batch": BATCH_CALLS.get(),
+                "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                "completion_tokens": getattr(usage, "completion_tokens", None),
+            })
+
+    def close(self):
+        """Write out the queued routing log entries and close the log"""
+        if self._log is not None:
+            self._log.close()
+
+    def _observe_latency(self, choice: ModelChoice, latency_ms: float):
+        key = (choice.role, choice.model)
+        budget = self.latency_budgets_ms[choice.role]
+        with self._lock:
+            samples = self._latencies.setdefault(key, deque(maxlen=self.window))
+            samples.append(latency_ms)
+            # Only a preferred model with somewhere to fall back to is taken out of rotation
+            if choice.fallback is None or key in self._degraded or len(samples) < self.min_samples:
+                return
+            p95 = _percentile(samples, 95)
+            if p95 <= budget:
+                return
+            self._degraded[key] = time.monotonic() + self.cooldown_seconds
+        print(f"Model {choice.model} is over the {choice.role} latency budget (p95 {p95:.0f} ms > "
+              f"{budget:.0f} ms); using {choice.fallback} for {self.cooldown_seconds:.0f}s")
+
+    @staticmethod
+    def _outcome(finish_reason: Optional[str]) -> str:
+        return "truncated" if finish_reason == "length" else "ok"
+
+    def complete(self, role: str, complexity: str, create: Callable[[ModelChoice], object]):
+        """Run ``create(choice)`` for a non-streamed completion, once more on the fallback if it fails"""
+        choice = self.choose(role, complexity)
+        try:
+            return self._timed(choice, create)
+        except FALLBACK_ERRORS as e:
+            if not choice.fallback:
+                raise
+            return self._timed(self._fallback_choice(choice, e), create)
+
+    def _timed(self, choice: ModelChoice, create: Callable[[ModelChoice], object]):
+        started = time.perf_counter()
+        try:
+            response = create(choice)
+        except Exception:
+            self.record(choice, (time.perf_counter() - started) * 1000, "error")
+            raise
+        finish_reason = response.choices[0].finish_reason if response.choices else None
+        self.record(choice, (time.perf_counter() - started) * 1000, self._outcome(finish_reason),
+                    response.usage, finish_reason)
+        return response
+
+    async def acomplete(self, role: str, complexity: str, create: Callable[[ModelChoice], object]):
+        """Async ``complete``: ``create(choice)`` returns an awaitable"""
+        choice = self.choose(role, complexity)
+        try:
+            return await self._atimed(choice, create)
+        except FALLBACK_ERRORS as e:
+            if not choice.fallback:
+                raise
+            return await self._atimed(self._fallback_choice(choice, e), create)
+
+    async def _atimed(self, choice: ModelChoice, create: Callable[[ModelChoice], object]):
+        started = time.perf_counter()
+        try:
+            response = await create(choice)
+        except Exception:
+            self.record(choice, (time.perf_counter() - started) * 1000, "error")
+            raise
+        finish_reason = response.choices[0].finish_reason if response.choices else None
+        self.record(choice, (time.perf_counter() - started) * 1000, self._outcome(finish_reason),
+                    response.usage, finish_reason)
+        return response
+
+    async def astream(self, role: str, complexity: str, open_stream: Callable[[ModelChoice], object]):
+        """Yield the chunks of ``open_stream(choice)``; falls back only if nothing was streamed yet"""
+        choice = self.choose(role, complexity)
+        streamed = [False]
+        attempt = self._astream_timed(choice, open_stream, streamed)
+        try:
+            async for chunk in attempt:
+                yield chunk
+        except FALLBACK_ERRORS as e:
+            if streamed[0] or not choice.fallback:
+                raise
+            attempt = self._astream_timed(self._fallback_choice(choice, e), open_stream, streamed)
+            async for chunk in attempt:
+                yield chunk
+        finally:
+            # Closed here rather than when collected, so an abandoned stream is recorded right away
+            await attempt.aclose()
+
+    async def _astream_timed(self, choice: ModelChoice, open_stream: Callable[[ModelChoice], object],
+                             streamed: list):
+        started = time.perf_counter()
+        # Time spent waiting on the API; the consumer's time at ``yield`` is left out
+        waiting = 0.0
+        ttft_ms = None
+        usage = finish_reason = None
+        stream = open_stream(choice).__aiter__()
+        try:
+            while True:
+                waited_from = time.perf_counter()
+                try:
+                    chunk = await stream.__anext__()
+                except StopAsyncIteration:
+                    waiting += time.perf_counter() - waited_from
+                    break
+                waiting += time.perf_counter() - waited_from
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                # With include_usage the last chunk carries token usage and no choices
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finish_reason = chunk.choices[0].finish_reason
+                streamed[0] = True
+                yield chunk
+        except GeneratorExit:
+            # The client went away; the partial duration says nothing about the model
+            self.record(choice, waiting * 1000, "cancelled", usage, finish_reason, ttft_ms)
+            await _aclose(stream)
+            raise
+        except Exception:
+            self.record(choice, waiting * 1000, "error", ttft_ms=ttft_ms)
+            await _aclose(stream)
+            raise
+        self.record(choice, waiting * 1000, self._outcome(finish_reason), usage, finish_reason, ttft_ms)
+
+    def stats(self) -> Dict:
+        """Current model per role, recent latency percentiles and decision counts"""
+        now = time.monotonic()
+        with self._lock:
+            latencies = {f"{role}/{model}": {"count": len(samples), "p50_ms": _percentile(samples, 50),
+                                             "p95_ms": _percentile(samples, 95)}
+                         for (role, model), samples in self._latencies.items() if samples}
+            degraded = {f"{role}/{model}": round(until - now, 1)
+                        for (role, model), until in self._degraded.items() if until > now}
+            decisions = [{"role": role, "model": model, "reason": reason, "outcome": outcome, "count": count}
+                         for (role, model, reason, outcome), count in sorted(self._decisions.items())]
+        return {
+            "enabled": self.enabled,
+            "models": dict(self.models),
+            "latency_budgets_ms": dict(self.latency_budgets_ms),
+            "latency": latencies,
+            "fallback_seconds_left": degraded,
+            "decisions": decisions,
+        }
+
+
+async def _aclose(stream):
+    close = getattr(stream, "aclose", None)
+    if close is not None:
+        await close()
+
+
+def _percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
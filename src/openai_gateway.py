@@ -0,0 +1,384 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+import httpx
+import openai
+
+from instrumentation import OPENAI_ATTEMPTS, OPENAI_IN_FLIGHT, OPENAI_QUEUE_TIME, REGISTRY
+
+ENDPOINT_CHAT = "chat"
+ENDPOINT_EMBEDDINGS = "embeddings"
+
+# Connection failures and server-side errors count towards opening the circuit; 429s only back off
+OUTAGE_ERRORS = (openai.InternalServerError, openai.APIConnectionError)
+RETRYABLE_ERRORS = (openai.RateLimitError,) + OUTAGE_ERRORS
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling OpenAI while an endpoint's circuit breaker is open"""
+
+
+class ConcurrencyLimiter:
+    """Counting semaphore shared by threads and event loops, granted in FIFO order"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()
+
+    def _try_acquire(self, waiter) -> bool:
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def acquire(self):
+        event = threading.Event()
+        if not self._try_acquire(event):
+            event.wait()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if self._try_acquire((loop, future)):
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = (loop, future) not in self._waiters
+                if not granted:
+                    self._waiters.remove((loop, future))
+            if granted:
+                # The slot was handed over just as we were cancelled: pass it on
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                # The slot moves straight to the next waiter, so ``active`` is unchanged
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(_grant, future)
+                    return
+            self.active -= 1
+
+
+def _grant(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class TokenBucket:
+    """Requests-per-minute limiter; ``reserve`` returns how long the caller must wait"""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Going negative queues the caller behind earlier reservations
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class CircuitBreaker:
+    """Opens when at least ``failure_ratio`` of the last ``window`` calls failed.
+
+    While open, calls are rejected until ``cooldown_seconds`` have passed; then
+    one trial call is let through, and its outcome closes or re-opens the circuit.
+    Judging a window rather than consecutive failures keeps a burst of concurrent
+    errors from tripping it while most calls still succeed.
+    """
+
+    def __init__(self, failure_ratio: float = 0.5, window: int = 100, cooldown_seconds: float = 30.0):
+        self.failure_ratio = failure_ratio
+        self.cooldown_seconds = cooldown_seconds
+        self.outcomes = deque(maxlen=window)
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.cooldown_seconds - time.monotonic()
+            if remaining > 0 or self._trial_running:
+                raise CircuitOpenError(f"OpenAI circuit open, retry in {max(remaining, 0):.0f}s")
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.outcomes.append(True)
+            if self._trial_running:
+                print("OpenAI circuit closed")
+                self.opened_at = None
+                self._trial_running = False
+                self.outcomes.clear()
+
+    def record_failure(self):
+        with self._lock:
+            self.outcomes.append(False)
+            failures = self.outcomes.count(False)
+            if self._trial_running or (len(self.outcomes) == self.outcomes.maxlen
+                                       and failures >= self.failure_ratio * len(self.outcomes)):
+                if self.opened_at is None:
+                    print(f"OpenAI circuit opened: {failures} of the last {len(self.outcomes)} calls failed")
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def abandon_trial(self):
+        """End a trial that got no answer from the API (cancelled, or failed before or after the request).
+
+        It counts as a failed trial, so the circuit stays open for another cooldown; the next caller
+        after that is let through as a new trial.
+        """
+        with self._lock:
+            if self._trial_running:
+                self._trial_running = False
+                self.opened_at = time.monotonic()
+
+
+class OpenAIGateway:
+    """The process-wide OpenAI client pair with admission control.
+
+    Every call waits for a slot under ``max_concurrency`` and for its endpoint's
+    token bucket (time spent there is reported as queueing time), then retries
+    429/5xx/connection errors with jittered exponential backoff, honouring
+    Retry-After. A high share of server-side failures opens a per-endpoint
+    circuit breaker so requests fail fast instead of piling up behind a broken API.
+    """
+
+    def __init__(self, api_key: str, max_concurrency: int = 64, requests_per_minute: Optional[Dict] = None,
+                 max_retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 20.0,
+                 max_connections: int = 128, max_keepalive_connections: int = 64,
+                 keepalive_expiry: float = 60.0, timeout: float = 60.0,
+                 breaker_failure_ratio: float = 0.5, breaker_window: int = 100, breaker_cooldown: float = 30.0):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_keepalive_connections,
+                                    keepalive_expiry=keepalive_expiry)
+
+        self.limiter = ConcurrencyLimiter(max_concurrency)
+        self.buckets = {endpoint: TokenBucket(rpm) for endpoint, rpm in (requests_per_minute or {}).items() if rpm}
+        self.breakers = {endpoint: CircuitBreaker(breaker_failure_ratio, breaker_window, breaker_cooldown)
+                         for endpoint in (ENDPOINT_CHAT, ENDPOINT_EMBEDDINGS)}
+
+        # The SDK's own retries are disabled so every attempt goes through the limits above
+        self.client = openai.Client(api_key=api_key, max_retries=0, timeout=timeout,
+                                    http_client=httpx.Client(limits=self._limits, timeout=timeout))
+        self._async_client: Optional[openai.AsyncOpenAI] = None
+
+    @classmethod
+    def from_env(cls, api_key: str) -> "OpenAIGateway":
+        return cls(
+            api_key,
+            max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "64")),
+            requests_per_minute={
+                ENDPOINT_CHAT: float(os.getenv("OPENAI_CHAT_RPM", "0")),
+                ENDPOINT_EMBEDDINGS: float(os.getenv("OPENAI_EMBEDDINGS_RPM", "0")),
+            },
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "4")),
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "128")),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "64")),
+            timeout=float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60")),
+            breaker_failure_ratio=float(os.getenv("OPENAI_BREAKER_FAILURE_RATIO", "0.5")),
+            breaker_window=int(os.getenv("OPENAI_BREAKER_WINDOW", "100")),
+            breaker_cooldown=float(os.getenv("OPENAI_BREAKER_COOLDOWN_SECONDS", "30")),
+        )
+
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        # Created on first use, inside the event loop that will drive it
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self.api_key, max_retries=0, timeout=self.timeout,
+                http_client=httpx.AsyncClient(limits=self._limits, timeout=self.timeout)
+            )
+        return self._async_client
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter keeps retrying clients from synchronizing into new bursts
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _should_retry(self, endpoint: str, attempt: int, error: Exception) -> bool:
+        breaker = self.breakers[endpoint]
+        if isinstance(error, OUTAGE_ERRORS):
+            breaker.record_failure()
+        else:
+            # The API answered, even if it throttled or rejected the request
+            breaker.record_success()
+        retry = isinstance(error, RETRYABLE_ERRORS) and attempt < self.max_retries and not breaker.is_open
+        OPENAI_ATTEMPTS.inc(endpoint=endpoint, outcome="retry" if retry else "error")
+        return retry
+
+    def _succeeded(self, endpoint: str):
+        self.breakers[endpoint].record_success()
+        OPENAI_ATTEMPTS.inc(endpoint=endpoint, outcome="ok")
+
+    @contextmanager
+    def _slot(self, endpoint: str):
+        started = time.perf_counter()
+        breaker = self.breakers[endpoint]
+        breaker.before_call()
+        try:
+            bucket = self.buckets.get(endpoint)
+            if bucket is not None:
+                time.sleep(bucket.reserve())
+            self.limiter.acquire()
+            OPENAI_QUEUE_TIME.observe((time.perf_counter() - started) * 1000, endpoint=endpoint)
+            OPENAI_IN_FLIGHT.inc(endpoint=endpoint)
+            try:
+                yield
+            finally:
+                OPENAI_IN_FLIGHT.dec(endpoint=endpoint)
+                self.limiter.release()
+        except openai.APIError:
+            # Judged by _should_retry
+            raise
+        except BaseException:
+            breaker.abandon_trial()
+            raise
+
+    @asynccontextmanager
+    async def _async_slot(self, endpoint: str):
+        started = time.perf_counter()
+        breaker = self.breakers[endpoint]
+        breaker.before_call()
+        try:
+            bucket = self.buckets.get(endpoint)
+            if bucket is not None:
+                await asyncio.sleep(bucket.reserve())
+            await self.limiter.acquire_async()
+            OPENAI_QUEUE_TIME.observe((time.perf_counter() - started) * 1000, endpoint=endpoint)
+            OPENAI_IN_FLIGHT.inc(endpoint=endpoint)
+            try:
+                yield
+            finally:
+                OPENAI_IN_FLIGHT.dec(endpoint=endpoint)
+                self.limiter.release()
+        except openai.APIError:
+            raise
+        except BaseException:
+            # Cancelled (client went away, batch stopped) or failed outside the API
+            breaker.abandon_trial()
+            raise
+
+    def _call(self, endpoint: str, create, **params):
+        attempt = 0
+        while True:
+            try:
+                with self._slot(endpoint):
+                    result = create(**params)
+                self._succeeded(endpoint)
+                return result
+            except openai.APIError as e:
+                if not self._should_retry(endpoint, attempt, e):
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    async def _acall(self, endpoint: str, create, **params):
+        attempt = 0
+        while True:
+            try:
+                async with self._async_slot(endpoint):
+                    result = await create(**params)
+                self._succeeded(endpoint)
+                return result
+            except openai.APIError as e:
+                if not self._should_retry(endpoint, attempt, e):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def chat_completion(self, **params):
+        return self._call(ENDPOINT_CHAT, self.client.chat.completions.create, **params)
+
+    def embeddings(self, **params):
+        return self._call(ENDPOINT_EMBEDDINGS, self.client.embeddings.create, **params)
+
+    async def achat_completion(self, **params):
+        return await self._acall(ENDPOINT_CHAT, self.async_client.chat.completions.create, **params)
+
+    async def aembeddings(self, **params):
+        return await self._acall(ENDPOINT_EMBEDDINGS, self.async_client.embeddings.create, **params)
+
+    async def astream_chat_completion(self, **params):
+        """Yield chunks of a streamed completion, holding a concurrency slot until the stream ends.
+
+        Only opening the stream is retried; an error after the first chunk is raised to the caller.
+        """
+        attempt = 0
+        while True:
+            streaming = False
+            try:
+                async with self._async_slot(ENDPOINT_CHAT):
+                    stream = await self.async_client.chat.completions.create(stream=True, **params)
+                    self._succeeded(ENDPOINT_CHAT)
+                    streaming = True
+                    async for chunk in stream:
+                        yield chunk
+                return
+            except openai.APIError as e:
+                if streaming or not self._should_retry(ENDPOINT_CHAT, attempt, e):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+
+_gateways: Dict[str, OpenAIGateway] = {}
+_gateways_lock = threading.Lock()
+
+REGISTRY.callback(
+    "librarian_openai_circuit_open", "1 while an endpoint's circuit breaker is open",
+    lambda: {(endpoint,): int(any(gateway.breakers[endpoint].is_open for gateway in list(_gateways.values())))
+             for endpoint in (ENDPOINT_CHAT, ENDPOINT_EMBEDDINGS)},
+    ("endpoint",)
+)
+
+
+def get_gateway(api_key: str) -> OpenAIGateway:
+    """Return the process-wide gateway for an API key, configured from the environment on first use"""
+    with _gateways_lock:
+        gateway = _gateways.get(api_key)
+        if gateway is None:
+            gateway = _gateways[api_key] = OpenAIGateway.from_env(api_key)
+        return gateway
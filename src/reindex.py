@@ -0,0 +1,268 @@
+"""
+Blue/green rebuilds of the book index while the current one keeps serving.
+
+A rebuild syncs a catalog file into a new generation of the collection
+(``books_<timestamp>``) on a background thread. Unchanged summaries are
+answered by the shared embedding cache, so only new or edited books are
+embedded. The finished store is warmed and then swapped in, which also
+invalidates the answer cache and refreshes the router and ``/books``. The
+new generation is recorded as the one to open on restart. The generation
+it replaced is kept until the next rebuild, then dropped.
+
+    python src/reindex.py start --catalog data/book_summaries.txt --wait
+    python src/reindex.py status
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+
+class ReindexInProgress(RuntimeError):
+    """A rebuild is already running; only one runs at a time"""
+
+
+class ReindexJob:
+    """Phase, progress and outcome of one rebuild, reported by ``GET /admin/reindex``"""
+
+    def __init__(self, catalog: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.catalog = catalog
+        self.status = STATUS_RUNNING
+        self.phase: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self.progress: Dict = {}
+        self.collection: Optional[str] = None
+        self.stats: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, phase: str):
+        with self._lock:
+            self.phase = phase
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[phase] = (time.perf_counter() - started) * 1000
+
+    def update(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+
+    def finish(self, stats: Dict):
+        with self._lock:
+            self.status = STATUS_SUCCEEDED
+            self.phase = None
+            self.stats = stats
+            self.finished_at = time.time()
+
+    def fail(self, error: Exception):
+        with self._lock:
+            self.status = STATUS_FAILED
+            self.error = str(error)
+            self.finished_at = time.time()
+
+    @property
+    def is_running(self) -> bool:
+        return self.status == STATUS_RUNNING
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "catalog": self.catalog,
+                "collection": self.collection,
+                "phase": self.phase,
+                "phases_ms": dict(self.phases),
+                "progress": dict(self.progress),
+                "stats": self.stats,
+                "error": self.error,
+                "elapsed_ms": ((self.finished_at or time.time()) - self.started_at) * 1000,
+            }
+
+
+class Reindexer:
+    """Runs rebuilds for a SmartLibrarian, one at a time.
+
+    ``swap`` replaces the serving store (defaults to the librarian's
+    ``swap_vector_store``; pass the async librarian's to swap both request
+    paths). ``prepare`` is called with the new store just before the swap,
+    to build caches keyed by its catalog version. The build is throttled
+    so serving latency holds: ``max_workers`` embedding requests at a time,
+    and after each batch it sleeps so that it works at most ``duty_cycle``
+    of the wall time (0.5 doubles the build time, 1 disables the throttle).
+    """
+
+    def __init__(self, librarian, swap: Optional[Callable] = None, prepare: Optional[Callable] = None,
+                 max_workers: Optional[int] = None, batch_size: Optional[int] = None,
+                 duty_cycle: Optional[float] = None):
+        self.librarian = librarian
+        self.swap = swap or librarian.swap_vector_store
+        self.prepare = prepare
+        self.max_workers = max_workers or int(os.getenv("REINDEX_MAX_WORKERS", "2"))
+        self.batch_size = batch_size or int(os.getenv("REINDEX_BATCH_SIZE", "256"))
+        if duty_cycle is None:
+            duty_cycle = float(os.getenv("REINDEX_DUTY_CYCLE", "0.5"))
+        self.duty_cycle = min(1.0, max(0.05, duty_cycle))
+        self.job: Optional[ReindexJob] = None
+        self._lock = threading.Lock()
+
+    def start(self, catalog: Optional[str] = None) -> ReindexJob:
+        """Start a rebuild from ``catalog`` (default: the librarian's catalog file) in the background"""
+        if self.librarian.shared_index_dir:
+            raise RuntimeError("Workers attached to a shared index are updated by its writer")
+        catalog = catalog or self.librarian.books_file_path
+        if not os.path.isfile(catalog):
+            raise FileNotFoundError(f"Catalog file not found: {catalog}")
+
+        with self._lock:
+            if self.job is not None and self.job.is_running:
+                raise ReindexInProgress(f"Rebuild {self.job.id} is still running")
+            job = self.job = ReindexJob(catalog)
+        threading.Thread(target=self.run, args=(job,), name=f"reindex-{job.id}", daemon=True).start()
+        return job
+
+    def run(self, job: ReindexJob):
+        """Build, warm and swap in a new generation; the serving store is untouched on failure"""
+        from index_backends import NumpyIndex, drop_index
+        from vector_store import BookVectorStore
+
+        current = self.librarian.vector_store
+        store = BookVectorStore(self.librarian.openai_api_key, persist_directory=current.persist_directory,
+                                embedding_cache=current.embedding_cache, index_backend=current.index_backend)
+        swapped = False
+        started = time.perf_counter()
+        try:
+            with job.track("open_index"):
+                store.create_collection(generation=time.strftime("%Y%m%dT%H%M%S"))
+                job.collection = store.collection_name
+
+            busy_since = time.perf_counter()
+
+            def progress(counters: Dict[str, int]):
+                nonlocal busy_since
+                job.update(**counters)
+                if self.duty_cycle < 1.0:
+                    # Parsing, indexing and writes share the GIL and CPUs with request handling
+                    busy = time.perf_counter() - busy_since
+                    time.sleep(busy * (1 - self.duty_cycle) / self.duty_cycle)
+                busy_since = time.perf_counter()
+
+            with job.track("catalog_sync"):
+                job.update(catalog_books=self.librarian.count_catalog_books(job.catalog), processed=0)
+                stats = store.sync_database(job.catalog, max_workers=self.max_workers, batch_size=self.batch_size,
+                                            progress=progress)
+
+            with job.track("warm_up"):
+                # Build what the first queries would otherwise build while serving
+                if isinstance(store.collection, NumpyIndex):
+                    store.collection.quantized()
+                store.catalog_version = max(store.catalog_version, current.catalog_version + 1)
+                if self.prepare:
+                    self.prepare(store)
+
+            with job.track("swap"):
+                self.swap(store)
+                swapped = True
+                retired = store.activate_generation()
+                if retired:
+                    store.drop_collection(retired)
+
+            job.finish(stats)
+            print(f"Rebuild {job.id}: now serving '{store.collection_name}' "
+                  f"({store.collection.count()} books) after {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            job.fail(e)
+            print(f"Rebuild {job.id} failed during '{job.phase}': {e}")
+            if store.collection is not None and not swapped:
+                try:
+                    drop_index(store.index_backend, store.persist_directory, store.collection_name)
+                except Exception as drop_error:
+                    print(f"Could not drop the unfinished collection '{store.collection_name}': {drop_error}")
+
+
+def _call(url: str, token: Optional[str], method: str = "GET", body: Optional[Dict] = None) -> Dict:
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        sys.exit(f"{method} {url} failed with {e.code}: {e.read().decode('utf-8', 'replace')}")
+    except urllib.error.URLError as e:
+        sys.exit(f"Cannot reach {url}: {e.reason}")
+
+
+def _describe(job: Dict) -> str:
+    if job["status"] == STATUS_RUNNING:
+        progress = job.get("progress") or {}
+        if "catalog_books" in progress:
+            return f"{job['phase']}: {progress.get('processed', 0)}/{progress['catalog_books']} books"
+        return job["phase"] or "starting"
+    line = f"{job['status']} in {job['elapsed_ms'] / 1000:.1f}s"
+    if job["error"]:
+        return f"{line}: {job['error']}"
+    stats = job["stats"] or {}
+    return (f"{line}: serving '{job['collection']}' ({stats.get('added', 0)} books, "
+            f"phases {json.dumps({phase: round(ms) for phase, ms in job['phases_ms'].items()})} ms)")
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.getenv("LIBRARIAN_URL", "http://localhost:8000"))
+    parser.add_argument("--token", default=os.getenv("ADMIN_TOKEN"), help="Defaults to ADMIN_TOKEN")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    start = commands.add_parser("start", help="Rebuild the index in the running server")
+    start.add_argument("--catalog", help="Catalog file on the server (default: the one it was started with)")
+    start.add_argument("--wait", action="store_true", help="Follow progress until the swap")
+    commands.add_parser("status", help="Show the current or last rebuild")
+    args = parser.parse_args()
+
+    endpoint = args.url.rstrip("/") + "/admin/reindex"
+    if args.command == "status":
+        print(json.dumps(_call(endpoint, args.token), indent=2))
+        return
+
+    job = _call(endpoint, args.token, "POST", {"catalog": args.catalog})
+    print(f"Started rebuild {job['id']} from {job['catalog']}")
+    if not args.wait:
+        return
+    last = None
+    while job["status"] == STATUS_RUNNING:
+        time.sleep(1)
+        job = _call(endpoint, args.token)
+        line = _describe(job)
+        if line != last:
+            print(line)
+            last = line
+    if job["status"] != STATUS_SUCCEEDED:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class SemanticResponseCache:
+    """Answer cache keyed by query embeddings instead of exact query text.
+
+    A lookup returns the stored answer of the most similar previously answered
+    query when their cosine similarity reaches ``threshold``. Embeddings live in
+    one preallocated float32 matrix so a lookup is a single matrix-vector product.
+    Entries expire after ``ttl_seconds`` and the least recently used ones are
+    evicted once ``max_entries`` or ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 2000,
+                 max_bytes: int = 64 * 1024 * 1024, ttl_seconds: Optional[float] = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._active = np.zeros(max_entries, dtype=bool)
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._free_slots: List[int] = list(range(max_entries - 1, -1, -1))
+        self._catalog_version = None
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _normalize(self, embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def sync_catalog_version(self, version):
+        """Drop every entry when the catalog has changed since the last call"""
+        with self._lock:
+            if self._catalog_version is not None and version != self._catalog_version:
+                self._clear()
+            self._catalog_version = version
+
+    def lookup(self, embedding: List[float]) -> Optional[str]:
+        """Return the cached answer for the nearest similar query, if any"""
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            query = self._normalize(embedding)
+            if query.shape[0] != self._matrix.shape[1]:
+                self.misses += 1
+                return None
+
+            scores = self._matrix @ query
+            scores[~self._active] = -1.0
+            slot = int(np.argmax(scores))
+            entry = self._entries.get(slot)
+
+            if entry is None or scores[slot] < self.threshold:
+                self.misses += 1
+                return None
+            if self.ttl_seconds is not None and time.time() - entry["created_at"] > self.ttl_seconds:
+                self._remove(slot)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return entry["answer"]
+
+    def put(self, embedding: List[float], query: str, answer: str):
+        """Remember the answer produced for a query embedding"""
+        vector = self._normalize(embedding)
+        entry_bytes = vector.nbytes + len(answer.encode("utf-8")) + len(query.encode("utf-8"))
+        if entry_bytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._matrix.shape[1]:
+                return
+
+            self._expire()
+            while self._entries and (not self._free_slots or self.bytes_used + entry_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+            slot = self._free_slots.pop()
+            self._matrix[slot] = vector
+            self._active[slot] = True
+            self._entries[slot] = {
+                "query": query,
+                "answer": answer,
+                "created_at": time.time(),
+                "bytes": entry_bytes
+            }
+            self.bytes_used += entry_bytes
+
+    def _expire(self):
+        if self.ttl_seconds is None:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        for slot in [slot for slot, entry in self._entries.items() if entry["created_at"] < cutoff]:
+            self._remove(slot)
+
+    def _remove(self, slot: int):
+        entry = self._entries.pop(slot)
+        self._active[slot] = False
+        self._free_slots.append(slot)
+        self.bytes_used -= entry["bytes"]
+
+    def _clear(self):
+        for slot in list(self._entries):
+            self._remove(slot)
+
+    def invalidate(self):
+        """Remove every cached answer"""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current memory usage"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes_used": self.bytes_used
+            }
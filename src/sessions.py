@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List
+
+
+class SessionStore(ABC):
+    """Conversation history per session id, as a list of {"role", "content"} turns"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> List[Dict]:
+        """The session's turns, oldest first; empty for an unknown session"""
+
+    @abstractmethod
+    def append(self, session_id: str, messages: List[Dict]):
+        """Add turns to the session, creating it if needed"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Forget the session"""
+
+
+class InMemorySessionStore(SessionStore):
+    """Bounded process-local store: LRU over sessions, capped turns per session, idle TTL"""
+
+    def __init__(self, max_sessions: int = 10000, max_messages: int = 40, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            if time.time() - session["updated_at"] > self.ttl_seconds:
+                del self._sessions[session_id]
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(session["messages"])
+
+    def append(self, session_id: str, messages: List[Dict]):
+        with self._lock:
+            session = self._sessions.setdefault(session_id, {"messages": [], "updated_at": 0.0})
+            session["messages"].extend(messages)
+            del session["messages"][:-self.max_messages]
+            session["updated_at"] = time.time()
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SqliteSessionStore(SessionStore):
+    """Local stand-in for a shared session backend; every process on the host sees the same sessions"""
+
+    def __init__(self, db_path: str = "./sessions.db", max_sessions: int = 100000,
+                 max_messages: int = 40, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)")
+        self._conn.commit()
+
+    def get(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT messages, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return []
+        return json.loads(row[0])
+
+    def append(self, session_id: str, messages: List[Dict]):
+        history = (self.get(session_id) + messages)[-self.max_messages:]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, messages, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(history, ensure_ascii=False), now)
+            )
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM sessions WHERE session_id IN (SELECT session_id FROM sessions "
+                "ORDER BY updated_at DESC LIMIT -1 OFFSET ?)", (self.max_sessions,)
+            )
+            self._conn.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+
+def create_session_store() -> SessionStore:
+    """Build the session store selected by SESSION_STORE (memory or sqlite)"""
+    backend = os.getenv("SESSION_STORE", "memory")
+    max_sessions = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+    max_messages = int(os.getenv("SESSION_MAX_MESSAGES", "40"))
+    ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+
+    if backend == "memory":
+        return InMemorySessionStore(max_sessions, max_messages, ttl_seconds)
+    if backend == "sqlite":
+        return SqliteSessionStore(os.getenv("SESSION_DB_PATH", "./sessions.db"),
+                                  max_sessions, max_messages, ttl_seconds)
+    raise ValueError(f"Unknown session store '{backend}'. Available: memory, sqlite")
@@ -0,0 +1,255 @@
+"""
+Single-writer, multi-reader index sharing through snapshot files.
+
+The writer syncs the catalog into its own index and publishes each new
+version as a snapshot in a shared directory, then points ``CURRENT`` at it
+and signals the registered workers (SIGUSR1). Workers memory-map the current
+float32 snapshot read-only, vectors, catalog and BM25, title and metadata
+indexes alike, so they live once in the page cache no matter how many
+workers attach (see benchmarks/bench_shared_index.py), and swap to a new
+snapshot when signalled (or when polling notices ``CURRENT`` changed).
+
+    python src/shared_index.py writer data/book_summaries.txt ./shared_index --watch
+    SHARED_INDEX_DIR=./shared_index SESSION_STORE=sqlite uvicorn backend:app --workers 8
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+CURRENT_FILE = "CURRENT"
+WORKERS_DIR = "workers"
+SNAPSHOT_PATTERN = "books-{version:06d}.snap"
+SWAP_SIGNAL = getattr(signal, "SIGUSR1", None)
+
+
+def read_current(directory: str) -> Optional[Dict]:
+    """The published pointer ({"snapshot", "version", ...}), or None before the first publish"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def wait_for_snapshot(directory: str, poll_seconds: float = 5.0,
+                      wake: Optional[threading.Event] = None) -> Dict:
+    """Block until the writer has published a first version and return its pointer.
+
+    Polls ``CURRENT`` every ``poll_seconds``; setting ``wake`` (the follower's swap
+    signal) checks again right away.
+    """
+    current = read_current(directory)
+    if current is None:
+        print(f"Waiting for the first snapshot to be published to {directory}")
+    while current is None:
+        if wake is None:
+            time.sleep(poll_seconds)
+        else:
+            wake.wait(poll_seconds)
+            wake.clear()
+        current = read_current(directory)
+    return current
+
+
+class SnapshotPublisher:
+    """Writer side: export a store as the next snapshot version and tell the workers"""
+
+    def __init__(self, directory: str, dtype: str = "float32", keep: int = 3):
+        self.directory = directory
+        self.dtype = dtype
+        self.keep = keep
+        os.makedirs(os.path.join(directory, WORKERS_DIR), exist_ok=True)
+
+    def publish(self, vector_store) -> Dict:
+        from index_snapshot import IndexSnapshot, SnapshotError
+
+        current = read_current(self.directory)
+        version = current["version"] + 1 if current else 1
+        name = SNAPSHOT_PATTERN.format(version=version)
+        path = os.path.join(self.directory, name)
+        header = vector_store.export_snapshot(path, dtype=self.dtype)
+        # Checksums are verified once here, from the file as written; workers only read the header
+        try:
+            IndexSnapshot(path, verify=True)
+        except SnapshotError:
+            os.remove(path)
+            raise
+
+        pointer = {"snapshot": name, "version": version, "count": header["count"],
+                   "published_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        temp_path = os.path.join(self.directory, CURRENT_FILE + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(pointer, file)
+        os.replace(temp_path, os.path.join(self.directory, CURRENT_FILE))
+        print(f"Published snapshot version {version} ({header['count']} books)")
+
+        self.signal_workers()
+        self.prune()
+        return pointer
+
+    def signal_workers(self) -> int:
+        """Send the swap signal to every registered worker; returns how many were reached"""
+        if SWAP_SIGNAL is None:
+            return 0
+        workers_dir = os.path.join(self.directory, WORKERS_DIR)
+        reached = 0
+        for name in os.listdir(workers_dir):
+            try:
+                os.kill(int(name), SWAP_SIGNAL)
+                reached += 1
+            except (ValueError, ProcessLookupError):
+                # Worker exited without unregistering
+                os.remove(os.path.join(workers_dir, name))
+            except PermissionError:
+                pass
+        return reached
+
+    def prune(self):
+        """Delete all but the newest ``keep`` snapshots; workers still mapping one keep a valid view of it"""
+        snapshots = sorted(name for name in os.listdir(self.directory)
+                           if name.startswith("books-") and name.endswith(".snap"))
+        for name in snapshots[:-self.keep]:
+            os.remove(os.path.join(self.directory, name))
+
+
+class SnapshotFollower:
+    """Worker side: call ``on_change(snapshot_path)`` whenever a new version is published.
+
+    Wakes on the swap signal (see ``install_signal_handler``) and otherwise
+    polls ``CURRENT`` every ``poll_seconds``.
+    """
+
+    def __init__(self, directory: str, on_change: Callable[[str], None], poll_seconds: float = 5.0,
+                 version: Optional[int] = None):
+        self.directory = directory
+        self.on_change = on_change
+        self.poll_seconds = poll_seconds
+        self.version = version
+        self.swaps = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="snapshot-follower", daemon=True)
+        self._pid_file = os.path.join(directory, WORKERS_DIR, str(os.getpid()))
+
+    def register(self):
+        """Ask the writer to signal this process on publish; done before waiting for a first version"""
+        os.makedirs(os.path.dirname(self._pid_file), exist_ok=True)
+        open(self._pid_file, "w").close()
+        return self
+
+    def start(self):
+        self.register()
+        self._thread.start()
+        return self
+
+    def wake(self, *_):
+        self._wake.set()
+
+    @property
+    def wake_event(self) -> threading.Event:
+        """Set by the swap signal; lets ``wait_for_snapshot`` wake up before the follower thread runs"""
+        return self._wake
+
+    def install_signal_handler(self, loop=None):
+        """Wake on SIGUSR1; pass the running event loop when called from async code"""
+        if SWAP_SIGNAL is None:
+            return
+        if loop is not None:
+            loop.add_signal_handler(SWAP_SIGNAL, self.wake)
+        else:
+            signal.signal(SWAP_SIGNAL, self.wake)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.check()
+
+    def check(self) -> bool:
+        """Swap if a newer version is published; returns whether it did"""
+        current = read_current(self.directory)
+        if current is None or current["version"] == self.version:
+            return False
+        try:
+            self.on_change(os.path.join(self.directory, current["snapshot"]))
+        except Exception as e:
+            print(f"Failed to load snapshot version {current['version']}: {e}")
+            return False
+        self.version = current["version"]
+        self.swaps += 1
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        try:
+            os.remove(self._pid_file)
+        except FileNotFoundError:
+            pass
+
+
+def run_writer(catalog: str, directory: str, watch: bool = False, poll_seconds: float = 5.0,
+               dtype: str = "float32"):
+    """Sync the catalog and publish a snapshot whenever it changes (once, or continuously with watch)"""
+    from dotenv import load_dotenv
+    from vector_store import BookVectorStore
+
+    load_dotenv()
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        sys.exit("OPENAI_API_KEY not found in environment variables!")
+
+    store = BookVectorStore(openai_api_key)
+    store.create_collection()
+    publisher = SnapshotPublisher(directory, dtype=dtype)
+
+    last_seen = None
+    while True:
+        stat = os.stat(catalog)
+        if (stat.st_mtime_ns, stat.st_size) != last_seen:
+            last_seen = (stat.st_mtime_ns, stat.st_size)
+            version = store.catalog_version
+            store.populate_database(catalog, incremental=True)
+            if store.catalog_version != version or read_current(directory) is None:
+                publisher.publish(store)
+        if not watch:
+            return
+        time.sleep(poll_seconds)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    writer = commands.add_parser("writer", help="Sync the catalog and publish snapshots")
+    writer.add_argument("catalog")
+    writer.add_argument("directory")
+    writer.add_argument("--watch", action="store_true", help="Keep running and republish on catalog changes")
+    writer.add_argument("--poll-seconds", type=float, default=5.0)
+    writer.add_argument("--dtype", choices=("float32", "float16"), default="float32",
+                        help="float16 halves the file but workers then hold a private float32 copy")
+
+    status = commands.add_parser("status", help="Show the published version and registered workers")
+    status.add_argument("directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "writer":
+        run_writer(args.catalog, args.directory, args.watch, args.poll_seconds, args.dtype)
+    else:
+        workers_dir = os.path.join(args.directory, WORKERS_DIR)
+        print(json.dumps({
+            "current": read_current(args.directory),
+            "workers": sorted(os.listdir(workers_dir)) if os.path.isdir(workers_dir) else [],
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+STATUS_STARTING = "starting"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+class StartupTracker:
+    """Phase timings and loading progress of the librarian's startup, reported by /readyz"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.status = STATUS_STARTING
+        self.phase: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self.progress: Dict = {}
+        self.error: Optional[str] = None
+        self.ready_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, phase: str):
+        """Time a startup phase and log its duration"""
+        with self._lock:
+            self.phase = phase
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.phases[phase] = elapsed_ms
+            print(f"Startup phase '{phase}': {elapsed_ms:.0f} ms")
+
+    def update(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+
+    def ready(self):
+        with self._lock:
+            self.status = STATUS_READY
+            self.phase = None
+            self.ready_ms = (time.perf_counter() - self.started) * 1000
+        print(f"Startup complete in {self.ready_ms:.0f} ms")
+
+    def fail(self, error: Exception):
+        with self._lock:
+            self.status = STATUS_FAILED
+            self.error = str(error)
+        print(f"Startup failed during '{self.phase}': {error}")
+
+    @property
+    def is_ready(self) -> bool:
+        return self.status == STATUS_READY
+
+    @property
+    def has_failed(self) -> bool:
+        """Startup gave up; nothing will retry it in this process"""
+        return self.status == STATUS_FAILED
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "status": self.status,
+                "phase": self.phase,
+                "phases_ms": dict(self.phases),
+                "progress": dict(self.progress),
+                "elapsed_ms": (time.perf_counter() - self.started) * 1000,
+                "ready_ms": self.ready_ms,
+                "error": self.error,
+            }
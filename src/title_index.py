@@ -0,0 +1,194 @@
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from lexical_index import normalize_text
+from mapped_tables import HashLookup, StringTable, pack_lookup, pack_postings, pack_strings, postings_slice
+
+
+def normalize_title(title: str) -> str:
+    """Case-, diacritic- and punctuation-insensitive form of a title"""
+    return " ".join(re.findall(r"\w+", normalize_text(title)))
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """Title -> summary lookup for the catalog.
+
+    Exact and normalized titles resolve through hash maps; everything else goes
+    through a trigram inverted index that ranks candidates by Dice similarity,
+    so a miss costs work proportional to the titles sharing trigrams with the
+    query rather than the catalog size.
+    """
+
+    def __init__(self, fuzzy_threshold: float = 0.85):
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.RLock()
+        self._books: Dict[str, Tuple[str, str]] = {}
+        self._by_title: Dict[str, str] = {}
+        self._by_normalized: Dict[str, str] = {}
+        # Only the trigram count per title is kept; the set is recomputed on removal
+        self._gram_counts: Dict[str, int] = {}
+        self._postings: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def add(self, doc_id: str, title: str, summary: str):
+        with self._lock:
+            self._remove(doc_id)
+            normalized = normalize_title(title)
+            grams = trigrams(normalized)
+
+            self._books[doc_id] = (title, summary)
+            self._by_title[title] = doc_id
+            self._by_normalized[normalized] = doc_id
+            self._gram_counts[doc_id] = len(grams)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, doc_ids: List[str]):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        book = self._books.pop(doc_id, None)
+        if book is None:
+            return
+        title = book[0]
+        normalized = normalize_title(title)
+        if self._by_title.get(title) == doc_id:
+            del self._by_title[title]
+        if self._by_normalized.get(normalized) == doc_id:
+            del self._by_normalized[normalized]
+        del self._gram_counts[doc_id]
+        for gram in trigrams(normalized):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def clear(self):
+        with self._lock:
+            self._books.clear()
+            self._by_title.clear()
+            self._by_normalized.clear()
+            self._gram_counts.clear()
+            self._postings.clear()
+
+    def _similar_ids(self, title: str, k: int) -> List[Tuple[str, float]]:
+        grams = trigrams(normalize_title(title))
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = [
+            (doc_id, 2.0 * count / (len(grams) + self._gram_counts[doc_id]))
+            for doc_id, count in shared.items()
+        ]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:k]
+
+    def similar(self, title: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Return up to k (title, dice_similarity) pairs, most similar first"""
+        with self._lock:
+            return [(self._books[doc_id][0], score) for doc_id, score in self._similar_ids(title, k)]
+
+    def resolve(self, title: str) -> Optional[Tuple[str, str]]:
+        """Return (catalog_title, summary) for a title, tolerating case, diacritics and typos"""
+        with self._lock:
+            doc_id = self._by_title.get(title) or self._by_normalized.get(normalize_title(title))
+            if doc_id is not None:
+                return self._books[doc_id]
+
+            candidates = self._similar_ids(title, k=2)
+            if candidates and candidates[0][1] >= self.fuzzy_threshold:
+                # Only accept a fuzzy hit that clearly beats the runner-up
+                if len(candidates) == 1 or candidates[0][1] - candidates[1][1] > 0.05:
+                    return self._books[candidates[0][0]]
+        return None
+
+
+def pack_title_index(titles: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Arrays of a title index over catalog rows, served read-only by ``MappedTitleIndex``"""
+    normalized = [normalize_title(title) for title in titles]
+    gram_counts = np.zeros(len(titles), dtype=np.uint16)
+    postings: Dict[str, List[int]] = {}
+    for row, title in enumerate(normalized):
+        grams = trigrams(title)
+        gram_counts[row] = len(grams)
+        for gram in grams:
+            postings.setdefault(gram, []).append(row)
+
+    vocabulary = list(postings)
+    tables = {"titles.gram_counts": gram_counts}
+    tables["titles.exact.hashes"], tables["titles.exact.rows"] = pack_lookup(titles)
+    tables["titles.normalized.hashes"], tables["titles.normalized.rows"] = pack_lookup(normalized)
+    tables["titles.grams.offsets"], tables["titles.grams.data"] = pack_strings(vocabulary)
+    tables["titles.grams.hashes"], tables["titles.grams.rows"] = pack_lookup(vocabulary)
+    tables["titles.postings.offsets"], tables["titles.postings.rows"] = pack_postings(
+        [postings[gram] for gram in vocabulary])
+    return tables
+
+
+class MappedTitleIndex:
+    """Read-only ``TitleIndex`` over arrays written by ``pack_title_index``, typically memory-mapped.
+
+    ``titles`` and ``summaries`` are the catalog columns the rows refer to.
+    """
+
+    def __init__(self, tables: Dict[str, np.ndarray], titles: Sequence[str], summaries: Sequence[str],
+                 fuzzy_threshold: float = 0.85):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.titles = titles
+        self.summaries = summaries
+        self._gram_counts = tables["titles.gram_counts"]
+        self._by_title = HashLookup(tables["titles.exact.hashes"], tables["titles.exact.rows"], titles.__getitem__)
+        self._by_normalized = HashLookup(tables["titles.normalized.hashes"], tables["titles.normalized.rows"],
+                                         lambda row: normalize_title(titles[row]))
+        grams = StringTable(tables["titles.grams.offsets"], tables["titles.grams.data"])
+        self._grams = HashLookup(tables["titles.grams.hashes"], tables["titles.grams.rows"], grams.__getitem__)
+        self._offsets = tables["titles.postings.offsets"]
+        self._rows = tables["titles.postings.rows"]
+
+    def __len__(self) -> int:
+        return len(self._gram_counts)
+
+    def _similar_rows(self, title: str, k: int) -> List[Tuple[int, float]]:
+        grams = trigrams(normalize_title(title))
+        found = [postings_slice(self._offsets, self._rows, index)
+                 for index in (self._grams.get(gram) for gram in grams) if index is not None]
+        if not found:
+            return []
+        rows, shared = np.unique(np.concatenate(found), return_counts=True)
+        scores = 2.0 * shared / (len(grams) + self._gram_counts[rows])
+        best = np.argsort(-scores, kind="stable")[:k]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def similar(self, title: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Return up to k (title, dice_similarity) pairs, most similar first"""
+        return [(self.titles[row], score) for row, score in self._similar_rows(title, k)]
+
+    def resolve(self, title: str) -> Optional[Tuple[str, str]]:
+        """Return (catalog_title, summary) for a title, tolerating case, diacritics and typos"""
+        row = self._by_title.get(title)
+        if row is None:
+            row = self._by_normalized.get(normalize_title(title))
+        if row is not None:
+            return self.titles[row], self.summaries[row]
+
+        candidates = self._similar_rows(title, k=2)
+        if candidates and candidates[0][1] >= self.fuzzy_threshold:
+            # Only accept a fuzzy hit that clearly beats the runner-up
+            if len(candidates) == 1 or candidates[0][1] - candidates[1][1] > 0.05:
+                row = candidates[0][0]
+                return self.titles[row], self.summaries[row]
+        return None
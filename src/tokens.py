@@ -0,0 +1,37 @@
+_encoder = None
+
+
+def get_encoder():
+    """Return the cl100k_base tokenizer, or None when tiktoken cannot load it"""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # tiktoken downloads its encodings on first use; offline hosts estimate instead
+            print(f"tiktoken unavailable ({e}), estimating token counts")
+            _encoder = False
+    return _encoder or None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens the way OpenAI models will (or estimate without tiktoken)"""
+    encoder = get_encoder()
+    if encoder is None:
+        return len(text) // 3 + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "…") -> str:
+    """Cut text to at most max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoder = get_encoder()
+    if encoder is None:
+        limit = max_tokens * 3
+        return text if len(text) <= limit else text[:limit] + suffix
+    tokens = encoder.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoder.decode(tokens[:max_tokens]) + suffix
@@ -1,4 +1,6 @@
 from typing import Dict, Optional
+from title_index import TitleIndex
+from content_filter import get_content_filter
 
 # Complete book summaries dictionary
 book_summaries_dict = {
@@ -78,27 +80,52 @@ book_summaries_dict = {
 }
 
 
-def get_summary_by_title(title: str) -> str:
+# Title index over the live catalog; registered by SmartLibrarian once the vector store is loaded
+_catalog_title_index: Optional[TitleIndex] = None
+_fallback_title_index: Optional[TitleIndex] = None
+
+
+def register_catalog(title_index: TitleIndex):
+    """Resolve get_summary_by_title against the given catalog title index"""
+    global _catalog_title_index
+    _catalog_title_index = title_index
+
+
+def get_title_index() -> TitleIndex:
+    """Return the catalog title index, or one built from book_summaries_dict if none is registered"""
+    global _fallback_title_index
+    if _catalog_title_index is not None:
+        return _catalog_title_index
+    if _fallback_title_index is None:
+        index = TitleIndex()
+        for book_title, summary in book_summaries_dict.items():
+            index.add(book_title, book_title, summary)
+        _fallback_title_index = index
+    return _fallback_title_index
+
+
+def get_summary_by_title(title: str, max_suggestions: int = 5) -> str:
     """
     Tool function to get detailed book summary by exact title.
     This function will be registered as an OpenAI function calling tool.
 
     Args:
         title (str): Exact title of the book
+        max_suggestions (int): How many similar titles to suggest when the title is not found
 
     Returns:
         str: Detailed summary of the book or error message if not found
     """
-    if title in book_summaries_dict:
-        return book_summaries_dict[title]
-    else:
-        # Try case-insensitive search
-        for book_title, summary in book_summaries_dict.items():
-            if book_title.lower() == title.lower():
-                return summary
+    index = get_title_index()
+    match = index.resolve(title)
+    if match is not None:
+        return match[1]
 
-        available_titles = ", ".join(book_summaries_dict.keys())
-        return f"Cartea '{title}' nu a fost găsită în baza de date. Cărțile disponibile sunt: {available_titles}"
+    suggestions = [suggested for suggested, _ in index.similar(title, k=max_suggestions)]
+    if suggestions:
+        return (f"Cartea '{title}' nu a fost găsită în baza de date. "
+                f"Titluri apropiate: {', '.join(suggestions)}")
+    return f"Cartea '{title}' nu a fost găsită în baza de date."
 
 
 # Tool definition for OpenAI function calling
@@ -123,7 +150,10 @@ get_summary_tool_definition = {
 
 def filter_inappropriate_language(text: str) -> tuple[bool, str]:
     """
-    Simple content filter for inappropriate language.
+    Content filter for inappropriate language.
+
+    Terms come from the per-language lists in data/filters and are matched as
+    whole words after case and diacritic normalization.
 
     Args:
         text (str): User input text
@@ -131,14 +161,7 @@ def filter_inappropriate_language(text: str) -> tuple[bool, str]:
     Returns:
         tuple[bool, str]: (is_appropriate, filtered_message)
     """
-    inappropriate_words = [
-        # Add Romanian and English inappropriate words
-        'prost', 'idiot', 'stupid', 'fuck', 'shit', 'damn'
-    ]
-
-    text_lower = text.lower()
-    for word in inappropriate_words:
-        if word in text_lower:
-            return False, "Îmi pare rău, dar nu pot răspunde la mesaje care conțin limbaj nepotrivit. Te rog să reformulezi întrebarea într-un mod respectuos."
+    if not get_content_filter().is_appropriate(text):
+        return False, "Îmi pare rău, dar nu pot răspunde la mesaje care conțin limbaj nepotrivit. Te rog să reformulezi întrebarea într-un mod respectuos."
 
-    return True, text
\ No newline at end of file
+    return True, text
@@ -1,95 +1,782 @@
-import chromadb
-from chromadb.config import Settings
-import openai
 import os
-from typing import List, Dict
 import re
+import asyncio
+from typing import Callable, List, Dict, Optional, Iterable, Iterator
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import numpy as np
+from embedding_cache import EmbeddingCache
+from index_backends import VectorIndex, NumpyIndex, open_index, drop_index, DEFAULT_PERSIST_DIRECTORIES
+from index_snapshot import IndexSnapshot, MappedCatalog, SnapshotError, write_snapshot
+from lexical_index import BM25Index, MappedBM25Index, normalize_text, reciprocal_rank_fusion
+from title_index import TitleIndex
+from embedding_batcher import EmbeddingBatcher
+from tokens import count_tokens
+from openai_gateway import get_gateway
+
+TITLE_MARKER = "## Title: "
+# Optional "Field: value" lines between an entry's title and its summary
+CATALOG_FIELDS = ("author", "genre", "language", "year", "availability")
+FIELD_PATTERN = re.compile(r"^(" + "|".join(CATALOG_FIELDS) + r"):\s*(.*?)\s*$", re.IGNORECASE)
+# Fields that describe the book's content and are embedded with the summary
+EMBEDDED_FIELDS = ("author", "genre")
+# Categorical fields stored as normalized filter keys (the author keeps its spelling for display)
+KEYED_FIELDS = ("genre", "language", "availability")
+FILTER_NAMES = ("author", "genre", "language", "availability", "year_min", "year_max")
+# Active and previous generation of each collection, for blue/green rebuilds (see reindex.py)
+GENERATIONS_FILE = "generations.json"
+
+
+def make_book_id(title: str) -> str:
+    """Stable document id derived from the normalized book title"""
+    normalized = " ".join(title.lower().split())
+    return "book_" + hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def make_content_hash(full_text: str) -> str:
+    """Hash of the embedded text, used to detect changed summaries"""
+    return hashlib.sha256(full_text.encode("utf-8")).hexdigest()
+
+
+def filter_key(value: str) -> str:
+    """Case- and diacritic-insensitive form of a metadata value, as stored and matched by filters"""
+    return " ".join(normalize_text(str(value)).split())
+
+
+def build_where(filters: Optional[Dict]) -> Optional[Dict]:
+    """Translate search filters into an index ``where`` clause.
+
+    ``author``, ``genre``, ``language`` and ``availability`` take a value or a
+    list of accepted values; ``year_min`` / ``year_max`` bound the year inclusively.
+    """
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown search filter(s): {', '.join(sorted(unknown))}. "
+                         f"Available: {', '.join(FILTER_NAMES)}")
+
+    clauses = []
+    for name in ("author", "genre", "language", "availability"):
+        value = filters.get(name)
+        if value is None:
+            continue
+        field = "author_key" if name == "author" else name
+        values = [filter_key(item) for item in ([value] if isinstance(value, str) else value)]
+        clauses.append({field: values[0]} if len(values) == 1 else {field: {"$in": values}})
+    if filters.get("year_min") is not None:
+        clauses.append({"year": {"$gte": int(filters["year_min"])}})
+    if filters.get("year_max") is not None:
+        clauses.append({"year": {"$lte": int(filters["year_max"])}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
 
 class BookVectorStore:
-    def __init__(self, openai_api_key: str, persist_directory: str = "./chroma_db"):
-        self.openai_client = openai.Client(api_key=openai_api_key)
-        self.chroma_client = chromadb.PersistentClient(path=persist_directory)
-        self.collection = None
+    def __init__(self, openai_api_key: str, persist_directory: Optional[str] = None,
+                 embedding_cache: Optional[EmbeddingCache] = None, index_backend: Optional[str] = None):
+        self.gateway = get_gateway(openai_api_key)
+        self.index_backend = index_backend or os.getenv("VECTOR_INDEX_BACKEND", "chroma")
+        self.persist_directory = persist_directory or DEFAULT_PERSIST_DIRECTORIES.get(self.index_backend, "./chroma_db")
+        self.collection: Optional[VectorIndex] = None
+        self.collection_base: Optional[str] = None
+        self.collection_name: Optional[str] = None
+        self.embedding_model = "text-embedding-3-small"
+        # Shorter (Matryoshka-truncated) vectors from the API; None keeps the model's full size
+        self.embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+        self.quantization = os.getenv("VECTOR_QUANTIZATION", "none")
+        self.rescore_factor = int(os.getenv("VECTOR_RESCORE_FACTOR", "10"))
+
+        if embedding_cache is None:
+            ttl = os.getenv("EMBEDDING_CACHE_TTL_SECONDS")
+            embedding_cache = EmbeddingCache(
+                db_path=os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db"),
+                ttl_seconds=float(ttl) if ttl else None
+            )
+        self.embedding_cache = embedding_cache
+        # Bumped whenever ingestion changes the collection, so dependent caches can invalidate
+        self.catalog_version = 0
+        # Catalog tables of the imported snapshot while the index serves them unchanged
+        self.mapped_catalog: Optional[MappedCatalog] = None
+
+        self.hybrid_search = os.getenv("HYBRID_SEARCH", "1") != "0"
+        self._new_text_indexes()
 
-    def create_collection(self, collection_name: str = "books"):
-        """Create or get existing collection"""
+    def _new_text_indexes(self):
+        self.lexical_index = BM25Index(min_title_coverage=float(os.getenv("TITLE_MATCH_MIN_COVERAGE", "0.6")))
+        self.title_index = TitleIndex()
+
+    @property
+    def embedding_key(self) -> str:
+        """Model name qualified with the requested dimensions; keys the cache and labels snapshots"""
+        if self.embedding_dimensions:
+            return f"{self.embedding_model}:{self.embedding_dimensions}"
+        return self.embedding_model
+
+    def embedding_params(self) -> Dict:
+        params = {"model": self.embedding_model}
+        if self.embedding_dimensions:
+            params["dimensions"] = self.embedding_dimensions
+        return params
+
+    def create_collection(self, collection_name: str = "books", generation: Optional[str] = None):
+        """Create or get existing collection; each embedding size gets its own collection.
+
+        ``generation`` opens a new build of the collection next to the serving one
+        (see reindex.py). Without it the active generation recorded by
+        ``activate_generation`` is opened, or the plain name if there is none.
+        """
+        if self.embedding_dimensions:
+            collection_name = f"{collection_name}_{self.embedding_dimensions}d"
+        self.collection_base = collection_name
+        if generation:
+            self.collection_name = f"{collection_name}_{generation}"
+        else:
+            self.collection_name = self._read_generations().get(collection_name, {}).get("active", collection_name)
+        self.collection = open_index(self.index_backend, self.persist_directory, self.collection_name,
+                                     quantization=self.quantization, rescore_factor=self.rescore_factor)
+
+    def _read_generations(self) -> Dict:
         try:
-            self.collection = self.chroma_client.get_collection(collection_name)
-            print(f"Collection '{collection_name}' already exists with {self.collection.count()} documents")
-        except:
-            self.collection = self.chroma_client.create_collection(collection_name)
-            print(f"Created new collection '{collection_name}'")
+            with open(os.path.join(self.persist_directory, GENERATIONS_FILE), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def activate_generation(self) -> Optional[str]:
+        """Record this store's collection as the one to open on startup.
+
+        The collection it replaces is kept as ``previous``; the one before that
+        is returned so the caller can drop it once nothing serves from it.
+        """
+        generations = self._read_generations()
+        entry = generations.get(self.collection_base, {"active": self.collection_base})
+        if entry["active"] == self.collection_name:
+            return None
+        generations[self.collection_base] = {"active": self.collection_name, "previous": entry["active"]}
+
+        os.makedirs(self.persist_directory, exist_ok=True)
+        path = os.path.join(self.persist_directory, GENERATIONS_FILE)
+        with open(path + ".tmp", 'w', encoding='utf-8') as file:
+            json.dump(generations, file, indent=2)
+        os.replace(path + ".tmp", path)
+        return entry.get("previous")
+
+    def drop_collection(self, collection_name: str):
+        """Delete another collection stored next to this one, e.g. a retired generation"""
+        if collection_name == self.collection_name:
+            raise ValueError(f"Refusing to drop the collection this store serves ({collection_name})")
+        try:
+            drop_index(self.index_backend, self.persist_directory, collection_name)
+            print(f"Dropped collection '{collection_name}'")
+        except Exception as e:
+            print(f"Could not drop collection '{collection_name}': {e}")
 
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings from the cache, falling back to OpenAI for misses"""
+        embeddings = self.embedding_cache.get_many(self.embedding_key, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+
+        # Embed each distinct missing text once
+        missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+        fetched = self._fetch_embeddings(missing_texts)
+        self.embedding_cache.put_many(self.embedding_key, missing_texts, fetched)
+
+        by_text = dict(zip(missing_texts, fetched))
+        for i in missing:
+            embeddings[i] = by_text[texts[i]]
+        return embeddings
+
+    def _fetch_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Get embeddings from OpenAI"""
-        response = self.openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=texts
-        )
+        response = self.gateway.embeddings(input=texts, **self.embedding_params())
         return [data.embedding for data in response.data]
 
     def parse_books_file(self, file_path: str) -> List[Dict]:
         """Parse the book summaries file"""
+        return list(self.iter_books(file_path))
+
+    def _make_book(self, title: str, summary_lines: List[str], fields: Optional[Dict[str, str]] = None) -> Dict:
+        fields = dict(fields or {})
+        summary = "".join(summary_lines).strip()
+        # Entries without fields embed exactly as before, so their content hash is unchanged
+        header = "".join(f"{name.capitalize()}: {fields[name]}\n" for name in EMBEDDED_FIELDS if fields.get(name))
+        full_text = f"Title: {title}\n{header}{summary}"
+        content_hash = make_content_hash(full_text)
+
+        metadata = {'title': title, 'content_hash': content_hash}
+        if fields.get('author'):
+            metadata['author'] = fields['author']
+            metadata['author_key'] = filter_key(fields['author'])
+        for name in KEYED_FIELDS:
+            if fields.get(name):
+                metadata[name] = filter_key(fields[name])
+        if fields.get('year'):
+            try:
+                metadata['year'] = int(fields['year'])
+            except ValueError:
+                print(f"Ignoring invalid year '{fields['year']}' for '{title}'")
+        return {
+            'id': make_book_id(title),
+            'title': title,
+            'summary': summary,
+            'full_text': full_text,
+            'content_hash': content_hash,
+            'metadata': metadata
+        }
+
+    def iter_books(self, file_path: str) -> Iterator[Dict]:
+        """Stream books from the catalog file one entry at a time.
+
+        Each entry is a ``## Title:`` line, optional ``Author:``, ``Genre:``,
+        ``Language:``, ``Year:`` and ``Availability:`` lines, then the summary.
+        """
+        title = None
+        fields: Dict[str, str] = {}
+        summary_lines = []
+        # Field lines are only recognized before the first line of summary text
+        in_summary = False
+
         with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-
-        books = []
-        book_sections = re.split(r'## Title: ', content)[1:]  # Skip empty first element
-
-        for section in book_sections:
-            lines = section.strip().split('\n', 1)
-            if len(lines) >= 2:
-                title = lines[0].strip()
-                summary = lines[1].strip()
-                books.append({
-                    'title': title,
-                    'summary': summary,
-                    'full_text': f"Title: {title}\n{summary}"
-                })
+            for line in file:
+                if line.startswith(TITLE_MARKER):
+                    if title is not None and summary_lines:
+                        yield self._make_book(title, summary_lines, fields)
+                    title = line[len(TITLE_MARKER):].strip()
+                    fields = {}
+                    summary_lines = []
+                    in_summary = False
+                elif title is not None:
+                    match = FIELD_PATTERN.match(line) if not in_summary else None
+                    if match:
+                        fields[match.group(1).lower()] = match.group(2)
+                    else:
+                        summary_lines.append(line)
+                        in_summary = in_summary or bool(line.strip())
 
-        return books
+        if title is not None and summary_lines:
+            yield self._make_book(title, summary_lines, fields)
+
+    def iter_book_batches(self, file_path: str, batch_size: int = 256) -> Iterator[List[Dict]]:
+        """Stream the catalog in fixed-size batches"""
+        batch = []
+        for book in self.iter_books(file_path):
+            batch.append(book)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens the way the embedding model will"""
+        return count_tokens(text)
+
+    def make_batches(self, books: Iterable[Dict], max_batch_tokens: int = 100000,
+                     max_batch_items: int = 1000) -> Iterator[List[Dict]]:
+        """Split books into embedding requests bounded by token count and size"""
+        current = []
+        current_tokens = 0
+
+        for book in books:
+            tokens = self.count_tokens(book['full_text'])
+            if current and (current_tokens + tokens > max_batch_tokens or len(current) >= max_batch_items):
+                yield current
+                current = []
+                current_tokens = 0
+            current.append(book)
+            current_tokens += tokens
+
+        if current:
+            yield current
+
+    def populate_database(self, books_file_path: str, incremental: bool = False, batch_size: int = 256,
+                          progress: Optional[Callable[[Dict[str, int]], None]] = None):
+        """Fill the index from the catalog file, on any ``VectorIndex`` backend.
+
+        With ``incremental`` the index is synced to the catalog: new and changed
+        books are embedded and upserted and removed ones deleted. Otherwise an
+        empty index is bulk loaded and a populated one is left as it is.
+        """
+        if incremental:
+            return self.sync_database(books_file_path, batch_size=batch_size, progress=progress)
 
-    def populate_database(self, books_file_path: str):
-        """Load books into ChromaDB"""
         if self.collection.count() > 0:
             print("Database already populated. Skipping...")
+            self.ensure_text_indexes()
             return
 
-        books = self.parse_books_file(books_file_path)
-        print(f"Parsed {len(books)} books from file")
+        total = self.bulk_load(books_file_path, batch_size=batch_size)
+        print(f"Added {total} books to vector database")
 
-        texts = [book['full_text'] for book in books]
-        embeddings = self.get_embeddings(texts)
+    def _index_text(self, doc_id: str, title: str, summary: str):
+        self._writable_text_indexes()
+        self.lexical_index.add(doc_id, title, summary)
+        self.title_index.add(doc_id, title, summary)
 
-        ids = [f"book_{i}" for i in range(len(books))]
-        metadatas = [{'title': book['title']} for book in books]
-        documents = [book['summary'] for book in books]
+    def _unindex_text(self, doc_ids: List[str]):
+        self._writable_text_indexes()
+        self.lexical_index.remove(doc_ids)
+        self.title_index.remove(doc_ids)
 
-        self.collection.add(
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+    def _writable_text_indexes(self):
+        """Text indexes mapped from a snapshot are read-only; rebuild private ones before the first change"""
+        if isinstance(self.lexical_index, MappedBM25Index):
+            self.mapped_catalog = None
+            self._new_text_indexes()
+            self.ensure_text_indexes()
+
+    def ensure_text_indexes(self, page_size: int = 1000):
+        """(Re)build the BM25 and title indexes from the collection if they are out of step with it"""
+        total = self.collection.count()
+        if len(self.lexical_index) == total and len(self.title_index) == total:
+            return
+
+        self.lexical_index.clear()
+        self.title_index.clear()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(include=['metadatas', 'documents'], limit=page_size, offset=offset)
+            for doc_id, metadata, document in zip(page['ids'], page['metadatas'], page['documents']):
+                self._index_text(doc_id, metadata['title'], document)
+        print(f"Built lexical and title indexes over {len(self.lexical_index)} books")
+
+    def bulk_load(self, books_file_path: str, batch_size: int = 256, max_workers: int = 4) -> int:
+        """Stream the whole catalog into the collection with memory bounded by the batch size"""
+        started = time.perf_counter()
+        total = self._upsert_batches(self._token_batches(self.iter_book_batches(books_file_path, batch_size)),
+                                     max_workers=max_workers)
+        self.collection.flush()
+        self.ensure_text_indexes()
+        self._report_throughput("Bulk load", total, started)
+        if total:
+            self.catalog_version += 1
+        return total
+
+    def sync_database(self, books_file_path: str, max_batch_tokens: int = 100000,
+                      max_workers: int = 4, batch_size: int = 256,
+                      progress: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, int]:
+        """Bring the collection in line with the catalog file, embedding only changed books.
+
+        ``progress`` is called after each parsed batch with the running counters and ``processed``.
+        """
+        started = time.perf_counter()
+        stats = {'added': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        seen_ids = set()
+
+        def changed_books():
+            for batch in self.iter_book_batches(books_file_path, batch_size):
+                fresh = []
+                for book in batch:
+                    if book['id'] in seen_ids:
+                        print(f"Duplicate title '{book['title']}' in catalog, keeping the first entry")
+                        continue
+                    seen_ids.add(book['id'])
+                    fresh.append(book)
+                if not fresh:
+                    continue
+
+                existing = self.collection.get(ids=[book['id'] for book in fresh], include=['metadatas'])
+                existing_metadata = dict(zip(existing['ids'], existing['metadatas']))
+                for book in fresh:
+                    if book['id'] not in existing_metadata:
+                        stats['added'] += 1
+                        yield book
+                    # A metadata-only change re-embeds the same text, which the embedding cache answers
+                    elif existing_metadata[book['id']] != book['metadata']:
+                        stats['updated'] += 1
+                        yield book
+                    else:
+                        stats['unchanged'] += 1
+                if progress:
+                    progress(dict(stats, processed=len(seen_ids)))
+
+        self._upsert_batches(self.make_batches(changed_books(), max_batch_tokens=max_batch_tokens),
+                             max_workers=max_workers)
+
+        # Only ids are needed to find books that disappeared from the catalog
+        removed = [doc_id for doc_id in self.collection.get(include=[])['ids'] if doc_id not in seen_ids]
+        if removed:
+            # One call: the NumPy backend rewrites its whole matrix per delete
+            self.collection.delete(ids=removed)
+        self._unindex_text(removed)
+        stats['deleted'] = len(removed)
+        self.collection.flush()
+        self.ensure_text_indexes()
+        if stats['added'] or stats['updated'] or stats['deleted']:
+            self.catalog_version += 1
+
+        print(f"Catalog sync: {stats['added']} added, {stats['updated']} updated, "
+              f"{stats['deleted']} deleted, {stats['unchanged']} unchanged")
+        self._report_throughput("Catalog sync", len(seen_ids), started)
+        return stats
 
-        print(f"Added {len(books)} books to vector database")
+    def export_snapshot(self, path: str, dtype: str = "float32", page_size: int = 1000) -> Dict:
+        """Write the index (vectors, titles, summaries, content hashes, model name) to a snapshot file"""
+        started = time.perf_counter()
+
+        def pages():
+            for offset in range(0, self.collection.count(), page_size):
+                page = self.collection.get(include=['embeddings', 'metadatas', 'documents'],
+                                           limit=page_size, offset=offset)
+                yield page['ids'], page['embeddings'], page['documents'], page['metadatas']
+
+        header = write_snapshot(path, pages(), self.embedding_key, dtype=dtype,
+                                title_weight=self.lexical_index.title_weight)
+        self._report_throughput("Snapshot export", header['count'], started)
+        return header
+
+    def import_snapshot(self, path: str, verify: bool = True, persist: bool = True,
+                        batch_size: int = 1000) -> Dict:
+        """Replace the index contents with a snapshot file, without any embedding calls.
+
+        The NumPy backend serves the snapshot's vectors memory-mapped, and its
+        catalog and BM25, title and metadata indexes from the snapshot's packed
+        tables, so nothing is copied into this process; ``persist`` also copies
+        the entries into its own directory. Other backends upsert the vectors,
+        and skip the import when the same snapshot was already loaded.
+        """
+        started = time.perf_counter()
+        snapshot = IndexSnapshot(path, verify=verify)
+        truncate = self._snapshot_truncation(snapshot)
+
+        marker_path = os.path.join(self.persist_directory, "imported_snapshot.json")
+        fingerprint = {key: snapshot.header[key] for key in ('vectors_sha256', 'catalog_sha256', 'count')}
+        mapped = None
+        if isinstance(self.collection, NumpyIndex) \
+                and snapshot.header.get("bm25_title_weight") == self.lexical_index.title_weight:
+            mapped = snapshot.mapped_catalog()
+        if mapped is not None:
+            ids, documents, metadatas = mapped.ids, mapped.documents, mapped.metadatas
+        else:
+            ids, documents, metadatas = snapshot.catalog()
+        vectors = snapshot.vectors()
+        if truncate:
+            # Matryoshka embeddings keep their meaning when cut short and renormalized
+            vectors = np.ascontiguousarray(vectors[:, :truncate], dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors /= norms
+            print(f"Truncated snapshot vectors from {snapshot.header['dim']} to {truncate} dimensions")
+
+        if isinstance(self.collection, NumpyIndex):
+            self.collection.replace_all(ids, documents, metadatas, vectors, persist=persist,
+                                        rows=mapped.rows if mapped else None,
+                                        postings=mapped.postings() if mapped else None)
+            self.collection.flush()
+        else:
+            if os.path.exists(marker_path) and self.collection.count() == snapshot.count:
+                with open(marker_path, 'r', encoding='utf-8') as file:
+                    if json.load(file) == fingerprint:
+                        print(f"Snapshot {path} already imported. Skipping...")
+                        self.ensure_text_indexes()
+                        return snapshot.header
+
+            snapshot_ids = set(ids)
+            stale = [doc_id for doc_id in self.collection.get(include=[])['ids'] if doc_id not in snapshot_ids]
+            if stale:
+                self.collection.delete(ids=stale)
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                self.collection.upsert(
+                    ids=ids[start:end],
+                    embeddings=np.asarray(vectors[start:end], dtype=np.float32).tolist(),
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end]
+                )
+            self.collection.flush()
+            os.makedirs(self.persist_directory, exist_ok=True)
+            with open(marker_path, 'w', encoding='utf-8') as file:
+                json.dump(fingerprint, file)
+
+        self.mapped_catalog = mapped
+        if mapped is not None:
+            self.lexical_index = mapped.lexical_index(self.lexical_index.k1, self.lexical_index.b,
+                                                      self.lexical_index.min_title_coverage)
+            self.title_index = mapped.title_index(self.title_index.fuzzy_threshold)
+        else:
+            self._new_text_indexes()
+            self.ensure_text_indexes()
+        self.catalog_version += 1
+        self._report_throughput("Snapshot import", len(ids), started)
+        return snapshot.header
+
+    def _snapshot_truncation(self, snapshot: IndexSnapshot) -> Optional[int]:
+        """Dimensions to cut a larger snapshot of the same model down to, or None if it fits as is"""
+        if snapshot.embedding_model == self.embedding_key:
+            return None
+        model, _, _ = snapshot.embedding_model.partition(":")
+        if model == self.embedding_model and self.embedding_dimensions \
+                and snapshot.header["dim"] > self.embedding_dimensions:
+            return self.embedding_dimensions
+        raise SnapshotError(f"Snapshot {snapshot.path} was built with '{snapshot.embedding_model}', "
+                            f"this store embeds with '{self.embedding_key}'")
+
+    def _token_batches(self, batches: Iterable[List[Dict]]) -> Iterator[List[Dict]]:
+        for batch in batches:
+            yield from self.make_batches(batch)
+
+    def _upsert_batches(self, batches: Iterable[List[Dict]], max_workers: int = 4) -> int:
+        """Embed batches concurrently and upsert them as they complete.
+
+        At most ``max_workers`` batches are in flight, so memory stays bounded
+        no matter how large the input stream is.
+        """
+        total = 0
+
+        def embed(batch):
+            return batch, self.get_embeddings([book['full_text'] for book in batch])
+
+        def write(future):
+            batch, embeddings = future.result()
+            self.collection.upsert(
+                embeddings=embeddings,
+                documents=[book['summary'] for book in batch],
+                metadatas=[book['metadata'] for book in batch],
+                ids=[book['id'] for book in batch]
+            )
+            for book in batch:
+                self._index_text(book['id'], book['title'], book['summary'])
+            return len(batch)
+
+        # Embedding requests run in parallel; Chroma writes stay on this thread
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            in_flight = set()
+            for batch in batches:
+                in_flight.add(executor.submit(embed, batch))
+                if len(in_flight) >= max_workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    total += sum(write(future) for future in done)
+            for future in as_completed(in_flight):
+                total += write(future)
+
+        return total
+
+    def _report_throughput(self, label: str, count: int, started: float):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed > 0 else 0.0
+        print(f"{label}: {count} books in {elapsed:.2f}s ({rate:.1f} books/sec)")
+
+    def search_books(self, query: str, n_results: int = 3, filters: Optional[Dict] = None) -> List[Dict]:
+        """Search for books, skipping the embedding call for exact title lookups.
+
+        ``filters`` (see ``build_where``) restrict the search to matching books
+        before any vector is scored.
+        """
+        books = self.lexical_match(query, n_results, filters)
+        if books is not None:
+            return books
 
-    def search_books(self, query: str, n_results: int = 3) -> List[Dict]:
-        """Search for books using semantic similarity"""
         query_embedding = self.get_embeddings([query])[0]
+        return self.hybrid_query(query, query_embedding, n_results, filters)
+
+    def search_books_batch(self, queries: List[str], n_results: int = 3,
+                           filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Search for several queries with one embedding request and one index query"""
+        results = [self.lexical_match(query, n_results, filters) for query in queries]
+        pending = [i for i, books in enumerate(results) if books is None]
+        if pending:
+            embeddings = self.get_embeddings([queries[i] for i in pending])
+            fused = self.hybrid_query_batch([queries[i] for i in pending], embeddings, n_results, filters)
+            for i, books in zip(pending, fused):
+                results[i] = books
+        return results
+
+    def lexical_match(self, query: str, n_results: int = 3, filters: Optional[Dict] = None) -> Optional[List[Dict]]:
+        """Answer from the BM25 index alone when the query is essentially a catalog title.
+
+        Returns None when there is no strong title match (or the titled book is
+        excluded by ``filters``) and vector search is needed.
+        """
+        if not self.hybrid_search:
+            return None
+        title_id = self.lexical_index.title_match(query)
+        if title_id is None:
+            return None
+
+        ranked = [title_id] + [doc_id for doc_id, _ in self.lexical_index.search(query, n_results + 1)
+                               if doc_id != title_id]
+        books = self._books_by_id(ranked[:n_results], build_where(filters))
+        if not books or books[0]['id'] != title_id:
+            return None
+        return books
+
+    def hybrid_query(self, query: str, query_embedding: List[float], n_results: int = 3,
+                     filters: Optional[Dict] = None) -> List[Dict]:
+        """Fuse vector and BM25 results for one query"""
+        return self.hybrid_query_batch([query], [query_embedding], n_results, filters)[0]
+
+    def hybrid_query_batch(self, queries: List[str], query_embeddings: List[List[float]],
+                           n_results: int = 3, filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Fuse vector and BM25 results with reciprocal-rank fusion"""
+        where = build_where(filters)
+        if not self.hybrid_search:
+            return self._query_where(query_embeddings, n_results, where)
+
+        # Over-fetch from both retrievers so fusion has candidates to reorder
+        depth = max(n_results * 3, 10)
+        vector_results = self._query_where(query_embeddings, depth, where)
 
+        fused_results = []
+        for query, vector_books in zip(queries, vector_results):
+            lexical_ids = [doc_id for doc_id, _ in self.lexical_index.search(query, depth)]
+            if lexical_ids and where:
+                # BM25 has no metadata; keep its hits that pass the filter
+                allowed = set(self.collection.get(ids=lexical_ids, where=where, include=[])['ids'])
+                lexical_ids = [doc_id for doc_id in lexical_ids if doc_id in allowed]
+            if not lexical_ids:
+                fused_results.append(vector_books[:n_results])
+                continue
+
+            by_id = {book['id']: book for book in vector_books}
+            fused = reciprocal_rank_fusion([[book['id'] for book in vector_books], lexical_ids])[:n_results]
+            missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+            if missing:
+                by_id.update({book['id']: book for book in self._books_by_id(missing)})
+            fused_results.append([dict(by_id[doc_id], score=score) for doc_id, score in fused if doc_id in by_id])
+
+        return fused_results
+
+    @staticmethod
+    def _make_result(doc_id: str, metadata: Dict, document: str, distance: Optional[float]) -> Dict:
+        book = {'id': doc_id, 'title': metadata['title'], 'summary': document, 'distance': distance}
+        book.update({name: metadata[name] for name in CATALOG_FIELDS if name in metadata})
+        return book
+
+    def _books_by_id(self, ids: List[str], where: Optional[Dict] = None) -> List[Dict]:
+        """Fetch books from the collection, preserving the order of ids"""
+        if not ids:
+            return []
+        results = self.collection.get(ids=ids, include=['metadatas', 'documents'], where=where)
+        by_id = {
+            doc_id: self._make_result(doc_id, metadata, document, None)
+            for doc_id, metadata, document in zip(results['ids'], results['metadatas'], results['documents'])
+        }
+        return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+    def query_collection(self, query_embedding: List[float], n_results: int = 3,
+                         filters: Optional[Dict] = None) -> List[Dict]:
+        """Run a nearest-neighbour query for an already computed embedding"""
+        return self.query_collection_batch([query_embedding], n_results, filters)[0]
+
+    def query_collection_batch(self, query_embeddings: List[List[float]], n_results: int = 3,
+                               filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Run nearest-neighbour queries for several embeddings at once"""
+        return self._query_where(query_embeddings, n_results, build_where(filters))
+
+    def _query_where(self, query_embeddings: List[List[float]], n_results: int,
+                     where: Optional[Dict]) -> List[List[Dict]]:
         results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where
         )
 
-        books_found = []
-        for i in range(len(results['ids'][0])):
-            books_found.append({
-                'title': results['metadatas'][0][i]['title'],
-                'summary': results['documents'][0][i],
-                'distance': results['distances'][0][i] if 'distances' in results else 0
-            })
+        all_books = []
+        for q in range(len(results['ids'])):
+            books_found = []
+            for i in range(len(results['ids'][q])):
+                books_found.append(self._make_result(
+                    results['ids'][q][i],
+                    results['metadatas'][q][i],
+                    results['documents'][q][i],
+                    results['distances'][q][i] if results.get('distances') else 0
+                ))
+            all_books.append(books_found)
+
+        return all_books
+
+
+class AsyncBookVectorStore:
+    """Async front-end for a BookVectorStore.
+
+    Embeddings are fetched with AsyncOpenAI and blocking Chroma/SQLite calls run
+    in a bounded thread pool, so searches never block the event loop. The
+    collection and embedding cache are shared with the wrapped store.
+    """
+
+    def __init__(self, vector_store: BookVectorStore, openai_api_key: str, max_workers: int = 8,
+                 batch_wait_ms: Optional[float] = None, max_batch_size: Optional[int] = None):
+        self.vector_store = vector_store
+        self.gateway = get_gateway(openai_api_key)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="index-query")
+
+        # Query embeddings from concurrent requests are coalesced; a zero wait disables it
+        if batch_wait_ms is None:
+            batch_wait_ms = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+        self.batcher = EmbeddingBatcher(self._fetch_embeddings, batch_wait_ms, max_batch_size) \
+            if batch_wait_ms > 0 else None
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def _fetch_embeddings(self, texts: List[str]) -> List[List[float]]:
+        response = await self.gateway.aembeddings(input=texts, **self.vector_store.embedding_params())
+        return [data.embedding for data in response.data]
+
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings from the shared cache, falling back to AsyncOpenAI for misses"""
+        store = self.vector_store
+        embeddings = await self._run_blocking(store.embedding_cache.get_many, store.embedding_key, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+
+        missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+        if self.batcher is not None and len(missing_texts) < self.batcher.max_batch_size:
+            fetched = await self.batcher.embed_many(missing_texts)
+        else:
+            fetched = await self._fetch_embeddings(missing_texts)
+        await self._run_blocking(store.embedding_cache.put_many, store.embedding_key, missing_texts, fetched)
+
+        by_text = dict(zip(missing_texts, fetched))
+        for i in missing:
+            embeddings[i] = by_text[texts[i]]
+        return embeddings
+
+    async def search_books(self, query: str, n_results: int = 3, filters: Optional[Dict] = None) -> List[Dict]:
+        """Search for books, skipping the embedding call for exact title lookups"""
+        books = await self.lexical_match(query, n_results, filters)
+        if books is not None:
+            return books
+
+        query_embedding = (await self.get_embeddings([query]))[0]
+        return await self.hybrid_query(query, query_embedding, n_results, filters)
+
+    async def lexical_match(self, query: str, n_results: int = 3,
+                            filters: Optional[Dict] = None) -> Optional[List[Dict]]:
+        """BM25-only answer for exact title lookups, or None"""
+        return await self._run_blocking(self.vector_store.lexical_match, query, n_results, filters)
+
+    async def hybrid_query(self, query: str, query_embedding: List[float], n_results: int = 3,
+                           filters: Optional[Dict] = None) -> List[Dict]:
+        """Fuse vector and BM25 results off the event loop"""
+        return await self._run_blocking(self.vector_store.hybrid_query, query, query_embedding, n_results, filters)
+
+    async def lexical_match_batch(self, queries: List[str], n_results: int = 3,
+                                  filters: Optional[Dict] = None) -> List[Optional[List[Dict]]]:
+        """``lexical_match`` for several queries in one hop off the event loop"""
+        store = self.vector_store
+        return await self._run_blocking(lambda: [store.lexical_match(query, n_results, filters) for query in queries])
+
+    async def hybrid_query_batch(self, queries: List[str], query_embeddings: List[List[float]], n_results: int = 3,
+                                 filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Fuse vector and BM25 results for several queries with one index query"""
+        return await self._run_blocking(self.vector_store.hybrid_query_batch, queries, query_embeddings, n_results,
+                                        filters)
+
+    async def query_collection(self, query_embedding: List[float], n_results: int = 3,
+                               filters: Optional[Dict] = None) -> List[Dict]:
+        """Run a nearest-neighbour query off the event loop"""
+        return await self._run_blocking(self.vector_store.query_collection, query_embedding, n_results, filters)
 
-        return books_found
\ No newline at end of file
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The application modules are imported flat from src/ (and backend.py from the root), as main.py does
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "src"))
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+from startup import StartupTracker
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(backend, "startup", StartupTracker())
+    # Without entering the client, the lifespan (and warm-up) does not run
+    return TestClient(backend.app)
+
+
+def test_healthz_is_alive_while_starting(client):
+    response = client.get("/healthz")
+    assert response.status_code == 200 and response.json() == {"status": "alive"}
+    assert client.get("/readyz").status_code == 503
+
+
+def test_healthz_fails_once_warm_up_has_failed(client):
+    backend.startup.fail(RuntimeError("catalog unreadable"))
+    response = client.get("/healthz")
+    assert response.status_code == 503
+    assert response.json() == {"status": "failed", "error": "catalog unreadable"}
+
+    chat = client.post("/chat", json={"message": "Ce este 1984?"})
+    assert chat.status_code == 503 and "Retry-After" not in chat.headers
+
+
+def test_chat_sessions_are_created_on_request():
+    assert backend.ChatMessage(message="hi").conversation() is None
+    assert backend.ChatMessage(message="hi", session_id="abc", new_session=True).conversation() == "abc"
+    assert len(backend.ChatMessage(message="hi", new_session=True).conversation()) == 32
+
+
+class EchoRunner:
+    """Answers each item with its query, or its parse error"""
+    concurrency = 2
+
+    def __init__(self, async_librarian):
+        pass
+
+    async def run(self, items, emit):
+        async for item in items:
+            await emit({"id": item["id"], "error": item["error"]} if "error" in item
+                       else {"id": item["id"], "answer": item["query"]})
+
+
+@pytest.fixture
+def batch_client(client, monkeypatch):
+    backend.startup.ready()
+    monkeypatch.setattr(backend, "BatchRunner", EchoRunner)
+    monkeypatch.setattr(backend, "BATCH_TOKEN", None)
+    return client
+
+
+def batch_body(count):
+    return "".join(f'{{"id": "{i}", "query": "q{i}"}}\n' for i in range(count))
+
+
+def test_batch_is_open_like_chat(batch_client):
+    response = batch_client.post("/chat/batch", content=batch_body(3) + "not json")
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record.get("answer") for record in records] == ["q0", "q1", "q2", None]
+    assert records[3]["error"].startswith("Invalid JSON on line 4")
+
+
+def test_batch_token_is_opt_in(batch_client, monkeypatch):
+    monkeypatch.setattr(backend, "BATCH_TOKEN", "secret")
+    assert batch_client.post("/chat/batch", content=batch_body(1)).status_code == 401
+    response = batch_client.post("/chat/batch", content=batch_body(1), headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+
+
+def test_batch_rejects_an_empty_body(batch_client):
+    assert batch_client.post("/chat/batch", content="\n\n").status_code == 400
+
+
+def test_batch_stops_reading_at_the_limit(batch_client, monkeypatch):
+    monkeypatch.setattr(backend, "BATCH_MAX_QUERIES", 2)
+    records = [json.loads(line) for line in batch_client.post("/chat/batch", content=batch_body(5)).text.splitlines()]
+    assert [record["id"] for record in records if "answer" in record] == ["0", "1"]
+    assert records[-1] == {"error": "At most 2 queries per batch; the rest of the body was not read"}
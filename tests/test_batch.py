@@ -0,0 +1,161 @@
+import asyncio
+import json
+
+import pytest
+
+from batch import BatchRunner, aparse_items, parse_items, read_checkpoint, read_lines
+from intent_router import IntentRouter
+from title_index import TitleIndex
+
+
+def write_lines(path, records, torn: str = ""):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records) + torn, encoding="utf-8")
+
+
+def test_parse_items_reports_bad_lines():
+    items = list(parse_items([
+        '{"id": "a", "query": "dragons"}',
+        '',
+        '{"message": "spies", "filters": {"language": "en"}}',
+        'not json',
+        '{"id": "b"}',
+        '{"id": "c", "query": "x", "filters": "en"}',
+    ]))
+    assert [item["id"] for item in items] == ["a", "3", "4", "b", "c"]
+    assert items[1]["query"] == "spies" and items[1]["filters"] == {"language": "en"}
+    assert "Invalid JSON on line 4" in items[2]["error"]
+    assert items[3]["error"] == "Missing 'query'"
+    assert items[4]["error"] == "'filters' must be an object"
+
+
+def test_missing_checkpoint_is_empty(tmp_path):
+    assert read_checkpoint(str(tmp_path / "results.jsonl")) == set()
+
+
+def test_checkpoint_truncates_a_torn_last_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    write_lines(path, [
+        {"id": "1", "answer": "ok"},
+        {"id": "2", "error": "RateLimitError"},
+        {"id": "3", "answer": "ok"},
+    ], torn='{"id": "4", "answ')
+
+    assert read_checkpoint(str(path)) == {"1", "3"}
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    assert len(lines) == 3 and all(line.endswith("\n") for line in lines)
+
+    # Appending after the cut keeps every line parseable, and the last line for an id wins
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps({"id": "2", "answer": "retried"}) + "\n")
+        file.write(json.dumps({"id": "4", "answer": "ok"}) + "\n")
+    assert read_checkpoint(str(path)) == {"1", "2", "3", "4"}
+
+
+class FakeStore:
+    async def lexical_match_batch(self, queries, n_results, filters):
+        return [None] * len(queries)
+
+    async def get_embeddings(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+    async def hybrid_query_batch(self, queries, embeddings, n_results, filters):
+        return [[{"title": f"Book for {query}"}] for query in queries]
+
+
+class FakeLibrarian:
+    def __init__(self):
+        self.router = IntentRouter(TitleIndex())
+
+    def cached_answer(self, embedding, history, filters):
+        return None
+
+
+class FakeAsyncLibrarian:
+    def __init__(self):
+        self.librarian = FakeLibrarian()
+        self.vector_store = FakeStore()
+        self.asked = []
+
+    async def recommend(self, query, books, history, query_embedding=None, filters=None):
+        self.asked.append(query)
+        if query == "fails":
+            raise RuntimeError("upstream error")
+        return f"Try {books[0]['title']}"
+
+
+@pytest.fixture
+def no_content_filter(monkeypatch):
+    import tools
+    monkeypatch.setattr(tools, "filter_inappropriate_language", lambda text: (True, text))
+
+
+def test_resume_answers_only_what_is_left(tmp_path, no_content_filter):
+    queries = [{"id": str(i), "query": f"query {i}"} for i in range(6)] + [{"id": "x", "query": "fails"}]
+    source = [json.dumps(query) for query in queries]
+    output = tmp_path / "results.jsonl"
+    write_lines(output, [{"id": "0", "answer": "a"}, {"id": "1", "answer": "b"}, {"id": "2", "error": "e"}],
+                torn='{"id": "3"')
+
+    done = read_checkpoint(str(output))
+    items = (item for item in parse_items(source) if item["id"] not in done)
+    librarian = FakeAsyncLibrarian()
+    records = []
+
+    async def emit(record):
+        records.append(record)
+
+    counts = asyncio.run(BatchRunner(librarian, concurrency=2, chunk_size=3).run(items, emit))
+
+    assert sorted(librarian.asked) == ["fails", "query 2", "query 3", "query 4", "query 5"]
+    assert counts == {"answered": 4, "failed": 1}
+    by_id = {record["id"]: record for record in records}
+    assert by_id["4"]["answer"] == "Try Book for query 4" and by_id["4"]["source"] == "completion"
+    assert by_id["x"]["error"] == "RuntimeError: upstream error"
+
+
+def test_async_input_is_read_line_by_line(no_content_filter):
+    async def pieces():
+        # Lines split across reads, as a streamed request body arrives
+        yield b'{"id": "a", "query": "dra'
+        yield b'gons"}\n{"id": "b", "query": "spies"}\nnot '
+        yield b'json'
+
+    librarian = FakeAsyncLibrarian()
+    records = []
+
+    async def emit(record):
+        records.append(record)
+
+    counts = asyncio.run(BatchRunner(librarian, chunk_size=2).run(aparse_items(read_lines(pieces())), emit))
+
+    assert sorted(librarian.asked) == ["dragons", "spies"]
+    assert counts == {"answered": 2, "failed": 1}
+    assert {record["id"]: record.get("error") for record in records}["3"] == "Invalid JSON on line 3: Expecting value"
+
+
+class FailingSearchStore(FakeStore):
+    async def hybrid_query_batch(self, queries, embeddings, n_results, filters):
+        if filters:
+            raise ConnectionError("index unavailable")
+        return await super().hybrid_query_batch(queries, embeddings, n_results, filters)
+
+
+def test_retrieval_failure_fails_only_the_items_waiting_on_it(no_content_filter):
+    source = [
+        'not json',
+        '{"id": "plain", "query": "dragons"}',
+        '{"id": "filtered", "query": "spies", "filters": {"language": "en"}}',
+    ]
+    librarian = FakeAsyncLibrarian()
+    librarian.vector_store = FailingSearchStore()
+    records = []
+
+    async def emit(record):
+        records.append(record)
+
+    asyncio.run(BatchRunner(librarian).run(parse_items(source), emit))
+
+    by_id = {record["id"]: record for record in records}
+    assert by_id["1"]["error"].startswith("Invalid JSON on line 1")
+    assert by_id["plain"]["answer"] == "Try Book for dragons"
+    assert by_id["filtered"]["error"] == "Retrieval failed: ConnectionError: index unavailable"
@@ -0,0 +1,88 @@
+import asyncio
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+import chatbot
+from chatbot import AsyncSmartLibrarian, SmartLibrarian
+from context_builder import ContextBuilder
+from instrumentation import ANSWERS
+from model_router import ModelRouter
+
+BOOKS = [{"title": "Dune", "summary": "Desert planet.", "metadata": {}, "distance": 0.1}]
+
+
+class FakeGateway:
+    """Tool-selection round answers with ``first``; streams yield the words of ``final``"""
+
+    def __init__(self, first, final="Read Dune today"):
+        self.first, self.final = first, final
+        self.calls = []
+
+    async def achat_completion(self, **params):
+        self.calls.append(("complete", params))
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=self.first, finish_reason="stop")])
+
+    async def astream_chat_completion(self, **params):
+        self.calls.append(("stream", params))
+        for word in self.final.split():
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "),
+                                                                       finish_reason=None)])
+
+
+class FakeStore:
+    async def lexical_match(self, user_input, n_results=3, filters=None):
+        return BOOKS
+
+
+def tool_call(title):
+    return SimpleNamespace(id="call-1", type="function",
+                           function=SimpleNamespace(name="get_summary_by_title", arguments=f'{{"title": "{title}"}}'))
+
+
+def make_librarian(gateway):
+    librarian = SmartLibrarian.__new__(SmartLibrarian)
+    librarian.system_prompt = "prompt"
+    librarian.tools = [chatbot.get_summary_tool_definition]
+    librarian.context_builder = ContextBuilder()
+    librarian.model_router = ModelRouter({}, enabled=False)
+    librarian.router = SimpleNamespace(mode="completion", route=lambda *args: SimpleNamespace(name="search"))
+    async_librarian = AsyncSmartLibrarian.__new__(AsyncSmartLibrarian)
+    async_librarian.librarian = librarian
+    async_librarian.gateway = gateway
+    async_librarian.vector_store = FakeStore()
+    async_librarian.ttft_samples = deque(maxlen=10)
+    return async_librarian
+
+
+@pytest.fixture
+def no_content_filter(monkeypatch):
+    monkeypatch.setattr(chatbot, "filter_inappropriate_language", lambda text: (True, text))
+    monkeypatch.setattr(chatbot, "get_summary_by_title", lambda title: f"Summary of {title}")
+
+
+async def collect(tokens):
+    return [token async for token in tokens]
+
+
+def test_stream_sends_only_the_final_answer(no_content_filter):
+    gateway = FakeGateway(SimpleNamespace(content="Let me check that book.", tool_calls=[tool_call("Dune")]))
+    before = ANSWERS.value(source="completion")
+    tokens = asyncio.run(collect(make_librarian(gateway).stream_user_input("a book about deserts")))
+
+    assert "".join(tokens) == "Read Dune today "
+    (first_kind, first), (second_kind, second) = gateway.calls
+    assert first_kind == "complete" and first["tools"]
+    assert second_kind == "stream" and "tools" not in second
+    assert second["messages"][-1] == {"tool_call_id": "call-1", "role": "tool", "name": "get_summary_by_title",
+                                      "content": "Summary of Dune"}
+    assert ANSWERS.value(source="completion") == before + 1
+
+
+def test_stream_without_tool_call_emits_the_first_answer(no_content_filter):
+    gateway = FakeGateway(SimpleNamespace(content="Try Dune.", tool_calls=None))
+    tokens = asyncio.run(collect(make_librarian(gateway).stream_user_input("a book about deserts")))
+
+    assert tokens == ["Try Dune."]
+    assert [kind for kind, _ in gateway.calls] == ["complete"]
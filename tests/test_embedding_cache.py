@@ -0,0 +1,104 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import embedding_cache
+from embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-3-small"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(embedding_cache.time, "time", clock)
+    return clock
+
+
+def vector(seed: int):
+    return [float(seed), 0.5, -0.25]
+
+
+def disk_keys(path) -> set:
+    with sqlite3.connect(path) as conn:
+        return {row[0] for row in conn.execute("SELECT key FROM embeddings")}
+
+
+def test_round_trip_through_memory_and_disk(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(path)
+    cache.put_many(MODEL, ["a", "b"], [vector(1), vector(2)])
+    assert cache.get_many(MODEL, ["a", "x", "b"]) == [vector(1), None, vector(2)]
+    assert isinstance(cache._memory[cache.make_key(MODEL, "a")][0], np.ndarray)
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    assert reopened.get_many(MODEL, ["b"]) == [vector(2)]
+    assert reopened.get_many("other-model", ["b"]) == [None]
+    assert reopened.stats()["disk_hits"] == 1
+
+
+def test_evicts_least_recently_used_down_to_low_water(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(path, memory_items=100, max_disk_items=10, evict_to=0.5)
+    for i in range(10):
+        clock.now += 1
+        cache.put_many(MODEL, [f"t{i}"], [vector(i)])
+    assert len(disk_keys(path)) == 10
+
+    # A hit from memory counts as an access once written with the next insert
+    clock.now += 1
+    cache.get_many(MODEL, ["t0", "t1"])
+    clock.now += 1
+    cache.put_many(MODEL, ["t10"], [vector(10)])
+
+    kept = disk_keys(path)
+    assert len(kept) == 5
+    expected = {cache.make_key(MODEL, text) for text in ("t0", "t1", "t8", "t9", "t10")}
+    assert kept == expected
+
+
+def test_no_sweep_until_the_estimate_passes_the_limit(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_disk_items=10, evict_to=0.5)
+    sweeps = []
+    evict = cache._evict
+    monkeypatch.setattr(cache, "_evict", lambda: (sweeps.append(1), evict()))
+    for i in range(10):
+        cache.put_many(MODEL, [f"t{i}"], [vector(i)])
+    assert not sweeps
+    cache.put_many(MODEL, ["t10"], [vector(10)])
+    assert len(sweeps) == 1
+    # Trimmed to 5 rows, so the next sweep is 6 inserts away
+    for i in range(11, 16):
+        cache.put_many(MODEL, [f"t{i}"], [vector(i)])
+    assert len(sweeps) == 1
+
+
+def test_disk_hits_do_not_write(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    EmbeddingCache(path).put_many(MODEL, ["a"], [vector(1)])
+    cache = EmbeddingCache(path)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    assert cache.get_many(MODEL, ["a"]) == [vector(1)]
+    assert all(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+
+
+def test_expired_entries_are_misses_and_swept(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(path, max_disk_items=2, ttl_seconds=60)
+    cache.put_many(MODEL, ["old"], [vector(1)])
+    clock.now += 61
+    assert cache.get_many(MODEL, ["old"]) == [None]
+
+    cache.put_many(MODEL, ["a", "b"], [vector(2), vector(3)])
+    assert disk_keys(path) == {cache.make_key(MODEL, "a"), cache.make_key(MODEL, "b")}
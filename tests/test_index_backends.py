@@ -0,0 +1,29 @@
+import numpy as np
+
+from index_backends import ChromaIndex, NumpyIndex
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.deletes = []
+
+    def delete(self, ids):
+        self.deletes.append(len(ids))
+
+
+def test_chroma_deletes_are_split_under_its_batch_limit():
+    collection = RecordingCollection()
+    ChromaIndex(collection).delete([f"id{i}" for i in range(12000)])
+    assert collection.deletes == [5000, 5000, 2000]
+
+
+def test_numpy_delete_keeps_rows_aligned(tmp_path):
+    index = NumpyIndex(str(tmp_path / "index"))
+    ids = [f"id{i}" for i in range(6)]
+    vectors = np.eye(6, dtype=np.float32)
+    index.upsert(ids, vectors, [f"doc {i}" for i in range(6)], [{"title": f"T{i}"} for i in range(6)])
+    index.delete(["id1", "id4", "missing"])
+
+    assert index.count() == 4
+    result = index.query(vectors[[5]], n_results=1)
+    assert result["ids"] == [["id5"]] and result["documents"] == [["doc 5"]]
@@ -0,0 +1,201 @@
+import json
+import os
+import signal
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from index_backends import MetadataPostings
+from index_snapshot import IndexSnapshot, SnapshotError, write_snapshot
+from lexical_index import BM25Index
+from title_index import TitleIndex
+from shared_index import (CURRENT_FILE, SWAP_SIGNAL, SnapshotFollower, SnapshotPublisher, read_current,
+                          wait_for_snapshot)
+
+IDS = ["book_a", "book_b", "book_c"]
+DOCUMENTS = ["Summary A", "Summary B, ăîșț", "Summary C"]
+METADATAS = [
+    {"title": "A", "content_hash": "h1", "author": "X", "author_key": "x", "year": 1949},
+    {"title": "B", "content_hash": "h2"},
+    {"title": "C", "content_hash": "h3", "genre": "fantasy"},
+]
+
+
+def vectors(dim: int = 8) -> np.ndarray:
+    return np.random.default_rng(0).standard_normal((len(IDS), dim)).astype(np.float32)
+
+
+def write(path, dtype: str = "float32"):
+    # Two pages, as exported from a paged index
+    matrix = vectors()
+    pages = [(IDS[:2], matrix[:2], DOCUMENTS[:2], METADATAS[:2]), (IDS[2:], matrix[2:], DOCUMENTS[2:], METADATAS[2:])]
+    return write_snapshot(str(path), pages, "text-embedding-3-small", dtype=dtype)
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 1e-6), ("float16", 1e-3)])
+def test_round_trip(tmp_path, dtype, tolerance):
+    path = tmp_path / "books.snap"
+    header = write(path, dtype)
+    snapshot = IndexSnapshot(str(path))
+
+    assert snapshot.header == header
+    assert snapshot.count == 3 and header["dim"] == 8 and header["dtype"] == dtype
+    assert snapshot.embedding_model == "text-embedding-3-small"
+
+    matrix = vectors()
+    expected = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    loaded = snapshot.vectors()
+    assert loaded.dtype == np.dtype(dtype)
+    assert np.allclose(np.asarray(loaded, dtype=np.float32), expected, atol=tolerance)
+
+    ids, documents, metadatas = snapshot.catalog()
+    assert ids == IDS
+    assert documents == DOCUMENTS
+    assert metadatas == METADATAS
+
+
+BOOKS = [
+    ("1984", "A totalitarian state keeps its citizens under constant surveillance.", "dystopia", 1949),
+    ("Freedom", "A family drama about liberty and its costs.", "drama", 2010),
+    ("The Hobbit", "Bilbo Baggins joins a company of dwarves on a quest.", "fantasy", 1937),
+    ("The Great Gatsby", "A mysterious millionaire throws lavish parties.", "drama", 1925),
+    ("Brave New World", "A society engineered for stability, where freedom and social control collide.",
+     "dystopia", 1932),
+    ("Ion", "Un țăran ardelean și pământul lui.", "drama", 1920),
+]
+
+
+def test_mapped_catalog_matches_the_in_memory_indexes(tmp_path):
+    ids = [f"book_{i}" for i in range(len(BOOKS))]
+    documents = [summary for _, summary, _, _ in BOOKS]
+    metadatas = [{"title": title, "content_hash": f"h{i}", "genre": genre, "year": year}
+                 for i, (title, _, genre, year) in enumerate(BOOKS)]
+    matrix = np.random.default_rng(1).standard_normal((len(BOOKS), 8)).astype(np.float32)
+    write_snapshot(str(tmp_path / "books.snap"), [(ids, matrix, documents, metadatas)], "text-embedding-3-small")
+    mapped = IndexSnapshot(str(tmp_path / "books.snap")).mapped_catalog()
+
+    assert list(mapped.ids) == ids and list(mapped.documents) == documents and list(mapped.metadatas) == metadatas
+    assert mapped.rows["book_3"] == 3 and "book_9" not in mapped.rows
+
+    lexical, titles = BM25Index(), TitleIndex()
+    for doc_id, document, metadata in zip(ids, documents, metadatas):
+        lexical.add(doc_id, metadata["title"], document)
+        titles.add(doc_id, metadata["title"], document)
+    mapped_lexical, mapped_titles = mapped.lexical_index(), mapped.title_index()
+
+    assert len(mapped_lexical) == len(mapped_titles) == len(BOOKS)
+    for query in ("freedom and social control", "drama about liberty", "dwarves quest", "nothing matches"):
+        expected = dict(lexical.search(query, k=3))
+        found = dict(mapped_lexical.search(query, k=3))
+        assert found.keys() == expected.keys()
+        assert all(found[doc_id] == pytest.approx(score) for doc_id, score in expected.items())
+    for query in ("Tell me about 1984", "the great gatsby", "I want a book about freedom and social control"):
+        assert mapped_lexical.title_match(query) == lexical.title_match(query)
+    for title in ("The Hobbit", "the hobbit", "The Hobit", "Brave New Wrld", "Unknown"):
+        assert mapped_titles.resolve(title) == titles.resolve(title)
+    assert [title for title, _ in mapped_titles.similar("Brave World", k=2)] \
+        == [title for title, _ in titles.similar("Brave World", k=2)]
+
+    postings = MetadataPostings(metadatas)
+    for where in ({"genre": "drama"}, {"genre": {"$in": ["fantasy", "dystopia"]}}, {"genre": {"$ne": "drama"}},
+                  {"$and": [{"genre": "drama"}, {"year": {"$gte": 1925}}]}, {"year": {"$lt": 1930}},
+                  {"genre": "missing"}, {"title": "Ion"}):
+        assert mapped.postings().rows(where).tolist() == (postings.rows(where).tolist()
+                                                          if "title" not in where else [])
+
+
+def test_vectors_are_aligned_memory_map(tmp_path):
+    path = tmp_path / "books.snap"
+    header = write(path)
+    assert header["vectors_offset"] % 64 == 0
+    assert isinstance(IndexSnapshot(str(path)).vectors(), np.memmap)
+
+
+def test_corrupt_tables_fail_verification(tmp_path):
+    path = tmp_path / "books.snap"
+    header = write(path)
+    with open(path, "r+b") as file:
+        file.seek(header["tables"]["documents.data"]["offset"])
+        file.write(b"X")
+    with pytest.raises(SnapshotError, match="tables"):
+        IndexSnapshot(str(path))
+
+
+def test_corrupt_catalog_fails_verification(tmp_path):
+    path = tmp_path / "books.snap"
+    header = write(path)
+    with open(path, "r+b") as file:
+        file.seek(header["catalog_offset"] + 10)
+        byte = file.read(1)
+        file.seek(-1, os.SEEK_CUR)
+        file.write(bytes([byte[0] ^ 0xFF]))
+
+    with pytest.raises(SnapshotError, match="catalog checksum"):
+        IndexSnapshot(str(path))
+    # Readers that trust the publisher skip the hashing
+    assert IndexSnapshot(str(path), verify=False).count == 3
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "books.snap"
+    path.write_bytes(b"not a snapshot at all, just some bytes")
+    with pytest.raises(SnapshotError):
+        IndexSnapshot(str(path))
+
+
+class ExportingStore:
+    """Stands in for BookVectorStore.export_snapshot"""
+
+    def __init__(self, corrupt: bool = False):
+        self.corrupt = corrupt
+
+    def export_snapshot(self, path, dtype="float32"):
+        header = write(path, dtype)
+        if self.corrupt:
+            with open(path, "r+b") as file:
+                file.seek(header["vectors_offset"])
+                file.write(b"\xff" * 4)
+        return header
+
+
+def test_publisher_verifies_before_pointing_current(tmp_path):
+    publisher = SnapshotPublisher(str(tmp_path))
+    pointer = publisher.publish(ExportingStore())
+    assert pointer["version"] == 1 and pointer["count"] == 3
+    assert read_current(str(tmp_path))["snapshot"] == "books-000001.snap"
+
+    with pytest.raises(SnapshotError):
+        publisher.publish(ExportingStore(corrupt=True))
+    # The corrupt version is dropped and workers keep following version 1
+    assert not (tmp_path / "books-000002.snap").exists()
+    with open(tmp_path / CURRENT_FILE) as file:
+        assert json.load(file)["version"] == 1
+
+
+@pytest.mark.skipif(SWAP_SIGNAL is None, reason="needs SIGUSR1")
+def test_worker_waits_for_the_first_publish(tmp_path):
+    follower = SnapshotFollower(str(tmp_path), on_change=lambda path: None, poll_seconds=60).register()
+    previous = signal.getsignal(SWAP_SIGNAL)
+    follower.install_signal_handler()
+    waited = {}
+
+    def wait():
+        started = time.perf_counter()
+        waited["pointer"] = wait_for_snapshot(str(tmp_path), follower.poll_seconds, follower.wake_event)
+        waited["seconds"] = time.perf_counter() - started
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    time.sleep(0.1)
+    assert thread.is_alive()
+
+    try:
+        # The publish signals this process, which is registered as a worker
+        SnapshotPublisher(str(tmp_path)).publish(ExportingStore())
+        thread.join(5)
+    finally:
+        follower.stop()
+        signal.signal(SWAP_SIGNAL, previous)
+    assert waited["pointer"]["version"] == 1 and waited["seconds"] < 5
@@ -0,0 +1,36 @@
+import pytest
+
+from intent_router import ROUTE_DIRECT_TITLE, ROUTE_FULL, IntentRouter
+from title_index import TitleIndex
+
+
+@pytest.fixture
+def router():
+    titles = TitleIndex()
+    titles.add("1984", "1984", "Big Brother is watching.")
+    titles.add("dune", "Dune", "Spice and sandworms.")
+    titles.add("it", "It", "A clown in the sewers.")
+    return IntentRouter(titles)
+
+
+@pytest.mark.parametrize("query, title", [
+    ("Ce este 1984?", "1984"),
+    ("What is Dune?", "Dune"),
+    ("What is \"It\"?", "It"),
+    ("Ce este „It”?", "It"),
+])
+def test_direct_title_questions(router, query, title):
+    route = router.route(query)
+    assert (route.name, route.title) == (ROUTE_DIRECT_TITLE, title)
+
+
+@pytest.mark.parametrize("query", ["What is it?", "Ce e it?", "Vreau o carte despre libertate"])
+def test_other_questions_take_the_full_route(router, query):
+    assert router.route(query).name == ROUTE_FULL
+
+
+def test_follow_ups_and_filtered_searches_take_the_full_route(router):
+    history = [{"role": "user", "content": "Ceva distopic"}, {"role": "assistant", "content": "1984"}]
+    assert router.route("What is Dune?", history=history).name == ROUTE_FULL
+    assert router.route("What is Dune?", filters={"language": "ro"}).name == ROUTE_FULL
+    assert router.stats() == {ROUTE_FULL: 2}
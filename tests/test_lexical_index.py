@@ -0,0 +1,42 @@
+import pytest
+
+from lexical_index import BM25Index
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add("1984", "1984", "A totalitarian state keeps its citizens under constant surveillance.")
+    index.add("freedom", "Freedom", "A family drama about liberty and its costs.")
+    index.add("hobbit", "The Hobbit", "Bilbo Baggins joins a company of dwarves on a quest.")
+    index.add("gatsby", "The Great Gatsby", "A mysterious millionaire throws lavish parties.")
+    index.add("it", "It", "A shape-shifting horror preys on the children of a small town.")
+    index.add("brave", "Brave New World", "A society engineered for stability and pleasure, where freedom and social control collide.")
+    return index
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("1984", "1984"),
+    ("Tell me about 1984", "1984"),
+    ("What is The Hobbit about?", "hobbit"),
+    ("the great gatsby", "gatsby"),
+    ("Ce știi despre Brave New World?", "brave"),
+])
+def test_title_lookups_match(index, query, expected):
+    assert index.title_match(query) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "I want a book about freedom and social control",
+    "books published around 1984 about surveillance",
+    "something like The Great Gatsby but set in modern Paris",
+    "What is it?",
+])
+def test_titles_inside_longer_requests_do_not_match(index, query):
+    assert index.title_match(query) is None
+
+
+def test_coverage_threshold_is_configurable(index):
+    loose = BM25Index(min_title_coverage=0.2)
+    loose.add("1984", "1984", "Surveillance.")
+    assert loose.title_match("books published around 1984 about surveillance") == "1984"
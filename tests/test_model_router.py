@@ -0,0 +1,76 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import model_router
+from model_router import (COMPLEXITY_SIMPLE, ROLE_FINAL_ANSWER, ROLE_TOOL_SELECTION, TIER_LARGE, TIER_SMALL,
+                          ModelRouter)
+
+MODELS = {TIER_SMALL: "gpt-4o-mini", TIER_LARGE: "gpt-4o"}
+
+
+def test_unrouted_calls_keep_the_original_model(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTING", "0")
+    monkeypatch.delenv("MODEL_UNROUTED", raising=False)
+    choice = ModelRouter.from_env().choose(ROLE_FINAL_ANSWER)
+    assert (choice.model, choice.max_tokens, choice.reason, choice.fallback) == ("gpt-4", 1500, "unrouted", None)
+
+    monkeypatch.setenv("MODEL_UNROUTED", "gpt-4o")
+    assert ModelRouter.from_env().choose(ROLE_FINAL_ANSWER).model == "gpt-4o"
+
+
+def test_routed_simple_tool_selection_uses_small_model():
+    choice = ModelRouter(MODELS).choose(ROLE_TOOL_SELECTION, COMPLEXITY_SIMPLE)
+    assert choice.model == "gpt-4o-mini" and choice.fallback == "gpt-4o"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def chunk(text, finish_reason=None):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text),
+                                                                finish_reason=finish_reason)])
+
+
+def test_stream_latency_excludes_consumer_time(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(model_router.time, "perf_counter", clock)
+    router = ModelRouter(MODELS)
+    recorded = []
+    monkeypatch.setattr(router, "record", lambda choice, latency_ms, outcome, usage=None, finish_reason=None,
+                        ttft_ms=None: recorded.append((latency_ms, outcome, ttft_ms)))
+
+    async def open_stream(choice):
+        clock.now += 0.2  # time to first token
+        yield chunk("Hello")
+        clock.now += 0.1
+        yield chunk(" world", "stop")
+
+    async def consume():
+        async for _ in router.astream(ROLE_TOOL_SELECTION, COMPLEXITY_SIMPLE, open_stream):
+            clock.now += 5.0  # a slow client
+
+    asyncio.run(consume())
+    [(latency_ms, outcome, ttft_ms)] = recorded
+    assert outcome == "ok"
+    assert round(latency_ms) == 300
+    assert round(ttft_ms) == 200
+
+
+def test_routing_log_is_written_in_the_background(tmp_path):
+    path = tmp_path / "routes.jsonl"
+    router = ModelRouter(MODELS, log_path=str(path))
+    choice = router.choose(ROLE_TOOL_SELECTION, COMPLEXITY_SIMPLE)
+    for _ in range(3):
+        router.record(choice, 120.0, "ok", finish_reason="stop")
+    router.close()
+    router.close()
+
+    entries = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(entries) == 3
+    assert entries[0]["model"] == "gpt-4o-mini" and entries[0]["latency_ms"] == 120.0
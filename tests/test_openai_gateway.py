@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+import openai_gateway
+from openai_gateway import ENDPOINT_CHAT, CircuitBreaker, CircuitOpenError, OpenAIGateway
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(openai_gateway.time, "monotonic", clock)
+    return clock
+
+
+def open_breaker(cooldown: float = 30.0) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_ratio=0.5, window=4, cooldown_seconds=cooldown)
+    for _ in range(4):
+        breaker.record_failure()
+    assert breaker.is_open
+    return breaker
+
+
+def test_opens_on_failure_ratio_over_full_window(clock):
+    breaker = CircuitBreaker(failure_ratio=0.5, window=4, cooldown_seconds=30)
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.is_open  # window not full yet
+    breaker.record_failure()
+    assert breaker.is_open
+
+
+def test_rejects_until_cooldown_then_allows_one_trial(clock):
+    breaker = open_breaker()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 30
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # only one trial at a time
+
+
+def test_trial_success_closes(clock):
+    breaker = open_breaker()
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.before_call()
+
+
+def test_trial_failure_reopens_for_another_cooldown(clock):
+    breaker = open_breaker()
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 30
+    breaker.before_call()
+
+
+def test_abandoned_trial_counts_as_failed(clock):
+    breaker = open_breaker()
+    clock.now += 30
+    breaker.before_call()
+    breaker.abandon_trial()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 30
+    breaker.before_call()
+
+
+def test_abandon_without_trial_is_a_no_op(clock):
+    breaker = CircuitBreaker(window=4)
+    breaker.abandon_trial()
+    assert not breaker.is_open
+
+
+@pytest.fixture
+def gateway():
+    return OpenAIGateway("test-key", breaker_window=4, breaker_cooldown=0)
+
+
+def test_cancelled_half_open_trial_lets_the_next_call_through(gateway):
+    breaker = gateway.breakers[ENDPOINT_CHAT]
+    for _ in range(4):
+        breaker.record_failure()
+
+    async def hang(**params):
+        await asyncio.sleep(3600)
+
+    async def answer(**params):
+        return "ok"
+
+    async def scenario():
+        trial = asyncio.create_task(gateway._acall(ENDPOINT_CHAT, hang))
+        await asyncio.sleep(0.01)
+        with pytest.raises(CircuitOpenError):
+            await gateway._acall(ENDPOINT_CHAT, answer)  # the trial is still running
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        return await gateway._acall(ENDPOINT_CHAT, answer)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert not breaker.is_open
+    assert gateway.limiter.active == 0
+
+
+def test_unexpected_error_in_trial_releases_it(gateway):
+    breaker = gateway.breakers[ENDPOINT_CHAT]
+    for _ in range(4):
+        breaker.record_failure()
+
+    def broken(**params):
+        raise ValueError("bad request body")
+
+    with pytest.raises(ValueError):
+        gateway._call(ENDPOINT_CHAT, broken)
+    assert gateway._call(ENDPOINT_CHAT, lambda **params: "ok") == "ok"
+    assert not breaker.is_open
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from catalog_snapshot import CatalogSnapshot, CatalogSnapshotCache, MappedListing
+from embedding_cache import EmbeddingCache
+from index_snapshot import write_snapshot
+from lexical_index import BM25Index, MappedBM25Index
+from vector_store import BookVectorStore
+
+CATALOG = """## Title: Dune
+Author: Frank Herbert
+Genre: Science fiction
+
+Year: 1965
+Spice and sandworms.
+Genre: this line is part of the summary
+
+on two paragraphs.
+## Title: Empty
+## Title: 1984
+Big Brother is watching.
+"""
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BookVectorStore("test-key", persist_directory=str(tmp_path / "index"), index_backend="numpy",
+                           embedding_cache=EmbeddingCache(str(tmp_path / "cache.db")))
+
+
+def test_iter_books_reads_fields_until_the_summary_starts(store, tmp_path):
+    path = tmp_path / "catalog.txt"
+    path.write_text(CATALOG, encoding="utf-8")
+    dune, nineteen = store.iter_books(str(path))
+
+    assert dune["title"] == "Dune"
+    assert dune["summary"] == "Spice and sandworms.\nGenre: this line is part of the summary\n\non two paragraphs."
+    assert dune["metadata"]["author"] == "Frank Herbert"
+    assert dune["metadata"]["genre"] == "science fiction"
+    assert dune["metadata"]["year"] == 1965
+    assert nineteen["title"] == "1984" and nineteen["summary"] == "Big Brother is watching."
+
+
+def test_iter_books_handles_long_summaries(store, tmp_path):
+    # Rejoining the summary on every line made this quadratic (tens of GB copied)
+    path = tmp_path / "catalog.txt"
+    path.write_text("## Title: Long\n" + "line of summary text\n" * 50000, encoding="utf-8")
+    [book] = store.iter_books(str(path))
+    assert book["summary"].count("\n") == 49999
+
+
+def write_catalog(path, titles):
+    path.write_text("".join(f"## Title: {title}\nA story about {title.lower()}.\n" for title in titles),
+                    encoding="utf-8")
+
+
+def test_sync_deletes_removed_books_in_one_call(store, tmp_path, monkeypatch):
+    path = tmp_path / "catalog.txt"
+    titles = [f"Book {i}" for i in range(10)]
+    write_catalog(path, titles)
+    # Embeddings come from the cache, so the sync makes no API calls
+    books = list(store.iter_books(str(path)))
+    store.embedding_cache.put_many(store.embedding_key, [book["full_text"] for book in books],
+                                   [[float(i), 1.0, 0.0] for i in range(len(books))])
+    store.create_collection()
+    store.sync_database(str(path), batch_size=2)
+    assert store.collection.count() == 10
+
+    deletes = []
+    delete = store.collection.delete
+    monkeypatch.setattr(store.collection, "delete", lambda ids: (deletes.append(list(ids)), delete(ids)))
+    write_catalog(path, titles[:4])
+    stats = store.sync_database(str(path), batch_size=2)
+
+    assert stats["deleted"] == 6
+    assert len(deletes) == 1 and len(deletes[0]) == 6
+    assert sorted(store.collection.get(include=["metadatas"])["metadatas"], key=lambda m: m["title"]) \
+        == sorted((book["metadata"] for book in books[:4]), key=lambda m: m["title"])
+
+
+def test_imported_snapshot_is_served_from_its_tables_until_changed(store, tmp_path):
+    path = tmp_path / "catalog.txt"
+    write_catalog(path, ["emma", "Ulysses", "Dune"])
+    books = list(store.iter_books(str(path)))
+    matrix = np.eye(3, dtype=np.float32)
+    snapshot = str(tmp_path / "books.snap")
+    write_snapshot(snapshot, [([book["id"] for book in books], matrix, [book["summary"] for book in books],
+                               [book["metadata"] for book in books])], store.embedding_key)
+
+    store.create_collection()
+    store.import_snapshot(snapshot, persist=False)
+    assert isinstance(store.lexical_index, MappedBM25Index)
+    assert store.lexical_match("Emma")[0]["title"] == "emma"
+    assert [book["title"] for book in store.query_collection([0.0, 1.0, 0.0], n_results=1)] == ["Ulysses"]
+
+    listing = CatalogSnapshotCache().get(store)
+    assert isinstance(listing.books, MappedListing)
+    first = listing.page(None, 2, ["id", "title", "summary"])
+    assert [book["title"] for book in first["books"]] == ["Dune", "emma"]
+    assert [book["title"] for book in listing.page(first["next_cursor"], 2, ["title"])["books"]] == ["Ulysses"]
+    in_memory = CatalogSnapshot(listing.version, [dict(book) for book in listing.books])
+    assert list(in_memory.books) == list(listing.books)
+
+    # A write copies the catalog and rebuilds private text indexes first
+    store.collection.upsert(["book_new"], [[1.0, 1.0, 0.0]], ["A new one."], [{"title": "Newcomer"}])
+    store._index_text("book_new", "Newcomer", "A new one.")
+    assert isinstance(store.lexical_index, BM25Index)
+    assert store.collection.count() == 4 and len(store.lexical_index) == 4
+    assert store.mapped_catalog is None
+    assert store.title_index.resolve("Dune")[0] == "Dune"
+    assert store.title_index.resolve("Newcomer") == ("Newcomer", "A new one.")